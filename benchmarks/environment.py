@@ -0,0 +1,102 @@
+"""
+Generates mocked server logs of a large TSM environment for benchmarking.
+"""
+
+from dataclasses import dataclass, field
+
+from parsing.schedule_status import ScheduleStatusEnum
+from tests.mock import (
+    mock_node_log,
+    mock_schedule_logs,
+    mock_backup_result_log,
+    mock_vm_result,
+    mock_vm_result_logs,
+)
+
+PLATFORMS = ["Linux x86-64", "WinNT", "TDP VMWare", "AIX"]
+STATUSES = [
+    ScheduleStatusEnum.SUCCESSFUL,
+    ScheduleStatusEnum.SUCCESSFUL,
+    ScheduleStatusEnum.SUCCESSFUL,
+    ScheduleStatusEnum.MISSED,
+    ScheduleStatusEnum.FAILED,
+]
+
+
+@dataclass
+class MockedEnvironment:
+    """
+    MockedEnvironment holds the server logs of a mocked TSM instance.
+
+    Args:
+        nodes_log:          Log of the nodes and domains query
+        schedule_logs:      Schedule logs per node
+        backup_logs:        Client backup logs per node
+        vm_logs:            Log of the VM backup query
+    """
+
+    nodes_log: list[str] = field(default_factory=list)
+    schedule_logs: dict[str, list[str]] = field(default_factory=dict)
+    backup_logs: dict[str, list[str]] = field(default_factory=dict)
+    vm_logs: list[str] = field(default_factory=list)
+
+
+def mock_environment(
+    node_count: int, nodes_per_domain: int = 50, vms_per_vm_node: int = 4
+) -> MockedEnvironment:
+    """
+    Generates server logs for node_count nodes, split into policy domains of
+    nodes_per_domain nodes each. Every fourth domain has no contact, its nodes
+    carry individual contacts instead.
+    """
+    env = MockedEnvironment()
+    vm_results = []
+
+    for i in range(node_count):
+        node_name = f"NODE_{i:06d}"
+        platform = PLATFORMS[i % len(PLATFORMS)]
+        domain_index = i // nodes_per_domain
+        domain_name = f"DOMAIN_{domain_index:04d}"
+
+        if domain_index % 4 == 3:
+            env.nodes_log.append(
+                mock_node_log(
+                    node_name,
+                    platform,
+                    domain_name,
+                    node_contact=f"owner{i % 7}@company.com",
+                )
+            )
+        else:
+            env.nodes_log.append(
+                mock_node_log(
+                    node_name,
+                    platform,
+                    domain_name,
+                    policy_domain_contact=f"backup{domain_index}@company.com",
+                )
+            )
+
+        env.schedule_logs[node_name] = mock_schedule_logs(
+            domain_name,
+            node_name,
+            f"SCHEDULE_{domain_index % 10}",
+            STATUSES[i % len(STATUSES)],
+        )
+        env.backup_logs[node_name] = mock_backup_result_log(node_name)
+
+        if platform == "TDP VMWare":
+            vm_results.extend(
+                mock_vm_result(
+                    f"VM_SCHEDULE_{domain_index % 10}",
+                    f"VM_{i:06d}_{j}",
+                    j % 3 != 0,
+                    j * 1_000_000_000,
+                    node_name,
+                )
+                for j in range(vms_per_vm_node)
+            )
+
+    env.vm_logs = mock_vm_result_logs(vm_results)
+
+    return env
@@ -0,0 +1,49 @@
+"""
+Measures the memory footprint and pickle size of the parsed data model.
+
+Usage: python -m benchmarks.model_memory [NODE_COUNT]
+"""
+
+import gc
+import sys
+import pickle
+import tracemalloc
+
+from parsing.tsm_data import TSMData
+from benchmarks.environment import mock_environment
+
+
+def measure(node_count: int):
+    """
+    Parses a mocked environment with node_count nodes and prints the memory
+    held by the resulting TSMData object and the size of its pickle.
+    """
+    env = mock_environment(node_count)
+
+    gc.collect()
+    tracemalloc.start()
+    mem_before, _ = tracemalloc.get_traced_memory()
+
+    data = TSMData("BENCH")
+    data.parse_nodes(env.nodes_log)
+    data.parse_schedules_and_backup_results(env.schedule_logs, env.backup_logs)
+    data.parse_vm_schedules(env.vm_logs)
+
+    gc.collect()
+    mem_after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pickled = pickle.dumps(data)
+    schedule_count = sum(len(node.schedules) for node in data.nodes.values())
+    data_size = mem_after - mem_before
+
+    print(f"nodes:           {len(data.nodes)}")
+    print(f"schedules:       {schedule_count}")
+    print(f"vm results:      {len(data.vm_results)}")
+    print(f"model memory:    {data_size / 2**20:.2f} MiB")
+    print(f"bytes per node:  {data_size / len(data.nodes):.0f}")
+    print(f"pickle size:     {len(pickled) / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    measure(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
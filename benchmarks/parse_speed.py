@@ -0,0 +1,53 @@
+"""
+Measures the time to parse the logs of a mocked TSM instance, on a single process,
+on a process pool and lazily, reporting a tenth of the policy domains afterwards.
+
+Usage: python -m benchmarks.parse_speed [NODE_COUNT] [PROCESSES]
+"""
+
+import sys
+import time
+
+from parsing.tsm_data import TSMData
+from benchmarks.environment import mock_environment
+
+
+def measure(node_count: int, processes: int | None):
+    """
+    Parses a mocked environment with node_count nodes and prints the time taken
+    for each parse step.
+    """
+    env = mock_environment(node_count)
+
+    for label, parse_processes, lazy in (
+        ("single process", 1, False),
+        ("process pool", processes, False),
+        ("lazy", 1, True),
+    ):
+        data = TSMData("BENCH")
+
+        start = time.perf_counter()
+        data.parse_nodes(env.nodes_log)
+        nodes_done = time.perf_counter()
+        data.parse_schedules_and_backup_results(
+            env.schedule_logs, env.backup_logs, parse_processes, lazy=lazy
+        )
+        schedules_done = time.perf_counter()
+        data.parse_vm_schedules(env.vm_logs)
+        vms_done = time.perf_counter()
+        for policy_domain in list(data.domains.values())[::10]:
+            policy_domain.has_non_successful_schedules()
+        report_done = time.perf_counter()
+
+        print(f"{label}:")
+        print(f"  nodes:                 {nodes_done - start:.3f} s")
+        print(f"  schedules and results: {schedules_done - nodes_done:.3f} s")
+        print(f"  vm results:            {vms_done - schedules_done:.3f} s")
+        print(f"  report 10% of domains: {report_done - vms_done:.3f} s")
+
+
+if __name__ == "__main__":
+    measure(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None,
+    )
@@ -0,0 +1,50 @@
+"""
+Measures the time to render the reports of all policy domains of a mocked
+TSM instance.
+
+Usage: python -m benchmarks.render_speed [NODE_COUNT] [NODES_PER_DOMAIN] [TEMPLATE_PATH]
+"""
+
+import sys
+import time
+
+from parsing.tsm_data import TSMData
+from parsing.report_template import ReportTemplate
+from parsing.report_view import build_report_view
+from benchmarks.environment import mock_environment
+
+
+def measure(node_count: int, nodes_per_domain: int, template_path: str):
+    """
+    Parses a mocked environment and prints the time taken to build the report
+    view-models and to render the reports.
+    """
+    env = mock_environment(node_count, nodes_per_domain)
+
+    data = TSMData("BENCH")
+    data.parse_nodes(env.nodes_log)
+    data.parse_schedules_and_backup_results(env.schedule_logs, env.backup_logs)
+    data.parse_vm_schedules(env.vm_logs)
+
+    template = ReportTemplate(template_path)
+    domains = list(data.domains.values())
+
+    start = time.perf_counter()
+    for policy_domain in domains:
+        build_report_view(policy_domain)
+    views_done = time.perf_counter()
+    size = sum(len(template.render(policy_domain)) for policy_domain in domains)
+    render_done = time.perf_counter()
+
+    print(f"domains:      {len(domains)}")
+    print(f"view-models:  {views_done - start:.3f} s")
+    print(f"render:       {render_done - views_done:.3f} s")
+    print(f"output:       {size / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    measure(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+        sys.argv[3] if len(sys.argv) > 3 else "./templates/statusmail.j2",
+    )
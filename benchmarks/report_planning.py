@@ -0,0 +1,68 @@
+"""
+Measures the time to plan the mail reports of a mocked TSM instance, validating
+contacts on every lookup while walking all policy domains and nodes, and looking
+them up in the contact indexes of the instance.
+
+Usage: python -m benchmarks.report_planning [NODE_COUNT]
+"""
+
+import sys
+import time
+
+from parsing.tsm_data import TSMData
+from parsing.contacts import parse_contacts
+from mailer.report_plan import plan_mail_reports
+from benchmarks.environment import mock_environment
+
+
+def plan_without_indexes(data: TSMData) -> int:
+    """
+    Validates the contacts of all policy domains and the loose nodes of the
+    first policy domain without contact on each lookup, returning the number
+    of reports.
+    """
+    reports = 0
+    loose_contacts: set[str] = set()
+
+    for policy_domain in data.domains.values():
+        if policy_domain.contact:
+            reports += bool(parse_contacts(policy_domain.contact))
+        elif not loose_contacts:
+            loose_contacts = {
+                contacts
+                for node in policy_domain.nodes
+                if node.contact and (contacts := parse_contacts(node.contact))
+            }
+
+    return reports + len(loose_contacts)
+
+
+def measure(node_count: int):
+    """
+    Parses the nodes of a mocked environment with node_count nodes and prints
+    the time taken to build the indexes and to plan the reports with and
+    without them.
+    """
+    env = mock_environment(node_count)
+
+    data = TSMData("BENCH")
+    data.parse_nodes(env.nodes_log)
+
+    start = time.perf_counter()
+    reports_without = plan_without_indexes(data)
+    without_done = time.perf_counter()
+    data.build_indexes()
+    indexes_done = time.perf_counter()
+    jobs = plan_mail_reports([data.instance_id], {data.instance_id: data})
+    plan_done = time.perf_counter()
+
+    assert reports_without == len(jobs)
+
+    print(f"count without indexes:  {without_done - start:.3f} s")
+    print(f"build indexes:          {indexes_done - without_done:.3f} s")
+    print(f"plan with indexes:      {plan_done - indexes_done:.3f} s")
+    print(f"report jobs:            {len(jobs)}")
+
+
+if __name__ == "__main__":
+    measure(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
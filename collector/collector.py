@@ -2,14 +2,20 @@
 Contains functions to interface with the TSM environment through the admin console (dsmadmc).
 """
 
+import os
+import mmap
 import subprocess
 import logging
+import tempfile
+import contextlib
 import multiprocessing as mp
-from typing import Any, cast
+from typing import Any, ContextManager, Iterable, Iterator
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from functools import partial
 
-from parsing.constants import LINE_DELIM, COLUMN_NODE_NAME
+from parsing.constants import SPILL_MMAP_THRESHOLD
+from parsing.node_log_parser import NodeLogs
 
 logger = logging.getLogger("main")
 
@@ -27,22 +33,27 @@ class CollectorConfig:
     inst: str
 
 
+def __dsmadmc_args(config: CollectorConfig, cmd: str) -> list[str]:
+    """
+    Returns the arguments for calling the admin console 'dsmadmc' with cmd.
+    """
+    return [
+        "dsmadmc",
+        f"-se={config.inst}",
+        f"-credentialsfile={config.app_config['tsm_credentials_file']}",
+        "-dataonly=yes",
+        "-comma",
+        "-out",
+        cmd,
+    ]
+
+
 def __issue_cmd(config: CollectorConfig, cmd: str) -> bytes:
     """
     Sends a command to the TSM server using the admin console 'dsmadmc'.
     """
     try:
-        cmd_result = subprocess.check_output(
-            [
-                "dsmadmc",
-                f"-se={config.inst}",
-                f"-credentialsfile={config.app_config['tsm_credentials_file']}",
-                "-dataonly=yes",
-                "-comma",
-                "-out",
-                cmd,
-            ]
-        )
+        cmd_result = subprocess.check_output(__dsmadmc_args(config, cmd))
         return cmd_result
     except subprocess.CalledProcessError as exception:
         if "ANR2034E" in str(exception.output):
@@ -57,29 +68,85 @@ def __issue_cmd(config: CollectorConfig, cmd: str) -> bytes:
         raise exception
 
 
-def __collect_schedule_for_node(
-    config: CollectorConfig, sched_logs: dict[str, list[str]], node_name: str
-):
+def __issue_large_cmd(config: CollectorConfig, cmd: str) -> bytes | mmap.mmap:
+    """
+    Sends a command with a potentially large result to the TSM server.
+    If spill_to_disk is enabled, the output is written to a temporary file
+    instead of being held in memory. Outputs of at least spill_mmap_threshold
+    bytes are memory mapped from that file, smaller ones are read into memory.
+    """
+    app_config = config.app_config
+
+    if not ("spill_to_disk" in app_config and app_config["spill_to_disk"]):
+        return __issue_cmd(config, cmd)
+
+    spill_dir = app_config["spill_dir"] if "spill_dir" in app_config else None
+    mmap_threshold = (
+        app_config["spill_mmap_threshold"]
+        if "spill_mmap_threshold" in app_config
+        else SPILL_MMAP_THRESHOLD
+    )
+
+    args = __dsmadmc_args(config, cmd)
+
+    # The temporary file is removed once it is closed, a memory map of it
+    # stays valid until the map itself is closed.
+    with tempfile.TemporaryFile(dir=spill_dir) as spill_file:
+        return_code = subprocess.call(args, stdout=spill_file)
+        size = os.fstat(spill_file.fileno()).st_size
+
+        if return_code != 0:
+            spill_file.seek(0)
+            output = spill_file.read()
+
+            if b"ANR2034E" in output:
+                logger.info(
+                    'Query "%s" \nreturned error: "%s", returning empty string.',
+                    cmd,
+                    output,
+                )
+                return bytes()
+
+            logger.error("Error calling dsmadmc: %s", output)
+            raise subprocess.CalledProcessError(return_code, args, output)
+
+        logger.debug("Spilled %d bytes of dsmadmc output to disk.", size)
+
+        if size == 0:
+            return bytes()
+
+        if size < mmap_threshold:
+            spill_file.seek(0)
+            return spill_file.read()
+
+        return mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def closing_output(output: bytes | mmap.mmap) -> ContextManager[bytes | mmap.mmap]:
+    """
+    Returns a context manager closing memory mapped output along with its spill
+    file once it has been parsed. Output held in memory is left as it is.
+    """
+    if isinstance(output, mmap.mmap):
+        return contextlib.closing(output)
+
+    return contextlib.nullcontext(output)
+
+
+def __query_schedule_log(config: CollectorConfig, node_name: str) -> bytes:
     """
     Queries all schedules for a node with node_name.
+    The raw output is returned to be tokenized by the parser.
     """
     logger.info("Collecting schedule status for %s on %s...", node_name, config.inst)
 
-    sched_stat_r = __issue_cmd(
+    return __issue_cmd(
         config,
         f"QUERY EVENT * * node={node_name} " "f=d begint=now endd=today begind=-15",
     )
-    sched_stat_str = sched_stat_r.decode("utf-8", "replace")
-    sched_stat_list = sched_stat_str.splitlines()
-
-    # Don't add empty logs
-    if sched_stat_list:
-        sched_logs[node_name] = sched_stat_list
 
 
-def __collect_client_backup_result(
-    config: CollectorConfig, cl_logs: dict[str, list[str]], node_name: str
-):
+def __query_client_backup_log(config: CollectorConfig, node_name: str) -> list[str]:
     """
     Queries client backup results for the last 24 hours for node with node_name.
     """
@@ -94,32 +161,37 @@ def __collect_client_backup_result(
         "AND date_time>current_timestamp - 24 hours "
         f"AND nodename = '{node_name}'",
     )
-    cl_stat_list = cl_stat_r.decode("utf-8", "replace").splitlines()
+    return cl_stat_r.decode("utf-8", "replace").splitlines()
+
+
+def __collect_node_logs(config: CollectorConfig, node_name: str) -> NodeLogs:
+    """
+    Queries the schedules and client backup results of a node with node_name.
+    Empty logs are returned as None.
+    """
+    sched_stat_log = __query_schedule_log(config, node_name)
+    cl_stat_list = __query_client_backup_log(config, node_name)
 
-    # Don't add empty logs
-    if cl_stat_list:
-        cl_logs[node_name] = cl_stat_list
+    return node_name, sched_stat_log or None, cl_stat_list or None
 
 
-def collect_nodes_and_domains(config: CollectorConfig) -> list[str]:
+def collect_nodes_and_domains(config: CollectorConfig) -> bytes | mmap.mmap:
     """
     Runs SQL query to get all nodes and policy domains.
+    The raw output is returned to be tokenized by the parser.
     """
-    nodes_r = __issue_cmd(
+    return __issue_large_cmd(
         config,
         "SELECT n.node_name, n.platform_name, n.domain_name, "
         "n.decomm_state, d.description, n.contact FROM nodes n, domains d "
         "WHERE d.domain_name = n.domain_name AND n.decomm_state IS NULL",
     )
-    nodes_str = nodes_r.decode("utf-8", "replace")
-    nodes_and_domains_logs = nodes_str.splitlines()
-
-    return nodes_and_domains_logs
 
 
-def collect_vm_schedules(config: CollectorConfig) -> list[str]:
+def collect_vm_schedules(config: CollectorConfig) -> bytes | mmap.mmap:
     """
     Gets all status logs for the VMWare backup schedules.
+    The raw output is returned to be tokenized by the parser.
     """
     today = datetime.now()
     yesterday = today - timedelta(days=1)
@@ -129,7 +201,7 @@ def collect_vm_schedules(config: CollectorConfig) -> list[str]:
 
     logger.info("Collecting VMWare schedules on %s...", config.inst)
 
-    vm_results_r = __issue_cmd(
+    vm_results_r = __issue_large_cmd(
         config,
         "SELECT schedule_name, sub_entity, start_time, end_time, "
         "successful, activity, activity_type, bytes, entity "
@@ -138,55 +210,28 @@ def collect_vm_schedules(config: CollectorConfig) -> list[str]:
         f"BETWEEN '{yesterday_str}' AND '{today_str}'",
     )
 
-    vm_results_str = vm_results_r.decode("utf-8", "replace")
-    vm_results_list = vm_results_str.splitlines()
-
-    logger.info("Collected VMWare schedule data for %d VMs.", len(vm_results_list))
-
-    return vm_results_list
-
-
-def collect_schedule_logs(
-    config: CollectorConfig, log: list[str]
-) -> dict[str, list[str]]:
-    """
-    Reads and returns schedule logs for a node.
-    """
-    sched_logs_manager = mp.Manager()
-    sched_logs = cast(dict[str, list[str]], sched_logs_manager.dict())
-
-    nodes: list[str] = []
-
-    for line in log:
-        nodes.append(line.split(LINE_DELIM)[COLUMN_NODE_NAME])
-
-    with mp.Pool() as pool:
-        pool.starmap(
-            __collect_schedule_for_node,
-            [(config, sched_logs, node_name) for node_name in nodes],
-        )
+    # Counting the VMs would take another pass over the spilled output
+    logger.info(
+        "Collected %d bytes of VMWare schedule data on %s.",
+        len(vm_results_r),
+        config.inst,
+    )
 
-    return sched_logs
+    return vm_results_r
 
 
-def collect_client_backup_results(
-    config: CollectorConfig, log: list[str]
-) -> dict[str, list[str]]:
+def iter_node_logs(
+    config: CollectorConfig, node_names: Iterable[str]
+) -> Iterator[NodeLogs]:
     """
-    Gets all client backup results for the last 24 hours from a node.
+    Queries the schedule and client backup logs of all nodes on a pool of processes
+    and yields them as soon as the queries of a node have completed, so they can be
+    parsed while the remaining nodes are still queried.
+    Nodes without any logs are skipped.
     """
-    cl_logs_manager = mp.Manager()
-    cl_logs = cast(dict[str, list[str]], cl_logs_manager.dict())
-
-    nodes: list[str] = []
-
-    for line in log:
-        nodes.append(line.split(LINE_DELIM)[COLUMN_NODE_NAME])
-
     with mp.Pool() as pool:
-        pool.starmap(
-            __collect_client_backup_result,
-            [(config, cl_logs, node_name) for node_name in nodes],
-        )
-
-    return cl_logs
+        for node_logs in pool.imap_unordered(
+            partial(__collect_node_logs, config), node_names
+        ):
+            if node_logs[1] is not None or node_logs[2] is not None:
+                yield node_logs
@@ -0,0 +1,259 @@
+"""
+async_mailer.py sends status mails concurrently on an asyncio event loop
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Callable
+from concurrent.futures import Future, wait
+
+import aiosmtplib
+from aiosmtplib import SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError
+
+from parsing.policy_domain import PolicyDomain
+from parsing.report_template import ReportTemplate
+from parsing.constants import SMTP_QUEUED_MAILS_PER_CONNECTION
+from mailer.status_mailer import encode_report_mail
+from mailer.mailer import DeliveryResult
+from mailer.pooled_mailer import QueuedMail
+
+logger = logging.getLogger("main")
+
+
+class AsyncMailer:
+    """
+    AsyncMailer sends mails containing status information to registered nodes.
+    Mails are rendered and encoded by the caller of send_to and scheduled on an
+    event loop running in a background thread, where all of them are sent
+    concurrently using aiosmtplib. A semaphore bounds the number of concurrent
+    SMTP connections, idle connections are reused by the next mail.
+    Connections are replaced after sending messages_per_connection mails and
+    reopened if they fail. A mail which fails on a fresh connection or is rejected
+    by the server is logged and counted in failed_count.
+    close has to be called to wait for all scheduled mails to be sent.
+
+    Args:
+        smtp_host:                  The mailer host to connect to
+        smtp_port:                  Mailer host port
+        template_path:              Path to jinja2 template for mail body
+        smtp_credentials:           Tuple containing user / password for
+                                    authentication with the SMTP server
+        max_connections:            Maximum number of concurrent SMTP connections
+        messages_per_connection:    Number of mails sent over a connection before
+                                    it is replaced (0 for no limit)
+        starttls:                   Flag to secure connections using STARTTLS
+    """
+
+    def __init__(
+        self,
+        smtp_host: str,
+        smtp_port: int,
+        template_path: str,
+        smtp_credentials: tuple[str, str] | None = None,
+        max_connections: int = 4,
+        messages_per_connection: int = 0,
+        starttls: bool = True,
+    ):
+        self.__smtp_host = smtp_host
+        self.__smtp_port = smtp_port
+        self.__smtp_credentials = smtp_credentials
+        self.__messages_per_connection = messages_per_connection
+        self.__starttls = starttls
+        self.sent_count = 0
+        self.failed_count = 0
+
+        # Load jinja2 mail HTML template
+        self.__template = ReportTemplate(template_path)
+
+        # Connections are only used on the event loop, so they need no locking
+        self.__connections = asyncio.Semaphore(max(max_connections, 1))
+        self.__idle_connections: list[aiosmtplib.SMTP] = []
+        self.__conn_sent_counts: dict[aiosmtplib.SMTP, int] = {}
+
+        # Limits the mails encoded but not sent yet
+        self.__scheduled = threading.BoundedSemaphore(
+            max(max_connections, 1) * SMTP_QUEUED_MAILS_PER_CONNECTION
+        )
+        self.__pending: list[Future] = []
+
+        self.__loop = asyncio.new_event_loop()
+        self.__loop_thread = threading.Thread(
+            target=self.__loop.run_forever, name="smtp-loop", daemon=True
+        )
+        self.__loop_thread.start()
+
+    async def __smtp_connect(self) -> aiosmtplib.SMTP:
+        logger.info(
+            "Connecting to %s at port %s...", self.__smtp_host, self.__smtp_port
+        )
+        smtp_conn = aiosmtplib.SMTP(
+            hostname=self.__smtp_host,
+            port=self.__smtp_port,
+            start_tls=self.__starttls,
+        )
+        await smtp_conn.connect()
+
+        try:
+            if self.__smtp_credentials:
+                await smtp_conn.login(*self.__smtp_credentials)
+        except aiosmtplib.SMTPException:
+            smtp_conn.close()
+            raise
+
+        self.__conn_sent_counts[smtp_conn] = 0
+        return smtp_conn
+
+    async def __smtp_disconnect(self, smtp_conn: aiosmtplib.SMTP, graceful: bool):
+        self.__conn_sent_counts.pop(smtp_conn, None)
+
+        try:
+            if graceful:
+                await smtp_conn.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            # The connection has already been closed by the server
+            pass
+        finally:
+            smtp_conn.close()
+
+    async def __send(self, mail: QueuedMail):
+        # Sends a mail, reconnecting once if the connection fails
+        async with self.__connections:
+            smtp_conn = (
+                self.__idle_connections.pop() if self.__idle_connections else None
+            )
+
+            for attempt in range(2):
+                try:
+                    if smtp_conn is None:
+                        smtp_conn = await self.__smtp_connect()
+
+                    await smtp_conn.sendmail(
+                        mail.sender_addr, mail.recipients, mail.message
+                    )
+                    self.__conn_sent_counts[smtp_conn] += 1
+                    self.sent_count += 1
+                    mail.report(DeliveryResult.SENT)
+                    break
+                except (
+                    SMTPRecipientsRefused,
+                    SMTPSenderRefused,
+                    SMTPDataError,
+                ) as exc:
+                    # The mail has been rejected, the connection is still usable
+                    logger.error(
+                        "Report for %s was rejected: %s", mail.policy_domain_name, exc
+                    )
+                    self.failed_count += 1
+                    mail.report(DeliveryResult.REJECTED)
+                    break
+                except (aiosmtplib.SMTPException, OSError) as exc:
+                    logger.warning(
+                        "Sending report for %s failed (%s)%s",
+                        mail.policy_domain_name,
+                        exc,
+                        ", reconnecting..." if attempt == 0 else ".",
+                    )
+                    if smtp_conn is not None:
+                        await self.__smtp_disconnect(smtp_conn, graceful=False)
+                        smtp_conn = None
+            else:
+                logger.error(
+                    "Failed to send report for %s to %s.",
+                    mail.policy_domain_name,
+                    ", ".join(mail.recipients),
+                )
+                self.failed_count += 1
+                mail.report(DeliveryResult.FAILED)
+
+            if smtp_conn is None:
+                return
+
+            # Replace connections which reached their message limit
+            if (
+                self.__messages_per_connection
+                and self.__conn_sent_counts[smtp_conn] >= self.__messages_per_connection
+            ):
+                await self.__smtp_disconnect(smtp_conn, graceful=True)
+            else:
+                self.__idle_connections.append(smtp_conn)
+
+    async def __close_connections(self):
+        while self.__idle_connections:
+            await self.__smtp_disconnect(self.__idle_connections.pop(), graceful=True)
+
+    def __sent(self, future: Future):
+        self.__scheduled.release()
+
+        if not future.cancelled() and future.exception():
+            logger.exception(future.exception())
+            self.failed_count += 1
+
+    def send_to(
+        self,
+        policy_domain: PolicyDomain,
+        sender_addr: str,
+        receiver_addr: str,
+        subject: str,
+        replyto_addr: str,
+        bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
+    ):
+        """
+        Renders and encodes the mail and schedules sending it. Blocks while too
+        many mails are waiting to be sent. If the report has already been rendered
+        (with SMTP_NEWLINE line endings), rendered_html is sent instead.
+        delivered is called with the result on the event loop thread.
+        """
+        recipients, message = encode_report_mail(
+            self.__template,
+            policy_domain,
+            sender_addr,
+            receiver_addr,
+            subject,
+            replyto_addr,
+            bcc_addr,
+            rendered_html,
+            extra_reports,
+        )
+
+        logger.info(
+            "Scheduling report for %s to %s.", policy_domain.name, receiver_addr
+        )
+        self.__scheduled.acquire()  # pylint: disable=consider-using-with
+        future = asyncio.run_coroutine_threadsafe(
+            self.__send(
+                QueuedMail(
+                    policy_domain.name, sender_addr, recipients, message, delivered
+                )
+            ),
+            self.__loop,
+        )
+        future.add_done_callback(self.__sent)
+
+        # Only the caller keeps track of the pending mails
+        self.__pending = [pending for pending in self.__pending if not pending.done()]
+        self.__pending.append(future)
+
+    def close(self):
+        """
+        Waits for all scheduled mails to be sent, closes all connections and
+        stops the event loop.
+        """
+        if self.__loop.is_closed():
+            return
+
+        wait(self.__pending)
+        asyncio.run_coroutine_threadsafe(
+            self.__close_connections(), self.__loop
+        ).result()
+
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__loop_thread.join()
+        self.__loop.close()
+
+        logger.info(
+            "Sent %d mails, %d mails failed.", self.sent_count, self.failed_count
+        )
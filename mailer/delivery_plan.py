@@ -0,0 +1,82 @@
+"""
+Contains the delivery planning of the mail reports. It determines which planned
+reports are sent together, so each SMTP transaction delivers as many of them as
+possible.
+"""
+
+import logging
+from enum import Enum
+from dataclasses import dataclass
+
+from parsing.contacts import unique_addresses
+from mailer.report_plan import ReportJob
+
+logger = logging.getLogger("main")
+
+
+class DeliveryMerge(Enum):
+    """
+    DeliveryMerge describes which reports are merged into a single mail.
+    OFF sends every report to its recipients on its own and RECIPIENT combines
+    all reports of an instance for the same recipients.
+    """
+
+    OFF = "off"
+    RECIPIENT = "recipient"
+
+
+@dataclass
+class Delivery:
+    """
+    Delivery describes a single mail, sent in one SMTP transaction.
+
+    Args:
+        instance:   TSM server instance the reports belong to
+        recipients: Addresses the mail is sent to, without duplicates
+        reports:    Planned reports contained in the mail
+    """
+
+    instance: str
+    recipients: list[str]
+    reports: list[ReportJob]
+
+
+def __job_addresses(job: ReportJob) -> list[str]:
+    return [address.strip() for address in job.recipients.split(",") if address.strip()]
+
+
+def plan_deliveries(
+    jobs: list[ReportJob], merge: DeliveryMerge = DeliveryMerge.OFF
+) -> list[Delivery]:
+    """
+    Plans the mails delivering the planned reports. Each report of an instance
+    shows different nodes, so reports are only combined by their recipients.
+    """
+    planned = [
+        Delivery(job.instance, unique_addresses(__job_addresses(job)), [job])
+        for job in jobs
+    ]
+
+    if merge is DeliveryMerge.RECIPIENT:
+        combined: dict[tuple[str, frozenset[str]], Delivery] = {}
+
+        for delivery in planned:
+            key = (
+                delivery.instance,
+                frozenset(address.casefold() for address in delivery.recipients),
+            )
+
+            if key in combined:
+                combined[key].reports.extend(delivery.reports)
+            else:
+                combined[key] = delivery
+
+        planned = list(combined.values())
+
+    logger.info(
+        "Planned %d mails delivering %d reports.",
+        len(planned),
+        sum(len(delivery.reports) for delivery in planned),
+    )
+
+    return planned
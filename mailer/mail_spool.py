@@ -0,0 +1,253 @@
+"""
+mail_spool.py writes status mails to an outbox directory and delivers them later
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import itertools
+import threading
+from typing import Callable
+from functools import partial
+
+from parsing.policy_domain import PolicyDomain
+from parsing.report_template import ReportTemplate
+from parsing.constants import (
+    SMTP_NEWLINE,
+    SPOOL_DELIVERY_ATTEMPTS,
+    SPOOL_RETRY_BACKOFF,
+)
+from mailer.status_mailer import encode_report_mail
+from mailer.mailer import DeliveryResult
+from mailer.pooled_mailer import PooledMailer, QueuedMail
+from mailer.render_cache import ReportKey
+from mailer.report_changes import ReportChangeDetector, ReportDelivery
+
+logger = logging.getLogger("main")
+
+# Headers preceding each spooled mail, containing the envelope of the mail.
+# They are removed before the mail is sent.
+ENVELOPE_SENDER_HEADER = b"X-Spool-Sender: "
+ENVELOPE_RECIPIENT_HEADER = b"X-Spool-Recipient: "
+# Key, fingerprint and status of a contained report, recorded once it is sent
+ENVELOPE_REPORT_HEADER = b"X-Spool-Report: "
+
+
+class MailSpool:
+    """
+    MailSpool implements the Mailer protocol by writing each mail as an .eml file to
+    a maildir-style spool directory instead of sending it. Mails are written to tmp/
+    and moved to new/ once they are complete, so a crash never leaves partial mails
+    in new/. drain delivers the mails in new/, removing them once they have been
+    sent. Mails rejected by the server are moved to failed/.
+    The states of the reports contained in a mail are stored along with it and
+    only recorded as sent by drain.
+
+    Args:
+        spool_dir:      Directory of the spool
+        template_path:  Path to jinja2 template for mail body
+    """
+
+    def __init__(self, spool_dir: str, template_path: str):
+        self.__tmp_dir = os.path.join(spool_dir, "tmp")
+        self.__new_dir = os.path.join(spool_dir, "new")
+        self.__failed_dir = os.path.join(spool_dir, "failed")
+        self.__names = itertools.count()
+        self.spooled_count = 0
+
+        for directory in (self.__tmp_dir, self.__new_dir, self.__failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        # Load jinja2 mail HTML template
+        self.__template = ReportTemplate(template_path)
+
+    def __unique_name(self) -> str:
+        # Maildir style file names, ordered by the time they are written
+        return (
+            f"{time.time_ns()}.{os.getpid()}_{next(self.__names)}."
+            f"{socket.gethostname()}.eml"
+        )
+
+    def send_to(
+        self,
+        policy_domain: PolicyDomain,
+        sender_addr: str,
+        receiver_addr: str,
+        subject: str,
+        replyto_addr: str,
+        bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
+    ):
+        """
+        Renders and encodes the mail and writes it to the spool.
+        If the report has already been rendered (with SMTP_NEWLINE line endings),
+        rendered_html is written instead. Spooled mails are only delivered by
+        drain, so delivered isn't called. The report states of a ReportDelivery
+        are written to the spool instead, to be recorded once drain has sent the mail.
+        """
+        recipients, message = encode_report_mail(
+            self.__template,
+            policy_domain,
+            sender_addr,
+            receiver_addr,
+            subject,
+            replyto_addr,
+            bcc_addr,
+            rendered_html,
+            extra_reports,
+        )
+
+        name = self.__unique_name()
+        tmp_path = os.path.join(self.__tmp_dir, name)
+
+        logger.info("Spooling report for %s to %s.", policy_domain.name, receiver_addr)
+        with open(tmp_path, "wb") as mail_file:
+            mail_file.write(
+                ENVELOPE_SENDER_HEADER + sender_addr.encode() + SMTP_NEWLINE.encode()
+            )
+            for recipient in recipients:
+                mail_file.write(
+                    ENVELOPE_RECIPIENT_HEADER
+                    + recipient.encode()
+                    + SMTP_NEWLINE.encode()
+                )
+            if isinstance(delivered, ReportDelivery):
+                for key, fingerprint, status in delivered.states:
+                    mail_file.write(
+                        ENVELOPE_REPORT_HEADER
+                        + json.dumps([*key, fingerprint, status]).encode()
+                        + SMTP_NEWLINE.encode()
+                    )
+            mail_file.write(message)
+
+            mail_file.flush()
+            os.fsync(mail_file.fileno())
+
+        os.replace(tmp_path, os.path.join(self.__new_dir, name))
+        self.spooled_count += 1
+
+    def close(self):
+        """
+        Logs the number of spooled mails.
+        """
+        logger.info("Spooled %d mails to %s.", self.spooled_count, self.__new_dir)
+
+    def pending_paths(self) -> list[str]:
+        """
+        Returns the paths of all mails waiting to be delivered, oldest first.
+        """
+        return [
+            os.path.join(self.__new_dir, name)
+            for name in sorted(os.listdir(self.__new_dir))
+            if name.endswith(".eml")
+        ]
+
+    @staticmethod
+    def __load(path: str) -> tuple[QueuedMail, list[tuple[ReportKey, str, str]]]:
+        with open(path, "rb") as mail_file:
+            data = mail_file.read()
+
+        sender_addr = ""
+        recipients = []
+        report_states = []
+        newline = SMTP_NEWLINE.encode()
+        start = 0
+
+        while data.startswith(
+            (ENVELOPE_SENDER_HEADER, ENVELOPE_RECIPIENT_HEADER, ENVELOPE_REPORT_HEADER),
+            start,
+        ):
+            end = data.index(newline, start)
+            if data.startswith(ENVELOPE_SENDER_HEADER, start):
+                sender_addr = data[start + len(ENVELOPE_SENDER_HEADER) : end].decode()
+            elif data.startswith(ENVELOPE_RECIPIENT_HEADER, start):
+                recipients.append(
+                    data[start + len(ENVELOPE_RECIPIENT_HEADER) : end].decode()
+                )
+            else:
+                instance, pd_name, contact_group, fingerprint, status = json.loads(
+                    data[start + len(ENVELOPE_REPORT_HEADER) : end]
+                )
+                report_states.append(
+                    ((instance, pd_name, contact_group), fingerprint, status)
+                )
+            start = end + len(newline)
+
+        return (
+            QueuedMail(os.path.basename(path), sender_addr, recipients, data[start:]),
+            report_states,
+        )
+
+    def drain(
+        self,
+        mailer: PooledMailer,
+        attempts: int = SPOOL_DELIVERY_ATTEMPTS,
+        backoff: float = SPOOL_RETRY_BACKOFF,
+        change_detector: ReportChangeDetector | None = None,
+    ) -> int:
+        """
+        Delivers all spooled mails using the mailer. Mails which failed are retried
+        up to attempts times, waiting backoff seconds before the first retry and
+        twice as long before each further retry. If a change detector is supplied,
+        the states of the reports of each sent mail are recorded in it.
+        Returns the number of mails which are still waiting to be delivered.
+        """
+        pending = self.pending_paths()
+        logger.info("Delivering %d spooled mails...", len(pending))
+
+        failed: list[str] = []
+        lock = threading.Lock()
+
+        def delivered(
+            result: DeliveryResult,
+            path: str,
+            report_states: list[tuple[ReportKey, str, str]],
+        ):
+            # Called by the threads of the mailer
+            if result is DeliveryResult.SENT:
+                os.remove(path)
+
+                if change_detector is not None:
+                    ReportDelivery(change_detector, report_states)(result)
+            elif result is DeliveryResult.REJECTED:
+                os.replace(
+                    path, os.path.join(self.__failed_dir, os.path.basename(path))
+                )
+            else:
+                with lock:
+                    failed.append(path)
+
+        for attempt in range(attempts):
+            if not pending:
+                break
+
+            if attempt > 0:
+                delay = backoff * 2 ** (attempt - 1)
+                logger.info(
+                    "Retrying %d spooled mails in %s seconds...", len(pending), delay
+                )
+                time.sleep(delay)
+
+            for path in pending:
+                mail, report_states = self.__load(path)
+                mail.delivered = partial(
+                    delivered, path=path, report_states=report_states
+                )
+                mailer.send_mail(mail)
+
+            mailer.flush()
+            pending = sorted(failed)
+            failed.clear()
+
+        if pending:
+            logger.error(
+                "%d spooled mails couldn't be delivered, they remain in %s.",
+                len(pending),
+                self.__new_dir,
+            )
+
+        return len(pending)
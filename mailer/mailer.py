@@ -2,10 +2,23 @@
 Mailer defines the interface a mailing client has to implement.
 """
 
-from typing import Protocol
+from enum import Enum
+from typing import Callable, Protocol
 from parsing.policy_domain import PolicyDomain
 
 
+class DeliveryResult(Enum):
+    """
+    DeliveryResult describes the outcome of sending a queued mail.
+    REJECTED mails have been refused by the server and won't succeed when retried,
+    FAILED mails couldn't be sent due to connection errors.
+    """
+
+    SENT = "sent"
+    REJECTED = "rejected"
+    FAILED = "failed"
+
+
 class Mailer(Protocol):
     def send_to(
         self,
@@ -15,4 +28,9 @@ class Mailer(Protocol):
         subject: str,
         replyto_addr: str,
         bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
     ): ...
+
+    def close(self): ...
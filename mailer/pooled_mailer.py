@@ -0,0 +1,270 @@
+"""
+pooled_mailer.py sends status mails concurrently over a pool of SMTP connections
+"""
+
+import queue
+import logging
+import smtplib
+import threading
+from typing import Callable
+from dataclasses import dataclass
+from smtplib import SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError
+
+from parsing.policy_domain import PolicyDomain
+from parsing.report_template import ReportTemplate
+from parsing.constants import SMTP_QUEUED_MAILS_PER_CONNECTION
+from mailer.status_mailer import encode_report_mail
+from mailer.mailer import DeliveryResult
+
+logger = logging.getLogger("main")
+
+
+@dataclass(slots=True)
+class QueuedMail:
+    """
+    QueuedMail is an encoded mail waiting to be sent by a connection of the pool.
+    If delivered is set, it is called with the result once the mail has been sent
+    or has failed.
+    """
+
+    policy_domain_name: str
+    sender_addr: str
+    recipients: list[str]
+    message: bytes
+    delivered: Callable[[DeliveryResult], None] | None = None
+
+    def report(self, result: DeliveryResult):
+        """
+        Passes the result of sending the mail on to the delivered callback.
+        """
+        if self.delivered is not None:
+            self.delivered(result)
+
+
+class PooledMailer:
+    """
+    PooledMailer sends mails containing status information to registered nodes.
+    Mails are rendered and encoded by the caller of send_to and queued, each
+    connection of the pool is held by a worker thread sending mails from the queue.
+    Connections are opened on demand, replaced after sending messages_per_connection
+    mails and reopened if they fail. A mail which fails on a fresh connection or
+    is rejected by the server is logged and counted in failed_count.
+    close has to be called to wait for all queued mails to be sent.
+
+    Args:
+        smtp_host:                  The mailer host to connect to
+        smtp_port:                  Mailer host port
+        template_path:              Path to jinja2 template for mail body
+        smtp_credentials:           Tuple containing user / password for
+                                    authentication with the SMTP server
+        max_connections:            Maximum number of concurrent SMTP connections
+        messages_per_connection:    Number of mails sent over a connection before
+                                    it is replaced (0 for no limit)
+        starttls:                   Flag to secure connections using STARTTLS
+    """
+
+    def __init__(
+        self,
+        smtp_host: str,
+        smtp_port: int,
+        template_path: str,
+        smtp_credentials: tuple[str, str] | None = None,
+        max_connections: int = 4,
+        messages_per_connection: int = 0,
+        starttls: bool = True,
+    ):
+        self.__smtp_host = smtp_host
+        self.__smtp_port = smtp_port
+        self.__smtp_credentials = smtp_credentials
+        self.__messages_per_connection = messages_per_connection
+        self.__starttls = starttls
+        self.__lock = threading.Lock()
+        self.sent_count = 0
+        self.failed_count = 0
+
+        # Load jinja2 mail HTML template
+        self.__template = ReportTemplate(template_path)
+
+        # None tells a worker to close its connection and stop
+        self.__queue: queue.Queue[QueuedMail | None] = queue.Queue(
+            max(max_connections, 1) * SMTP_QUEUED_MAILS_PER_CONNECTION
+        )
+        self.__workers = [
+            threading.Thread(target=self.__worker, name=f"smtp-{i}", daemon=True)
+            for i in range(max(max_connections, 1))
+        ]
+        for worker in self.__workers:
+            worker.start()
+
+    def __smtp_connect(self) -> smtplib.SMTP:
+        logger.info(
+            "Connecting to %s at port %s...", self.__smtp_host, self.__smtp_port
+        )
+        smtp_conn = smtplib.SMTP(self.__smtp_host, self.__smtp_port)
+
+        try:
+            if self.__starttls:
+                smtp_conn.starttls()
+
+            if self.__smtp_credentials:
+                smtp_conn.login(*self.__smtp_credentials)
+        except OSError:
+            smtp_conn.close()
+            raise
+
+        return smtp_conn
+
+    @staticmethod
+    def __smtp_disconnect(smtp_conn: smtplib.SMTP, graceful: bool = True):
+        try:
+            if graceful:
+                smtp_conn.quit()
+        except OSError:
+            # The connection has already been closed by the server
+            pass
+        finally:
+            smtp_conn.close()
+
+    def __count(self, mail: QueuedMail, result: DeliveryResult):
+        with self.__lock:
+            if result is DeliveryResult.SENT:
+                self.sent_count += 1
+            else:
+                self.failed_count += 1
+
+        mail.report(result)
+
+    def __send(
+        self, smtp_conn: smtplib.SMTP | None, mail: QueuedMail
+    ) -> smtplib.SMTP | None:
+        # Sends a mail, reconnecting once if the connection fails.
+        # Returns the connection to use for the next mail.
+        for attempt in range(2):
+            try:
+                if smtp_conn is None:
+                    smtp_conn = self.__smtp_connect()
+
+                smtp_conn.sendmail(mail.sender_addr, mail.recipients, mail.message)
+                self.__count(mail, DeliveryResult.SENT)
+                return smtp_conn
+            except (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError) as exc:
+                # The mail has been rejected, the connection is still usable
+                logger.error(
+                    "Report for %s was rejected: %s", mail.policy_domain_name, exc
+                )
+                self.__count(mail, DeliveryResult.REJECTED)
+                return smtp_conn
+            except OSError as exc:
+                logger.warning(
+                    "Sending report for %s failed (%s)%s",
+                    mail.policy_domain_name,
+                    exc,
+                    ", reconnecting..." if attempt == 0 else ".",
+                )
+                if smtp_conn is not None:
+                    self.__smtp_disconnect(smtp_conn, graceful=False)
+                    smtp_conn = None
+
+        logger.error(
+            "Failed to send report for %s to %s.",
+            mail.policy_domain_name,
+            ", ".join(mail.recipients),
+        )
+        self.__count(mail, DeliveryResult.FAILED)
+        return None
+
+    def __worker(self):
+        smtp_conn = None
+        conn_sent_count = 0
+
+        while (mail := self.__queue.get()) is not None:
+            try:
+                # Replace connections which reached their message limit
+                if (
+                    smtp_conn is not None
+                    and self.__messages_per_connection
+                    and conn_sent_count >= self.__messages_per_connection
+                ):
+                    self.__smtp_disconnect(smtp_conn)
+                    smtp_conn = None
+
+                if smtp_conn is None:
+                    conn_sent_count = 0
+
+                next_conn = self.__send(smtp_conn, mail)
+                conn_sent_count = conn_sent_count + 1 if next_conn is smtp_conn else 1
+                smtp_conn = next_conn
+            except Exception as exc:  # pylint: disable=broad-except
+                # Keep the worker alive, so the queue is still drained
+                logger.exception(exc)
+                self.__count(mail, DeliveryResult.FAILED)
+            finally:
+                self.__queue.task_done()
+
+        if smtp_conn is not None:
+            self.__smtp_disconnect(smtp_conn)
+
+        self.__queue.task_done()
+
+    def send_to(
+        self,
+        policy_domain: PolicyDomain,
+        sender_addr: str,
+        receiver_addr: str,
+        subject: str,
+        replyto_addr: str,
+        bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
+    ):
+        """
+        Renders and encodes the mail and queues it for sending. Blocks while the
+        queue is full. If the report has already been rendered
+        (with SMTP_NEWLINE line endings), rendered_html is sent instead.
+        delivered is called with the result by the worker sending the mail.
+        """
+        recipients, message = encode_report_mail(
+            self.__template,
+            policy_domain,
+            sender_addr,
+            receiver_addr,
+            subject,
+            replyto_addr,
+            bcc_addr,
+            rendered_html,
+            extra_reports,
+        )
+
+        logger.info("Queueing report for %s to %s.", policy_domain.name, receiver_addr)
+        self.send_mail(
+            QueuedMail(policy_domain.name, sender_addr, recipients, message, delivered)
+        )
+
+    def send_mail(self, mail: QueuedMail):
+        """
+        Queues an encoded mail for sending. Blocks while the queue is full.
+        """
+        self.__queue.put(mail)
+
+    def flush(self):
+        """
+        Waits for all queued mails to be sent.
+        """
+        self.__queue.join()
+
+    def close(self):
+        """
+        Waits for all queued mails to be sent and closes all connections.
+        """
+        for _ in self.__workers:
+            self.__queue.put(None)
+
+        for worker in self.__workers:
+            worker.join()
+
+        self.__workers = []
+
+        logger.info(
+            "Sent %d mails, %d mails failed.", self.sent_count, self.failed_count
+        )
@@ -0,0 +1,92 @@
+"""
+Contains the RenderCache class which stores rendered reports, so reports which
+are both sent as mail and exported as HTML are only rendered once per run.
+"""
+
+import os
+import hashlib
+import tempfile
+
+from parsing.template_registry import get_registry
+
+# Identifies a report: (instance, policy domain name, contact group)
+# The contact group is empty for reports of whole policy domains.
+ReportKey = tuple[str, str, str]
+
+
+class RenderCache:
+    """
+    RenderCache stores rendered reports as files, keyed by their report key and
+    the hash of the template they are rendered from.
+    If a directory is supplied, the reports persist across runs, e.g. for
+    replaying pickled data. Otherwise they are stored in a temporary directory,
+    which is removed on close.
+
+    Args:
+        template_path:  Path to the jinja2 template the reports are rendered from
+        directory:      Directory to store the rendered reports in
+    """
+
+    def __init__(self, template_path: str, directory: str | None = None):
+        self.__template_hash = get_registry().template_hash(template_path)
+        self.__temp_dir = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.__directory = directory
+        else:
+            self.__temp_dir = tempfile.TemporaryDirectory(prefix="tsm_mail_renders_")
+            self.__directory = self.__temp_dir.name
+
+    def path(self, key: ReportKey) -> str:
+        """
+        Returns the path of the file the report is stored in.
+        """
+        file_name = hashlib.sha256(
+            "\0".join((self.__template_hash, *key)).encode("utf-8")
+        ).hexdigest()
+
+        return os.path.join(self.__directory, f"{file_name}.html")
+
+    def __contains__(self, key: ReportKey) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def get(self, key: ReportKey) -> bytes | None:
+        """
+        Returns the rendered report or None if it hasn't been stored yet.
+        """
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: ReportKey, rendered_html: bytes):
+        """
+        Stores a rendered report. The file is replaced atomically, so an
+        interrupted run never leaves a partial report behind.
+        """
+        path = self.path(key)
+
+        with tempfile.NamedTemporaryFile(
+            dir=self.__directory, suffix=".tmp", delete=False
+        ) as file:
+            file.write(rendered_html)
+
+        os.replace(file.name, path)
+
+    def clear(self):
+        """
+        Removes all stored reports, e.g. when the reported data has changed.
+        """
+        for entry in os.scandir(self.__directory):
+            if entry.is_file() and entry.name.endswith((".html", ".tmp")):
+                os.remove(entry.path)
+
+    def close(self):
+        """
+        Removes the temporary directory of the cache, if there is one.
+        """
+        if self.__temp_dir:
+            self.__temp_dir.cleanup()
+            self.__temp_dir = None
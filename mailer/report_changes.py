@@ -0,0 +1,227 @@
+"""
+Contains the change detection of the mail reports. Each report is fingerprinted
+from the parsed data it shows, the fingerprints and statuses of sent reports
+are stored between runs, so unchanged reports can be skipped.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from enum import Enum
+from dataclasses import dataclass
+
+from parsing.policy_domain import PolicyDomain
+from mailer.mailer import DeliveryResult
+from mailer.render_cache import ReportKey
+
+logger = logging.getLogger("main")
+
+
+class ReportChangePolicy(Enum):
+    """
+    ReportChangePolicy describes which reports are sent.
+    ALWAYS sends all reports, CHANGED only reports whose data has changed since
+    they were last sent and STATUS only reports whose status has changed
+    (e.g. from OKAY to WARN) since they were last sent.
+    """
+
+    ALWAYS = "always"
+    CHANGED = "changed"
+    STATUS = "status"
+
+
+def report_status(policy_domain: PolicyDomain) -> str:
+    """
+    Returns the status of the report of a policy domain as shown in the mail subject.
+    """
+    return "OKAY" if not policy_domain.has_non_successful_schedules() else "WARN"
+
+
+def report_fingerprint(
+    policy_domain: PolicyDomain, recipients: str, template_hash: str = ""
+) -> str:
+    """
+    Returns a fingerprint of everything shown in the report of a policy domain,
+    calculated from the parsed data of its nodes. Reports with equal fingerprints
+    are rendered identically, as long as the template (template_hash) is the same.
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(repr((template_hash, recipients, policy_domain.name)).encode())
+
+    for node in policy_domain.nodes:
+        schedules = node.schedules
+        fingerprint.update(
+            repr(
+                (
+                    node.name,
+                    node.platform,
+                    node.decomm_state,
+                    node.backupresult.to_record(),
+                    (
+                        sorted(
+                            (name, sched_stat.to_record())
+                            for name, sched_stat in schedules.items()
+                        )
+                        if schedules is not None
+                        else None
+                    ),
+                    [vm_result.to_record() for vm_result in node.vm_results],
+                )
+            ).encode()
+        )
+
+    return fingerprint.hexdigest()
+
+
+class ReportChangeDetector:
+    """
+    ReportChangeDetector decides which reports are sent according to the change
+    policy and keeps the state of the sent reports in a JSON file between runs.
+    Decisions are logged and counted.
+
+    Args:
+        state_path:     Path to the JSON file containing the state of sent reports
+        policy:         Policy deciding which reports are sent
+    """
+
+    def __init__(
+        self,
+        state_path: str,
+        policy: ReportChangePolicy = ReportChangePolicy.CHANGED,
+    ):
+        self.__state_path = state_path
+        self.policy = policy
+        self.sent_count = 0
+        self.unchanged_count = 0
+        self.same_status_count = 0
+
+        # State of sent reports: report key -> (fingerprint, status)
+        self.__states = self.__load_states()
+        # States recorded by this run, e.g. while draining a mail spool
+        self.__recorded: dict[ReportKey, tuple[str, str]] = {}
+        self.__lock = threading.Lock()
+
+    def __load_states(self) -> dict[ReportKey, tuple[str, str]]:
+        if not os.path.isfile(self.__state_path):
+            return {}
+
+        with open(self.__state_path, "r", encoding="utf-8") as state_file:
+            return {
+                (entry["instance"], entry["policy_domain"], entry["contact_group"]): (
+                    entry["fingerprint"],
+                    entry["status"],
+                )
+                for entry in json.load(state_file)["reports"]
+            }
+
+    def should_send(self, key: ReportKey, fingerprint: str, status: str) -> bool:
+        """
+        Checks if a report has to be sent according to the change policy.
+        Reports which have never been sent are always sent.
+        """
+        if self.policy is ReportChangePolicy.ALWAYS or key not in self.__states:
+            return True
+
+        last_fingerprint, last_status = self.__states[key]
+
+        if (
+            self.policy is ReportChangePolicy.CHANGED
+            and fingerprint == last_fingerprint
+        ):
+            logger.info("Skipping unchanged report for %s.", "/".join(key[:2]))
+            self.unchanged_count += 1
+            return False
+
+        if self.policy is ReportChangePolicy.STATUS and status == last_status:
+            logger.info(
+                "Skipping report for %s, status is still %s.",
+                "/".join(key[:2]),
+                status,
+            )
+            self.same_status_count += 1
+            return False
+
+        return True
+
+    def record_sent(self, key: ReportKey, fingerprint: str, status: str):
+        """
+        Records the state of a report which has been sent.
+        Mailers sending concurrently record the state from their own threads.
+        """
+        with self.__lock:
+            self.__states[key] = (fingerprint, status)
+            self.__recorded[key] = (fingerprint, status)
+            self.sent_count += 1
+
+    def save(self):
+        """
+        Writes the state of all sent reports to the state file and logs
+        the counts of the decisions. Only the states recorded by this run are
+        written over the current file, so runs sending reports and runs draining
+        the mail spool don't discard each other's states.
+        """
+        logger.info(
+            "Sent %d reports, skipped %d unchanged reports and %d reports "
+            "without status change.",
+            self.sent_count,
+            self.unchanged_count,
+            self.same_status_count,
+        )
+
+        states = self.__load_states()
+        states.update(self.__recorded)
+
+        state = {
+            "reports": [
+                {
+                    "instance": instance,
+                    "policy_domain": policy_domain,
+                    "contact_group": contact_group,
+                    "fingerprint": fingerprint,
+                    "status": status,
+                }
+                for (instance, policy_domain, contact_group), (
+                    fingerprint,
+                    status,
+                ) in states.items()
+            ]
+        }
+
+        # Replace the state file atomically, so an interrupted run keeps the old state
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=os.path.dirname(os.path.abspath(self.__state_path)),
+            suffix=".tmp",
+            delete=False,
+            encoding="utf-8",
+        ) as state_file:
+            json.dump(state, state_file, indent=2)
+
+        os.replace(state_file.name, self.__state_path)
+
+
+@dataclass
+class ReportDelivery:
+    """
+    ReportDelivery records the states of the reports contained in a mail, once
+    the mail has been sent. It is passed to the mailers as their delivered callback,
+    the mail spool stores the states with the spooled mail instead.
+
+    Args:
+        change_detector:    Change detector recording the states
+        states:             Key, fingerprint and status of each report of the mail
+    """
+
+    change_detector: ReportChangeDetector
+    states: list[tuple[ReportKey, str, str]]
+
+    def __call__(self, result: DeliveryResult):
+        # Reports of failed or rejected mails are sent again on the next run
+        if result is not DeliveryResult.SENT:
+            return
+
+        for key, fingerprint, status in self.states:
+            self.change_detector.record_sent(key, fingerprint, status)
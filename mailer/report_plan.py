@@ -0,0 +1,150 @@
+"""
+Contains the planning stage of the mail reports. It determines the recipients and
+the reported policy domain of every mail before any report is rendered.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from parsing.tsm_data import TSMData
+from parsing.node import Node
+from parsing.policy_domain import PolicyDomain
+from parsing.backup_result_store import BackupResultStore
+from mailer.render_cache import ReportKey
+
+logger = logging.getLogger("main")
+
+
+@dataclass
+class ReportJob:
+    """
+    ReportJob describes a single mail report.
+
+    Args:
+        instance:       TSM server instance the report belongs to
+        policy_domain:  Policy domain or collection of loose nodes to report
+        recipients:     Normalised contact string of the recipients
+        contact_group:  Contacts of a collection of loose nodes, empty if the
+                        whole policy domain is reported
+    """
+
+    instance: str
+    policy_domain: PolicyDomain
+    recipients: str
+    contact_group: str = ""
+
+    def report_key(self) -> ReportKey:
+        """
+        Returns the key identifying the rendered report, e.g. in a render cache.
+        """
+        return self.instance, self.policy_domain.name, self.contact_group
+
+    def recipient_set(self) -> frozenset[str]:
+        """
+        Returns the set of mail addresses the report is sent to.
+        """
+        return frozenset(
+            address.strip() for address in self.recipients.split(",") if address.strip()
+        )
+
+
+def collect_loose_nodes(
+    pd_name: str,
+    nodes_by_contact: dict[str, list[Node]],
+    backup_results: BackupResultStore | None = None,
+) -> dict[str, PolicyDomain] | None:
+    """
+    Create a collection containing all nodes of the policy domain pd_name which
+    have individual contacts defined instead of being part of a policy domain with
+    a defined contact. Nodes are taken from nodes_by_contact, the nodes of the
+    instance indexed by their normalised contacts.
+    If the backup result store of the instance is supplied, the summaries of all
+    collections are calculated from it at once.
+    The collections don't register on their nodes, as they are only used for a
+    single report.
+    """
+    loose_nodes_collection: dict[str, PolicyDomain] = {}
+
+    for contacts, nodes in nodes_by_contact.items():
+        for node in nodes:
+            if node.policy_domain_name != pd_name:
+                continue
+
+            if contacts not in loose_nodes_collection:
+                loose_nodes_collection[contacts] = PolicyDomain(
+                    name=pd_name, register_nodes=False
+                )
+
+            # Summaries are added up in place, unless they are taken from the
+            # backup result store afterwards.
+            loose_nodes_collection[contacts].add_node(
+                node, update_summaries=not backup_results
+            )
+
+    if backup_results:
+        summaries = backup_results.summaries(
+            [node.name for node in pd.nodes] for pd in loose_nodes_collection.values()
+        )
+
+        for pd, (client_summary, vm_summary) in zip(
+            loose_nodes_collection.values(), summaries
+        ):
+            pd.client_backup_summary = client_summary
+            if vm_summary:
+                pd.vm_backup_summary = vm_summary
+
+    # Nodes of lazily parsed policy domains haven't been sorted yet
+    for pd in loose_nodes_collection.values():
+        pd.nodes.sort(key=lambda x: x.backupresult.failed, reverse=True)
+
+    return loose_nodes_collection
+
+
+def plan_mail_reports(
+    instances: list[str], data: dict[str, TSMData]
+) -> list[ReportJob]:
+    """
+    Plans the mail reports of all instances. Policy domains with a contact are
+    reported to their contact, nodes with individual contacts in a policy domain
+    without contact are collected and reported to their contacts.
+    """
+    jobs: list[ReportJob] = []
+
+    for inst in instances:
+        if inst not in data:
+            logger.error("Instance name not found in pickled data.")
+            break
+
+        for contacts, policy_domains in data[inst].domains_by_contact.items():
+            for policy_domain in policy_domains:
+                jobs.append(ReportJob(inst, policy_domain, contacts))
+
+        # Loose nodes are collected from the first policy domain holding any
+        loose_domains = {
+            node.policy_domain_name
+            for nodes in data[inst].nodes_by_contact.values()
+            for node in nodes
+        }
+        loose_domain = next(
+            (name for name in data[inst].domains if name in loose_domains), None
+        )
+
+        # Plan mail reports for collected loose nodes
+        if loose_domain is None:
+            logger.info("No nodes in loose_nodes to process.")
+            continue
+
+        loose_nodes = collect_loose_nodes(
+            loose_domain, data[inst].nodes_by_contact, data[inst].backup_results
+        )
+
+        for contact, policy_domain in loose_nodes.items():
+            jobs.append(ReportJob(inst, policy_domain, contact, contact))
+
+    logger.info(
+        "Planned %d mail reports for %d distinct recipients.",
+        len(jobs),
+        len({address for job in jobs for address in job.recipient_set()}),
+    )
+
+    return jobs
@@ -0,0 +1,172 @@
+"""
+Contains the render stage of the mail reports. Reports can be rendered across
+multiple processes, each of them loading the report template only once.
+Rendered reports are returned as UTF-8 encoded HTML and can be shared between
+mail sending and HTML export through a render cache.
+"""
+
+import io
+import os
+import multiprocessing as mp
+from functools import partial
+from typing import Hashable, Iterable, Iterator, TypeVar
+
+from parsing.policy_domain import PolicyDomain
+from parsing.report_template import ReportTemplate
+from parsing.constants import RENDER_PARALLEL_THRESHOLD, RENDER_CHUNK_SIZE
+from mailer.render_cache import RenderCache, ReportKey
+
+Key = TypeVar("Key", bound=Hashable)
+
+# Report template of a rendering process
+__worker_template: ReportTemplate | None = None
+
+
+def __init_worker(template_path: str):
+    global __worker_template  # pylint: disable=global-statement
+    __worker_template = ReportTemplate(template_path)
+
+
+def __render_report(
+    template: ReportTemplate, policy_domain: PolicyDomain, newline: str
+) -> bytes:
+    # Stream the report into a buffer instead of building the HTML string
+    buffer = io.BytesIO()
+    template.render_to(policy_domain, buffer, newline)
+    return buffer.getvalue()
+
+
+def __render_worker_report(
+    newline: str, report: tuple[Key, PolicyDomain]
+) -> tuple[Key, bytes]:
+    key, policy_domain = report
+    return key, __render_report(__worker_template, policy_domain, newline)
+
+
+def use_render_pool(
+    report_count: int,
+    processes: int | None = 1,
+    parallel_threshold: int = RENDER_PARALLEL_THRESHOLD,
+) -> bool:
+    """
+    Checks if report_count reports are rendered on a pool of processes.
+    """
+    return processes != 1 and report_count >= parallel_threshold
+
+
+def __render_uncached(
+    template_path: str,
+    reports: list[tuple[Key, PolicyDomain]],
+    processes: int | None,
+    parallel_threshold: int,
+    chunk_size: int,
+    newline: str,
+) -> Iterator[tuple[Key, bytes]]:
+    if not use_render_pool(len(reports), processes, parallel_threshold):
+        template = ReportTemplate(template_path)
+        for key, policy_domain in reports:
+            yield key, __render_report(template, policy_domain, newline)
+        return
+
+    with mp.Pool(
+        processes, initializer=__init_worker, initargs=(template_path,)
+    ) as pool:
+        yield from pool.imap_unordered(
+            partial(__render_worker_report, newline), reports, chunk_size
+        )
+
+
+def __with_newline(rendered_html: bytes, newline: str) -> bytes:
+    # Cached reports are stored with "\n" line endings
+    if newline == "\n":
+        return rendered_html
+
+    return rendered_html.replace(b"\n", newline.encode("utf-8"))
+
+
+def render_reports(
+    template_path: str,
+    reports: Iterable[tuple[Key, PolicyDomain]],
+    processes: int | None = 1,
+    parallel_threshold: int = RENDER_PARALLEL_THRESHOLD,
+    chunk_size: int = RENDER_CHUNK_SIZE,
+    newline: str = "\n",
+    cache: RenderCache | None = None,
+) -> Iterator[tuple[Key, bytes]]:
+    """
+    Renders the reports of the policy domains and yields them with their keys.
+    If processes is not 1 and there are at least parallel_threshold reports,
+    they are rendered on a pool of processes (None uses all CPU cores) and
+    yielded in the order they are completed. Otherwise they are rendered one
+    after another, in order. Line endings are rendered as newline, e.g.
+    SMTP_NEWLINE for reports sent as mail.
+    If a render cache is supplied, keys have to be report keys. Cached reports
+    are yielded first, the other reports are stored in the cache once rendered.
+    Pending logs of the policy domains should be parsed beforehand, otherwise
+    each rendering process parses them again.
+    """
+    reports = list(reports)
+
+    if cache is None:
+        yield from __render_uncached(
+            template_path, reports, processes, parallel_threshold, chunk_size, newline
+        )
+        return
+
+    missing = []
+    for key, policy_domain in reports:
+        rendered_html = cache.get(key)
+        if rendered_html is None:
+            missing.append((key, policy_domain))
+        else:
+            yield key, __with_newline(rendered_html, newline)
+
+    for key, rendered_html in __render_uncached(
+        template_path, missing, processes, parallel_threshold, chunk_size, "\n"
+    ):
+        cache.put(key, rendered_html)
+        yield key, __with_newline(rendered_html, newline)
+
+
+def report_file_name(key: ReportKey) -> str:
+    """
+    Returns the file name of an exported report.
+    """
+    return "_".join(part for part in key if part) + "_report.html"
+
+
+def export_reports(
+    template_path: str,
+    reports: Iterable[tuple[ReportKey, PolicyDomain]],
+    output_dir: str = ".",
+    processes: int | None = 1,
+    parallel_threshold: int = RENDER_PARALLEL_THRESHOLD,
+    chunk_size: int = RENDER_CHUNK_SIZE,
+    cache: RenderCache | None = None,
+):
+    """
+    Renders the reports of the policy domains into HTML files in output_dir.
+    On a single process and without a render cache, reports are streamed into
+    their files directly.
+    """
+    reports = list(reports)
+
+    if cache is None and not use_render_pool(
+        len(reports), processes, parallel_threshold
+    ):
+        template = ReportTemplate(template_path)
+        for key, policy_domain in reports:
+            with open(os.path.join(output_dir, report_file_name(key)), "wb") as file:
+                template.render_to(policy_domain, file)
+        return
+
+    for key, rendered_html in render_reports(
+        template_path,
+        reports,
+        processes,
+        parallel_threshold,
+        chunk_size,
+        cache=cache,
+    ):
+        with open(os.path.join(output_dir, report_file_name(key)), "wb") as file:
+            file.write(rendered_html)
@@ -2,20 +2,107 @@
 status_mailer.py generates status mails from node and policy domain data
 """
 
+import io
+import time
 import logging
 import smtplib
-from smtplib import SMTPException
+from smtplib import SMTPException, SMTPServerDisconnected
 from email.message import EmailMessage
+from typing import Callable
+from email.utils import getaddresses
 
 from parsing.policy_domain import PolicyDomain
 from parsing.report_template import ReportTemplate
+from parsing.constants import SMTP_NEWLINE, SMTP_IDLE_THRESHOLD
+from parsing.contacts import unique_addresses
+from mailer.mailer import DeliveryResult
 
 logger = logging.getLogger("main")
 
 
+def encode_report_mail(
+    template: ReportTemplate,
+    policy_domain: PolicyDomain,
+    sender_addr: str,
+    receiver_addr: str,
+    subject: str,
+    replyto_addr: str,
+    bcc_addr: str,
+    rendered_html: bytes | None = None,
+    extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+) -> tuple[list[str], bytes]:
+    """
+    Encodes the report mail of a policy domain with SMTP line endings and returns
+    the addresses of its recipients along with it. The report is streamed into the
+    encoded message, following its headers. If the report has already been rendered
+    (with SMTP_NEWLINE line endings), rendered_html is used instead.
+    Mails with extra reports contain each report as an inline HTML part.
+    """
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = sender_addr
+    message["To"] = receiver_addr
+    recipients = [receiver_addr]
+
+    if replyto_addr:
+        message["Reply-to"] = replyto_addr
+    else:
+        logger.info("No Reply-to configured. Skipping.")
+
+    # Bcc addresses are only passed to the SMTP server, not sent in the headers
+    if bcc_addr:
+        recipients.append(bcc_addr)
+    else:
+        logger.info("No Bcc configured. Skipping.")
+
+    message.add_header("X-Auto-Response-Suppress", "All")
+
+    # Each address only receives the mail once
+    recipients = unique_addresses([address for _, address in getaddresses(recipients)])
+
+    if extra_reports:
+        for report_domain, report_html in [
+            (policy_domain, rendered_html),
+            *extra_reports,
+        ]:
+            if report_html is None:
+                report_buffer = io.BytesIO()
+                template.render_to(report_domain, report_buffer, SMTP_NEWLINE)
+                report_html = report_buffer.getvalue()
+
+            message.add_attachment(
+                report_html.decode("utf-8"),
+                subtype="html",
+                disposition="inline",
+                filename=f"{report_domain.name}.html",
+            )
+
+        return recipients, message.as_bytes(
+            policy=message.policy.clone(linesep=SMTP_NEWLINE)
+        )
+
+    # The rendered report follows the headers as raw UTF-8
+    message.add_header("Content-Type", "text/html", charset="utf-8")
+    message.add_header("Content-Transfer-Encoding", "8bit")
+
+    buffer = io.BytesIO()
+    buffer.write(message.as_bytes(policy=message.policy.clone(linesep=SMTP_NEWLINE)))
+
+    # Render HTML template of message containing node data from TSM nodes
+    if rendered_html is not None:
+        buffer.write(rendered_html)
+    else:
+        template.render_to(policy_domain, buffer, SMTP_NEWLINE)
+
+    return recipients, buffer.getvalue()
+
+
 class StatusMailer:
     """
     StatusMailer sends mails containing status information to registered nodes.
+    The connection is only checked before sending if it has been idle for longer
+    than idle_threshold seconds. A mail which fails because the connection has
+    been lost is sent again over a new connection.
 
     Args:
         smtp_host:        The mailer host to connect to
@@ -23,6 +110,8 @@ class StatusMailer:
         template_path:    Path to jinja2 template for mail body
         smtp_credentials: Tuple containing user / password for authentication
                           with the SMTP server
+        idle_threshold:   Seconds of idle time after which the connection is checked
+        starttls:         Flag to secure the connection using STARTTLS
     """
 
     def __init__(
@@ -31,11 +120,18 @@ class StatusMailer:
         smtp_port: int,
         template_path: str,
         smtp_credentials: tuple[str, str] | None = None,
+        idle_threshold: float = SMTP_IDLE_THRESHOLD,
+        starttls: bool = True,
     ):
         self.__smtp_host = smtp_host
         self.__smtp_port = smtp_port
-        self.__smtp_conn = None
+        self.__smtp_conn: smtplib.SMTP | None = None
         self.__smtp_credentials = smtp_credentials
+        self.__idle_threshold = idle_threshold
+        self.__starttls = starttls
+
+        # Time the last mail has been sent
+        self.__last_used = 0.0
 
         # Load jinja2 mail HTML template
         self.__template = ReportTemplate(template_path)
@@ -54,15 +150,34 @@ class StatusMailer:
         return status == 250
 
     def __smtp_connect(self):
+        self.close()
+
         logger.info(
             "Connecting to %s at port %s...", self.__smtp_host, self.__smtp_port
         )
         self.__smtp_conn = smtplib.SMTP(self.__smtp_host, self.__smtp_port)
-        self.__smtp_conn.starttls()
+
+        if self.__starttls:
+            self.__smtp_conn.starttls()
 
         if self.__smtp_credentials:
             self.__smtp_conn.login(*self.__smtp_credentials)
 
+    def close(self):
+        """
+        Closes the connection to the SMTP server.
+        """
+        if self.__smtp_conn:
+            try:
+                self.__smtp_conn.quit()
+            except OSError:
+                # The connection has already been closed by the server
+                pass
+            finally:
+                self.__smtp_conn.close()
+
+            self.__smtp_conn = None
+
     def send_to(
         self,
         policy_domain: PolicyDomain,
@@ -71,35 +186,45 @@ class StatusMailer:
         subject: str,
         replyto_addr: str,
         bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
     ):
         """
         Renders the mail template and sends it using the smtp library.
+        If the report has already been rendered (with SMTP_NEWLINE line endings),
+        rendered_html is sent instead. delivered is called once the mail has been sent,
+        failures are raised.
         """
-        # Establish connection to the SMTP server if it is not established / timed out
-        if not self.__smtp_conn or not self.__smtp_connected():
-            self.__smtp_connect()
-
-        message = EmailMessage()
-        message["Subject"] = subject
-        message["From"] = sender_addr
-        message["To"] = receiver_addr
-
-        if replyto_addr:
-            message["Reply-to"] = replyto_addr
-        else:
-            logger.info("No Reply-to configured. Skipping.")
+        recipients, message = encode_report_mail(
+            self.__template,
+            policy_domain,
+            sender_addr,
+            receiver_addr,
+            subject,
+            replyto_addr,
+            bcc_addr,
+            rendered_html,
+            extra_reports,
+        )
 
-        if bcc_addr:
-            message["Bcc"] = bcc_addr
-        else:
-            logger.info("No Bcc configured. Skipping.")
+        # Establish connection to the SMTP server if it is not established.
+        # Only connections which have been idle for a while may have timed out.
+        if not self.__smtp_conn or (
+            time.monotonic() - self.__last_used > self.__idle_threshold
+            and not self.__smtp_connected()
+        ):
+            self.__smtp_connect()
 
-        # Render HTML template of message containing node data from TSM nodes
-        message_html = self.__template.render(policy_domain)
+        logger.info("Sending report for %s to %s.", policy_domain.name, receiver_addr)
+        try:
+            self.__smtp_conn.sendmail(sender_addr, recipients, message)
+        except (SMTPServerDisconnected, ConnectionError) as exc:
+            logger.warning("Connection to %s lost (%s).", self.__smtp_host, exc)
+            self.__smtp_connect()
+            self.__smtp_conn.sendmail(sender_addr, recipients, message)
 
-        message.add_header("Content-Type", "text/html")
-        message.add_header("X-Auto-Response-Suppress", "All")
-        message.set_payload(message_html)
+        self.__last_used = time.monotonic()
 
-        logger.info("Sending report for %s to %s.", policy_domain.name, receiver_addr)
-        self.__smtp_conn.send_message(message)
+        if delivered is not None:
+            delivered(DeliveryResult.SENT)
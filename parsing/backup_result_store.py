@@ -0,0 +1,138 @@
+"""
+Contains the BackupResultStore class which holds the client and VM backup results
+of all nodes of a TSM server instance in columns, so summaries of policy domains
+and contact groups can be calculated with vectorized grouped sums.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+from parsing.node import Node
+from parsing.client_backup_result import ClientBackupResult
+from parsing.vmresult import VMResult
+
+# Columns of the client backup results which are summed up in summaries
+CLIENT_SUM_FIELDS = (
+    "inspected",
+    "backed_up",
+    "updated",
+    "expired",
+    "failed",
+    "retries",
+    "bytes_inspected",
+    "bytes_transferred",
+    "aggregate_data_rate",
+)
+
+# Columns of the client backup results of which the maximum is shown in summaries
+CLIENT_MAX_FIELDS = ("processing_time",)
+
+
+class BackupResultStore:
+    """
+    BackupResultStore holds the backup results of all nodes in columnar arrays.
+    Client backup result columns are indexed by node, VM backup result columns
+    hold one row per VM result together with the index of the node taking the backup.
+
+    Args:
+        nodes:  Nodes of the instance, keyed by node name
+    """
+
+    def __init__(self, nodes: dict[str, Node]):
+        self.node_names: list[str] = list(nodes)
+        self.node_indices: dict[str, int] = {
+            name: i for i, name in enumerate(self.node_names)
+        }
+
+        self.client_sums = np.array(
+            [
+                [getattr(node.backupresult, field) for field in CLIENT_SUM_FIELDS]
+                for node in nodes.values()
+            ],
+            dtype=np.float64,
+        ).reshape(len(nodes), len(CLIENT_SUM_FIELDS))
+        self.client_maxes = np.array(
+            [
+                [getattr(node.backupresult, field) for field in CLIENT_MAX_FIELDS]
+                for node in nodes.values()
+            ],
+            dtype=np.float64,
+        ).reshape(len(nodes), len(CLIENT_MAX_FIELDS))
+
+        vm_results = [
+            (node_index, vm_result)
+            for node_index, node in enumerate(nodes.values())
+            for vm_result in node.vm_results
+        ]
+
+        self.vm_node_index = np.array([i for i, _ in vm_results], dtype=np.int64)
+        self.vm_backed_up_bytes = np.array(
+            [vm_result.backed_up_bytes for _, vm_result in vm_results], dtype=np.int64
+        )
+        self.vm_elapsed_seconds = np.array(
+            [vm_result.elapsed_seconds for _, vm_result in vm_results], dtype=np.int64
+        )
+
+    def group_index(self, groups: Iterable[Iterable[str]]) -> np.ndarray:
+        """
+        Returns an array mapping each node index to the index of its group.
+        Nodes not contained in any group are mapped to -1.
+        """
+        index = np.full(len(self.node_names), -1, dtype=np.int64)
+
+        for group, node_names in enumerate(groups):
+            for node_name in node_names:
+                index[self.node_indices[node_name]] = group
+
+        return index
+
+    def summaries(
+        self, groups: Iterable[Iterable[str]]
+    ) -> list[tuple[ClientBackupResult, VMResult | None]]:
+        """
+        Calculates the client and VM backup summaries for each group of node names.
+        The VM backup summary of a group is None if its nodes have no VM results.
+        """
+        groups = list(groups)
+        group_count = len(groups)
+        node_group = self.group_index(groups)
+        member = node_group >= 0
+
+        # Sums are accumulated in node order, the same order as adding up
+        # the results of the nodes one by one.
+        client_sums = np.zeros((group_count, len(CLIENT_SUM_FIELDS)))
+        np.add.at(client_sums, node_group[member], self.client_sums[member])
+
+        client_maxes = np.zeros((group_count, len(CLIENT_MAX_FIELDS)))
+        np.maximum.at(client_maxes, node_group[member], self.client_maxes[member])
+
+        vm_group = node_group[self.vm_node_index]
+        vm_member = vm_group >= 0
+
+        vm_counts = np.bincount(vm_group[vm_member], minlength=group_count)
+        vm_bytes = np.zeros(group_count, dtype=np.int64)
+        np.add.at(vm_bytes, vm_group[vm_member], self.vm_backed_up_bytes[vm_member])
+        vm_elapsed = np.zeros(group_count, dtype=np.int64)
+        np.maximum.at(
+            vm_elapsed, vm_group[vm_member], self.vm_elapsed_seconds[vm_member]
+        )
+
+        summaries: list[tuple[ClientBackupResult, VMResult | None]] = []
+
+        for group in range(group_count):
+            client_summary = ClientBackupResult()
+            for field, value in zip(CLIENT_SUM_FIELDS, client_sums[group].tolist()):
+                setattr(client_summary, field, value)
+            for field, value in zip(CLIENT_MAX_FIELDS, client_maxes[group].tolist()):
+                setattr(client_summary, field, value)
+
+            vm_summary = None
+            if vm_counts[group]:
+                vm_summary = VMResult()
+                vm_summary.backed_up_bytes = int(vm_bytes[group])
+                vm_summary.elapsed_seconds = int(vm_elapsed[group])
+
+            summaries.append((client_summary, vm_summary))
+
+        return summaries
@@ -32,6 +32,23 @@ class ClientBackupResult:
     the parsed data.
     """
 
+    __slots__ = (
+        "inspected",
+        "backed_up",
+        "updated",
+        "expired",
+        "failed",
+        "retries",
+        "bytes_inspected",
+        "bytes_inspected_unit",
+        "bytes_transferred",
+        "bytes_transferred_unit",
+        "aggregate_data_rate",
+        "aggregate_data_rate_unit",
+        "processing_time",
+        "node_name",
+    )
+
     def __init__(self, node_name: str = ""):
         self.inspected = 0
         self.backed_up = 0
@@ -53,6 +70,44 @@ class ClientBackupResult:
 
         self.node_name = node_name
 
+    def to_record(self) -> tuple:
+        """
+        Returns the parsed values as a compact tuple of plain values, e.g. for
+        passing parsed results between processes.
+        """
+        return (
+            self.inspected,
+            self.backed_up,
+            self.updated,
+            self.expired,
+            self.failed,
+            self.retries,
+            self.bytes_inspected,
+            self.bytes_transferred,
+            self.aggregate_data_rate,
+            self.processing_time,
+        )
+
+    @classmethod
+    def from_record(cls, record: tuple, node_name: str = "") -> "ClientBackupResult":
+        """
+        Creates a client backup result from a tuple returned by to_record.
+        """
+        cl_res = cls(node_name)
+        (
+            cl_res.inspected,
+            cl_res.backed_up,
+            cl_res.updated,
+            cl_res.expired,
+            cl_res.failed,
+            cl_res.retries,
+            cl_res.bytes_inspected,
+            cl_res.bytes_transferred,
+            cl_res.aggregate_data_rate,
+            cl_res.processing_time,
+        ) = record
+        return cl_res
+
     def __parse_size(self, size: str) -> float:
         # Parse memory sizes to bytes as int
         units = {"B": 1, "KB": 10**3, "MB": 10**6, "GB": 10**9, "TB": 10**12}
@@ -282,6 +337,36 @@ class ClientBackupResult:
 
         return cl_res
 
+    def __iadd__(self, other) -> "ClientBackupResult":
+        # Add up backup results in place, without allocating a new result
+        self.inspected += other.inspected
+        self.backed_up += other.backed_up
+        self.updated += other.updated
+        self.expired += other.expired
+        self.failed += other.failed
+        self.retries += other.retries
+        self.bytes_inspected += other.bytes_inspected
+        self.bytes_transferred += other.bytes_transferred
+        self.aggregate_data_rate += other.aggregate_data_rate
+        self.processing_time = max(self.processing_time, other.processing_time)
+
+        return self
+
+    def __isub__(self, other) -> "ClientBackupResult":
+        # Subtract backup results in place. The processing time is a maximum
+        # and can't be reverted, it has to be recalculated by the caller.
+        self.inspected -= other.inspected
+        self.backed_up -= other.backed_up
+        self.updated -= other.updated
+        self.expired -= other.expired
+        self.failed -= other.failed
+        self.retries -= other.retries
+        self.bytes_inspected -= other.bytes_inspected
+        self.bytes_transferred -= other.bytes_transferred
+        self.aggregate_data_rate -= other.aggregate_data_rate
+
+        return self
+
     def __str__(self):
         table = tabulate.tabulate(
             [
@@ -11,10 +11,58 @@ LOG_LEVEL_DEBUG_STR = "DEBUG"
 # Number contants
 HISTORY_MAX_ITEMS = 15
 
+# Format of timestamps returned by dsmadmc
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Minimum number of nodes for parsing node logs on multiple processes
+PARSE_PARALLEL_THRESHOLD = 500
+
+# Number of nodes sent to a parsing process at once
+PARSE_CHUNK_SIZE = 16
+
+# Number of chunks of node logs waiting for or being parsed per parsing process
+PARSE_PENDING_CHUNKS = 2
+
+# Minimum number of reports for rendering them on multiple processes
+RENDER_PARALLEL_THRESHOLD = 50
+
+# Number of reports sent to a rendering process at once
+RENDER_CHUNK_SIZE = 4
+
+# Number of template output pieces written at once when streaming a report
+RENDER_STREAM_BUFFER = 64
+
+# Line ending of mails sent over SMTP
+SMTP_NEWLINE = "\r\n"
+
+# Seconds an SMTP connection may be idle before it is checked using NOOP before sending
+SMTP_IDLE_THRESHOLD = 30
+
+# Number of attempts to deliver the mails of the spool when draining it, and the seconds
+# waited before the first retry (doubled for each further retry)
+SPOOL_DELIVERY_ATTEMPTS = 3
+SPOOL_RETRY_BACKOFF = 5
+
+# Number of encoded mails queued per pooled SMTP connection, limiting the memory
+# held by mails rendered faster than they are sent
+SMTP_QUEUED_MAILS_PER_CONNECTION = 2
+
+# Default path of the state of sent reports, used to skip unchanged reports
+REPORT_STATE_PATH = "./report_state.json"
+
 # Delimiters
 # dsmadmc line delimiter
 LINE_DELIM = ","
 
+# Quotes enclosing dsmadmc fields which contain delimiters
+FIELD_QUOTE = '"'
+
+# Size of the chunks in which raw dsmadmc output is split into lines
+LINE_CHUNK_SIZE = 1 << 16
+
+# Minimum size of dsmadmc output spilled to disk for memory mapping it
+SPILL_MMAP_THRESHOLD = 16 << 20
+
 # Session number delimiter
 SESSION_NUM_DELIM = "("
 
@@ -0,0 +1,42 @@
+"""
+Contains functions to validate and normalise the mail contacts of policy domains
+and nodes.
+"""
+
+import re
+import logging
+
+logger = logging.getLogger("main")
+
+# Mail regex for validating mail addresses
+CONTACT_REGEX = re.compile(
+    r"(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7},? *\b)+"
+)
+
+
+def parse_contacts(contact_str: str) -> str | None:
+    """
+    Parse e-mail strings using regex.
+    Each distinct contact string of an instance is validated once by
+    TSMData.build_indexes.
+    """
+    contacts = contact_str.replace(";", ",")
+
+    if not CONTACT_REGEX.fullmatch(contacts):
+        logger.error(
+            "Error validating mail address: %s. Mail address is not valid.", contacts
+        )
+        return None
+
+    return contacts
+
+
+def unique_addresses(addresses: list[str]) -> list[str]:
+    """
+    Removes duplicate mail addresses, ignoring their case and keeping their order.
+    """
+    unique: dict[str, str] = {}
+    for address in addresses:
+        unique.setdefault(address.casefold(), address)
+
+    return list(unique.values())
@@ -1,18 +1,43 @@
 """
 Contains the Node class which holds all relevant information for a TSM node.
+The status flags of a node are defined in the NodeStatusFlag, also defined here.
 """
 
+import sys
+from enum import IntFlag, auto
+from typing import TYPE_CHECKING
+
 from parsing.client_backup_result import ClientBackupResult
 from parsing.constants import NODE_DECOMM_STATE_YES
-from parsing.schedule_status import ScheduleStatus, ScheduleStatusEnum
+from parsing.schedule_status import ScheduleStatus, ScheduleStatusEnum, SchedulesParser
+from parsing.tokenizer import RawLog
 from parsing.vmresult import VMResult
 
+if TYPE_CHECKING:
+    from parsing.policy_domain import PolicyDomain
+
+
+class NodeStatusFlag(IntFlag):
+    """
+    NodeStatusFlag describes the status of the schedules and VM backups of a node.
+    """
+
+    NONE = 0
+    CLIENT_SCHEDULES = auto()
+    NON_SUCCESSFUL_SCHEDULES = auto()
+    VM_BACKUPS = auto()
+    PENDING_LOGS = auto()
+
 
 class Node:
     """
     Node class represents all data collected from TSM regarding nodes, such as
     the associated policy domain of the now, the platform, the schedule status
     and the most recent backup results.
+    The status flags are calculated when schedules or VM results are attached
+    to the node and passed on to the policy domains containing the node.
+    Raw logs can be attached using set_pending_logs, they are parsed on first
+    access of the schedules, backup result or status of the node.
 
     Args:
         name:               Name of the node
@@ -28,6 +53,20 @@ class Node:
         vm_results:         VM backup schedule results associated with this node
     """
 
+    __slots__ = (
+        "name",
+        "policy_domain_name",
+        "platform",
+        "__backupresult",
+        "decomm_state",
+        "__vm_results",
+        "contact",
+        "__schedules",
+        "__pending_logs",
+        "status_flags",
+        "__policy_domains",
+    )
+
     def __init__(
         self,
         name: str,
@@ -42,11 +81,14 @@ class Node:
         self.name = name
         self.policy_domain_name = policy_domain_name
         self.platform = platform
+        self.status_flags = NodeStatusFlag.NONE
+        self.__policy_domains: list["PolicyDomain"] = []
+        self.__pending_logs: tuple[RawLog | None, list[str] | None] | None = None
 
         if backupresult:
-            self.backupresult = backupresult
+            self.__backupresult = backupresult
         else:
-            self.backupresult = ClientBackupResult(name)
+            self.__backupresult = ClientBackupResult(name)
 
         if decomm_state.strip() == NODE_DECOMM_STATE_YES:
             self.decomm_state = True
@@ -54,52 +96,200 @@ class Node:
             self.decomm_state = False
 
         if vm_results:
-            self.vm_results = vm_results
+            self.__vm_results = vm_results
         else:
-            self.vm_results = []
+            self.__vm_results = []
 
         self.contact = contact
 
         if schedules:
-            self.schedules = schedules
+            self.__schedules = schedules
         else:
-            self.schedules = {}
+            self.__schedules = {}
 
-    def has_client_schedules(self) -> bool:
-        """
-        Checks if node has any attempted / completed schedules.
-        """
-        if not self.schedules:
-            return False
+        self.__update_status_flags()
+
+    def __getstate__(self):
+        # Policy domains are not pickled with the node,
+        # they register themselves again when they are loaded.
+        return (
+            self.name,
+            self.policy_domain_name,
+            self.platform,
+            self.__backupresult,
+            self.decomm_state,
+            self.__vm_results,
+            self.contact,
+            self.__schedules,
+            self.__pending_logs,
+            self.status_flags,
+        )
+
+    def __setstate__(self, state):
+        (
+            self.name,
+            self.policy_domain_name,
+            self.platform,
+            self.__backupresult,
+            self.decomm_state,
+            self.__vm_results,
+            self.contact,
+            self.__schedules,
+            self.__pending_logs,
+            self.status_flags,
+        ) = state
+        self.__policy_domains = []
+
+        # Platform and policy domain names repeat across nodes
+        self.platform = sys.intern(self.platform)
+        self.policy_domain_name = sys.intern(self.policy_domain_name)
+
+    def __update_status_flags(self):
+        # Calculate the status flags and pass changes on to the policy domains
+        flags = NodeStatusFlag.NONE
 
         if any(
             sched_stat.status != ScheduleStatusEnum.UNKNOWN
-            for sched_stat in self.schedules.values()
+            for sched_stat in self.__schedules.values()
         ):
-            return True
-        return False
+            flags |= NodeStatusFlag.CLIENT_SCHEDULES
+
+        if any(
+            sched_stat.status != ScheduleStatusEnum.SUCCESSFUL
+            for sched_stat in self.__schedules.values()
+        ):
+            flags |= NodeStatusFlag.NON_SUCCESSFUL_SCHEDULES
+
+        if self.__vm_results:
+            flags |= NodeStatusFlag.VM_BACKUPS
+
+        if self.__pending_logs is not None:
+            flags |= NodeStatusFlag.PENDING_LOGS
+
+        if flags != self.status_flags:
+            old_flags = self.status_flags
+            self.status_flags = flags
+
+            for policy_domain in self.__policy_domains:
+                policy_domain.update_node_status_flags(old_flags, flags)
+
+    @property
+    def schedules(self) -> dict[str, ScheduleStatus]:
+        """
+        The schedules of the node, keyed by schedule name. Status flags are
+        updated when new schedules are assigned.
+        """
+        self.parse_pending_logs()
+        return self.__schedules
+
+    @schedules.setter
+    def schedules(self, schedules: dict[str, ScheduleStatus]):
+        self.__schedules = schedules
+        self.__update_status_flags()
+
+    @property
+    def backupresult(self) -> ClientBackupResult:
+        """
+        The most recent client backup results of the node.
+        """
+        self.parse_pending_logs()
+        return self.__backupresult
+
+    @backupresult.setter
+    def backupresult(self, backupresult: ClientBackupResult):
+        self.__backupresult = backupresult
+
+    def parse_logs(self, sched_stat_log: RawLog | None, cl_stat_log: list[str] | None):
+        """
+        Parses the schedule and client backup logs of the node.
+        """
+        if sched_stat_log is not None:
+            schedules_parser = SchedulesParser()
+            self.__schedules = schedules_parser.parse(sched_stat_log)
+
+        if cl_stat_log and len(cl_stat_log) > 1:
+            parsed_cl_res = ClientBackupResult()
+            parsed_cl_res.parse(cl_stat_log)
+            # Add up backup results if there are more than one
+            # in the last 24 hours
+            self.__backupresult += parsed_cl_res
+
+        self.__update_status_flags()
+
+    def set_pending_logs(
+        self, sched_stat_log: RawLog | None, cl_stat_log: list[str] | None
+    ):
+        """
+        Keeps the raw schedule and client backup logs of the node to parse them
+        on first access, instead of parsing them right away.
+        """
+        self.__pending_logs = (sched_stat_log, cl_stat_log)
+        self.__update_status_flags()
+
+    def parse_pending_logs(self):
+        """
+        Parses the raw logs of the node, if there are any pending.
+        """
+        if self.__pending_logs is None:
+            return
+
+        sched_stat_log, cl_stat_log = self.__pending_logs
+        self.__pending_logs = None
+        self.parse_logs(sched_stat_log, cl_stat_log)
+
+    @property
+    def vm_results(self) -> list[VMResult]:
+        """
+        The VM backup results of the node. Status flags are updated when new
+        VM results are assigned or added using add_vm_result.
+        """
+        return self.__vm_results
+
+    @vm_results.setter
+    def vm_results(self, vm_results: list[VMResult]):
+        self.__vm_results = vm_results
+        self.__update_status_flags()
+
+    def add_vm_result(self, vm_result: VMResult):
+        """
+        Adds a VM backup result to the node.
+        """
+        self.__vm_results.append(vm_result)
+
+        if not self.status_flags & NodeStatusFlag.VM_BACKUPS:
+            self.__update_status_flags()
+
+    def register_policy_domain(self, policy_domain: "PolicyDomain"):
+        """
+        Registers a policy domain containing this node to receive status flag changes.
+        """
+        self.__policy_domains.append(policy_domain)
+
+    def unregister_policy_domain(self, policy_domain: "PolicyDomain"):
+        """
+        Unregisters a policy domain which doesn't contain this node anymore.
+        """
+        self.__policy_domains.remove(policy_domain)
+
+    def has_client_schedules(self) -> bool:
+        """
+        Checks if node has any attempted / completed schedules.
+        """
+        self.parse_pending_logs()
+        return bool(self.status_flags & NodeStatusFlag.CLIENT_SCHEDULES)
 
     def has_non_successful_schedules(self) -> bool:
         """
         Checks if node has any non successful schedules.
         """
-        if not self.schedules:
-            return False
-
-        if any(
-            sched_stat.status != ScheduleStatusEnum.SUCCESSFUL
-            for sched_stat in self.schedules.values()
-        ):
-            return True
-        return False
+        self.parse_pending_logs()
+        return bool(self.status_flags & NodeStatusFlag.NON_SUCCESSFUL_SCHEDULES)
 
     def has_vm_backups(self) -> bool:
         """
         Checks if node has any VMWare backup results.
         """
-        if self.vm_results:
-            return True
-        return False
+        return bool(self.status_flags & NodeStatusFlag.VM_BACKUPS)
 
     def __eq__(self, other) -> bool:
         return (
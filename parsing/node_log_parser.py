@@ -0,0 +1,84 @@
+"""
+Contains functions to parse the schedule and client backup logs of nodes across
+multiple processes. Worker processes return compact records of plain values
+instead of pickled objects, which are turned into objects by the main process.
+"""
+
+import os
+import multiprocessing as mp
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import AsyncResult
+from typing import Iterable, Iterator
+
+from parsing.schedule_status import SchedulesParser
+from parsing.client_backup_result import ClientBackupResult
+from parsing.constants import PARSE_CHUNK_SIZE, PARSE_PENDING_CHUNKS
+from parsing.tokenizer import RawLog
+
+# Logs of a single node: (node name, schedule log, client backup log)
+NodeLogs = tuple[str, RawLog | None, list[str] | None]
+
+# Parsed records of a single node: (node name, schedule records, client backup record)
+NodeRecords = tuple[str, list[tuple[str, tuple]] | None, tuple | None]
+
+
+def parse_node_logs(node_logs: NodeLogs) -> NodeRecords:
+    """
+    Parses the schedule and client backup logs of a node into records.
+    Records are None if there is no log to parse.
+    """
+    node_name, sched_stat_log, cl_stat_log = node_logs
+
+    sched_records = None
+    cl_record = None
+
+    if sched_stat_log is not None:
+        schedules = SchedulesParser().parse(sched_stat_log)
+        sched_records = [
+            (sched_name, sched_stat.to_record())
+            for sched_name, sched_stat in schedules.items()
+        ]
+
+    # Backup results are only parsed from logs with more than one line
+    if cl_stat_log and len(cl_stat_log) > 1:
+        cl_res = ClientBackupResult()
+        cl_res.parse(cl_stat_log)
+        cl_record = cl_res.to_record()
+
+    return node_name, sched_records, cl_record
+
+
+def parse_node_logs_chunk(node_logs: list[NodeLogs]) -> list[NodeRecords]:
+    """
+    Parses the logs of a chunk of nodes into records.
+    """
+    return [parse_node_logs(single_node_logs) for single_node_logs in node_logs]
+
+
+def parse_node_logs_parallel(
+    node_logs: Iterable[NodeLogs],
+    processes: int | None = None,
+    chunk_size: int = PARSE_CHUNK_SIZE,
+) -> Iterator[NodeRecords]:
+    """
+    Parses the node logs on a pool of processes, sending them to the workers in
+    chunks of chunk_size nodes. node_logs can be a stream, e.g. of the collector,
+    it is consumed by the calling thread while the workers are parsing.
+    At most PARSE_PENDING_CHUNKS chunks per process are sent ahead, so unparsed
+    logs don't pile up in memory. Records are yielded in the order the chunks
+    were sent.
+    """
+    node_logs = iter(node_logs)
+    max_pending = PARSE_PENDING_CHUNKS * (processes or os.cpu_count() or 1)
+    pending: deque[AsyncResult] = deque()
+
+    with mp.Pool(processes) as pool:
+        while chunk := list(islice(node_logs, chunk_size)):
+            pending.append(pool.apply_async(parse_node_logs_chunk, (chunk,)))
+
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+
+        while pending:
+            yield from pending.popleft().get()
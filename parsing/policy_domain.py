@@ -2,9 +2,9 @@
 Contains PolicyDomain class which contains all relevant information to a TSM policy domain.
 """
 
-from functools import reduce
+import sys
 
-from parsing.node import Node
+from parsing.node import Node, NodeStatusFlag
 from parsing.client_backup_result import ClientBackupResult
 from parsing.vmresult import VMResult
 
@@ -13,66 +13,254 @@ class PolicyDomain:
     """
     PolicyDomain class contains all associated nodes and a flag
     to determine if there have been failed schedules in the last 24 hours.
+    The backup summaries and status flags are kept up to date when nodes
+    are added or removed using add_node / remove_node. Nodes pass changes of
+    their status flags on to the policy domain, so checking the status flags
+    doesn't require scanning the nodes.
+    Ad-hoc groupings of nodes which are only reported once don't register on their
+    nodes, so they don't outlive the report. Their status flags are taken from the
+    nodes when they are added.
+    If nodes have pending raw logs, they are parsed on first access of the status
+    or summaries of the policy domain, recalculating summaries and sorting nodes.
 
     Args:
         nodes:      list of nodes associated with PolicyDomain
         name:       Name of policy domain
         contact:    Contact mail for PolicyDomain
+        register_nodes: Whether nodes pass changes of their status flags on to
+                    the PolicyDomain, False for ad-hoc groupings of nodes
     """
 
     def __init__(
-        self, nodes: list[Node] | None = None, name: str = "", contact: str = ""
+        self,
+        nodes: list[Node] | None = None,
+        name: str = "",
+        contact: str = "",
+        register_nodes: bool = True,
     ):
         self.contact = contact
         self.name = name
-        self.client_backup_summary = ClientBackupResult()
-        self.vm_backup_summary = VMResult()
+        self.register_nodes = register_nodes
+        self.nodes: list[Node] = []
+        self.__client_backup_summary = ClientBackupResult()
+        self.__vm_backup_summary = VMResult()
+        self.__summaries_outdated = False
+
+        # Number of nodes for which each status flag is set
+        self.__status_flag_counts = {flag: 0 for flag in NodeStatusFlag}
 
         if nodes:
-            self.nodes = nodes
-            self.calculate_backup_summaries()
+            self.add_nodes(nodes)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.name = sys.intern(self.name)
+
+        # Nodes don't pickle the policy domains they are contained in
+        if self.register_nodes:
+            for node in self.nodes:
+                node.register_policy_domain(self)
+
+    def __count_status_flags(self, flags: NodeStatusFlag, count: int):
+        for flag in NodeStatusFlag:
+            if flags & flag:
+                self.__status_flag_counts[flag] += count
+
+    def update_node_status_flags(
+        self, old_flags: NodeStatusFlag, flags: NodeStatusFlag
+    ):
+        """
+        Updates the status flags of the policy domain when the status flags
+        of one of its nodes change.
+        """
+        self.__count_status_flags(old_flags, -1)
+        self.__count_status_flags(flags, 1)
+
+    @property
+    def client_backup_summary(self) -> ClientBackupResult:
+        """
+        Summary of the client backup results of all nodes.
+        """
+        self.parse_pending_logs()
+        return self.__client_backup_summary
+
+    @client_backup_summary.setter
+    def client_backup_summary(self, client_backup_summary: ClientBackupResult):
+        self.__client_backup_summary = client_backup_summary
+
+    @property
+    def vm_backup_summary(self) -> VMResult:
+        """
+        Summary of the VM backup results of all nodes.
+        """
+        self.parse_pending_logs()
+        return self.__vm_backup_summary
+
+    @vm_backup_summary.setter
+    def vm_backup_summary(self, vm_backup_summary: VMResult):
+        self.__vm_backup_summary = vm_backup_summary
+
+    def has_pending_logs(self) -> bool:
+        """
+        Checks if any node has raw logs which haven't been parsed yet.
+        """
+        return self.__status_flag_counts[NodeStatusFlag.PENDING_LOGS] > 0
+
+    def invalidate_summaries(self):
+        """
+        Marks the backup summaries as outdated, they are recalculated on next access.
+        """
+        self.__summaries_outdated = True
+
+    def parse_pending_logs(self):
+        """
+        Parses the pending logs of all nodes, recalculates outdated summaries
+        and sorts the nodes by failed objects.
+        """
+        if not self.__summaries_outdated and not self.has_pending_logs():
+            return
+
+        for node in self.nodes:
+            node.parse_pending_logs()
+
+        self.__summaries_outdated = False
+        self.calculate_backup_summaries()
+
+        # Sort nodes by failed objects
+        self.nodes.sort(key=lambda x: x.backupresult.failed, reverse=True)
+
+    @property
+    def status_flags(self) -> NodeStatusFlag:
+        """
+        Status flags which are set for at least one node of the policy domain.
+        """
+        self.parse_pending_logs()
+        flags = NodeStatusFlag.NONE
+
+        for flag, count in self.__status_flag_counts.items():
+            if count > 0:
+                flags |= flag
+
+        return flags
+
+    def add_node(self, node: Node, update_summaries: bool = True):
+        """
+        Adds a node to the policy domain and adds its results to the backup summaries.
+        Set update_summaries to False if the summaries are calculated elsewhere.
+        """
+        # Reading the backup result parses pending logs, which changes the status
+        # flags of the node. The node is only registered afterwards, so its flags
+        # are counted exactly once.
+        if update_summaries:
+            self.__client_backup_summary += node.backupresult
+            for vm_result in node.vm_results:
+                self.__vm_backup_summary += vm_result
+
+        self.nodes.append(node)
+        if self.register_nodes:
+            node.register_policy_domain(self)
         else:
-            self.nodes = []
+            # Changes of the status flags wouldn't be passed on later
+            node.parse_pending_logs()
+
+        self.__count_status_flags(node.status_flags, 1)
+
+    def add_nodes(self, nodes: list[Node]):
+        """
+        Adds all nodes to the policy domain.
+        """
+        for node in nodes:
+            self.add_node(node)
+
+    def remove_node(self, node: Node):
+        """
+        Removes a node from the policy domain and subtracts its results from the
+        backup summaries.
+        """
+        # Pending logs are parsed while the node is still registered, so the changes
+        # of its status flags are counted before they are subtracted.
+        # Results of pending logs haven't been added to the summaries yet.
+        had_pending_logs = bool(node.status_flags & NodeStatusFlag.PENDING_LOGS)
+        node.parse_pending_logs()
+
+        self.nodes.remove(node)
+        if self.register_nodes:
+            node.unregister_policy_domain(self)
+        self.__count_status_flags(node.status_flags, -1)
+
+        if had_pending_logs:
+            self.invalidate_summaries()
+            return
+
+        self.__client_backup_summary -= node.backupresult
+        for vm_result in node.vm_results:
+            self.__vm_backup_summary -= vm_result
+
+        # Only recalculate the maximum times if the removed node defined them
+        if (
+            node.backupresult.processing_time
+            >= self.__client_backup_summary.processing_time
+        ):
+            self.__client_backup_summary.processing_time = max(
+                (n.backupresult.processing_time for n in self.nodes), default=0
+            )
+
+        if any(
+            vm_result.elapsed_seconds >= self.__vm_backup_summary.elapsed_seconds
+            for vm_result in node.vm_results
+        ):
+            self.__vm_backup_summary.elapsed_seconds = max(
+                (
+                    vm_result.elapsed_seconds
+                    for n in self.nodes
+                    for vm_result in n.vm_results
+                ),
+                default=0,
+            )
 
     def calculate_backup_summaries(self):
         """
-        Calculates all backup summaries for policy domain.
+        Calculates all backup summaries and status flags for policy domain from scratch.
         """
-        if self.nodes:
-            backupresults = [node.backupresult for node in self.nodes]
-            self.client_backup_summary = reduce(lambda s1, s2: s1 + s2, backupresults)
+        self.__client_backup_summary = ClientBackupResult()
+        self.__vm_backup_summary = VMResult()
 
-            vm_backup_results = []
-            for node in self.nodes:
-                vm_backup_results.extend(node.vm_results)
+        for node in self.nodes:
+            self.__client_backup_summary += node.backupresult
+            for vm_result in node.vm_results:
+                self.__vm_backup_summary += vm_result
 
-            if vm_backup_results:
-                self.vm_backup_summary = reduce(
-                    lambda s1, s2: s1 + s2, vm_backup_results
-                )
+        self.calculate_status_flags()
+
+    def calculate_status_flags(self):
+        """
+        Counts the status flags of all nodes from scratch.
+        """
+        self.__status_flag_counts = {flag: 0 for flag in NodeStatusFlag}
 
-            # Reset node name in client_backup_summary
-            # (summary doesn't have a node_name)
-            self.client_backup_summary.node_name = ""
+        for node in self.nodes:
+            self.__count_status_flags(node.status_flags, 1)
 
     def has_client_schedules(self) -> bool:
         """
         Checks if any node in this PolicyDomain has any attempted / completed backup
         schedules.
         """
-        return any(node.has_client_schedules() for node in self.nodes)
+        self.parse_pending_logs()
+        return self.__status_flag_counts[NodeStatusFlag.CLIENT_SCHEDULES] > 0
 
     def has_non_successful_schedules(self) -> bool:
         """
         Checks if any node in this PolicyDomain has any non successful backup schedules.
         """
-        return any(node.has_non_successful_schedules() for node in self.nodes)
+        self.parse_pending_logs()
+        return self.__status_flag_counts[NodeStatusFlag.NON_SUCCESSFUL_SCHEDULES] > 0
 
     def has_vm_backups(self) -> bool:
         """
         Checks if any node has any VMWare backup results.
         """
-        return any(node.has_vm_backups() for node in self.nodes)
+        return self.__status_flag_counts[NodeStatusFlag.VM_BACKUPS] > 0
 
     def __eq__(self, other) -> bool:
         return (
@@ -3,33 +3,56 @@ Contains the ReportTemplate class which holds all inforamtion and handling
 regarding the report mail HTML templates.
 """
 
-import os
-
-from jinja2 import Environment, FileSystemLoader
+from typing import BinaryIO
 
 from parsing.schedule_status import ScheduleStatusEnum
 from parsing.policy_domain import PolicyDomain
+from parsing.template_registry import get_registry
+from parsing.report_view import build_report_view
+from parsing.constants import RENDER_STREAM_BUFFER
 
 
 class ReportTemplate:
     """
     ReportTemplate handles the creation and rendering of the report
-    mail template.
+    mail template. Templates are loaded from the shared template registry,
+    so creating multiple report templates doesn't compile them again.
+    Templates are rendered with the policy domain (pd) and its preformatted
+    view-model (report).
     """
 
     def __init__(self, template_path: str):
         # Load jinja2 mail HTML template
-        self.__template_file_loader = FileSystemLoader(os.path.dirname(template_path))
-        self.__template_env = Environment(
-            loader=self.__template_file_loader, extensions=["jinja2.ext.do"]
-        )
-        self.__template = self.__template_env.get_template(
-            os.path.basename(template_path)
-        )
+        self.__template = get_registry().get_template(template_path)
         self.__template.globals["ScheduleStatusEnum"] = ScheduleStatusEnum
 
     def render(self, policy_domain: PolicyDomain) -> str:
         """
         Renders the report template and returns a HTML string.
         """
-        return self.__template.render(pd=policy_domain)
+        # Nodes are only sorted once pending logs have been parsed
+        policy_domain.parse_pending_logs()
+        return self.__template.render(
+            pd=policy_domain, report=build_report_view(policy_domain)
+        )
+
+    def render_to(
+        self, policy_domain: PolicyDomain, file: BinaryIO, newline: str = "\n"
+    ):
+        """
+        Renders the report template into a binary file (e.g. an export file or a
+        message buffer) as UTF-8, without building the whole HTML string.
+        Line endings are written as newline.
+        """
+        # Nodes are only sorted once pending logs have been parsed
+        policy_domain.parse_pending_logs()
+        stream = self.__template.stream(
+            pd=policy_domain, report=build_report_view(policy_domain)
+        )
+        stream.enable_buffering(RENDER_STREAM_BUFFER)
+
+        if newline == "\n":
+            stream.dump(file, encoding="utf-8")
+        else:
+            for chunk in stream:
+                file.write(chunk.replace("\n", newline).encode("utf-8"))
@@ -0,0 +1,263 @@
+"""
+Contains the view-model of the report mail. A policy domain is turned into flat
+rows of preformatted strings and CSS class names, so the template only has to
+output them.
+"""
+
+from functools import lru_cache
+from dataclasses import dataclass
+
+from parsing.policy_domain import PolicyDomain
+from parsing.client_backup_result import ClientBackupResult
+from parsing.vmresult import VMResult
+from parsing.schedule_status import ScheduleStatusEnum
+
+# CSS class of rows with a shaded background
+ALTERNATE_ROW_CLASS = "alternate_row"
+
+# CSS class and text of the status cell of non successful schedules
+STATUS_CELLS = {
+    ScheduleStatusEnum.MISSED: ("missed", "Missed"),
+    ScheduleStatusEnum.FAILED: ("failed", "Failed"),
+    ScheduleStatusEnum.FAILED_NO_RESTART: ("failed_no_restart", "Failed - no restart"),
+    ScheduleStatusEnum.RESTARTED: ("restarted", "Restarted"),
+    ScheduleStatusEnum.STARTED: ("started", "Started"),
+    ScheduleStatusEnum.IN_PROGRESS: ("in_progress", "In Progress"),
+    ScheduleStatusEnum.PENDING: ("pending", "Pending"),
+    ScheduleStatusEnum.SEVERED: ("severed", "Severed"),
+}
+
+# CSS class of a history cell, indexed by the ScheduleStatusEnum value
+HISTORY_CLASSES = tuple(
+    {
+        ScheduleStatusEnum.SUCCESSFUL: "history_successful",
+        ScheduleStatusEnum.MISSED: "history_missed",
+        ScheduleStatusEnum.FAILED: "history_failed",
+        ScheduleStatusEnum.SEVERED: "history_severed",
+        ScheduleStatusEnum.FAILED_NO_RESTART: "history_failed_no_restart",
+        ScheduleStatusEnum.RESTARTED: "history_restarted",
+        ScheduleStatusEnum.STARTED: "history_started",
+        ScheduleStatusEnum.IN_PROGRESS: "history_in_progress",
+        ScheduleStatusEnum.PENDING: "history_pending",
+    }.get(status, "history_none")
+    for status in range(256)
+)
+
+
+@dataclass(slots=True)
+class ScheduleRow:
+    """
+    ScheduleRow is a row of the table of non successful schedules.
+    status_class and status_text are empty for schedules with an unknown status.
+    """
+
+    row_class: str
+    node_name: str
+    schedule_name: str
+    start_time: str
+    end_time: str
+    status_class: str
+    status_text: str
+    return_code: str
+    history_classes: tuple[str, ...]
+
+
+@dataclass(slots=True)
+class ClientRow:
+    """
+    ClientRow is a row of the client activity table, or its summary.
+    """
+
+    row_class: str
+    node_name: str
+    platform: str
+    inspected: str
+    backed_up: str
+    updated: str
+    expired: str
+    failed: str
+    failed_class: str
+    retries: str
+    bytes_inspected: str
+    bytes_transferred: str
+    aggregate_data_rate: str
+    processing_time: str
+
+
+@dataclass(slots=True)
+class VMRow:
+    """
+    VMRow is a row of the VM backup table, or its summary.
+    """
+
+    row_class: str
+    schedule_name: str
+    vm_name: str
+    start_time: str
+    end_time: str
+    elapsed_time: str
+    backed_up: str
+    success_class: str
+    success_text: str
+    activity_type: str
+    entity: str
+
+
+@dataclass(slots=True)
+class ReportView:
+    """
+    ReportView contains all rows of the report of a policy domain.
+    Tables without rows to show are None.
+    """
+
+    name: str
+    schedule_rows: list[ScheduleRow] | None
+    client_rows: list[ClientRow]
+    client_summary: ClientRow
+    vm_rows: list[VMRow] | None
+    vm_summary: VMRow | None
+
+
+@lru_cache(maxsize=4096)
+def history_classes(history: bytes) -> tuple[str, ...]:
+    """
+    Returns the CSS classes of the cells of a schedule history.
+    Histories repeat across schedules, so the classes are shared by equal histories.
+    """
+    return tuple(HISTORY_CLASSES[status] for status in history)
+
+
+def __client_row(
+    row_class: str,
+    node_name: str,
+    platform: str,
+    backupresult: ClientBackupResult,
+    failed_class: str,
+) -> ClientRow:
+    return ClientRow(
+        row_class,
+        node_name,
+        platform,
+        backupresult.inspected_str(),
+        backupresult.backed_up_str(),
+        backupresult.updated_str(),
+        backupresult.expired_str(),
+        backupresult.failed_str(),
+        failed_class,
+        backupresult.retries_str(),
+        backupresult.bytes_inspected_str(),
+        backupresult.bytes_transferred_str(),
+        backupresult.aggregate_data_rate_str(),
+        backupresult.processing_time_str(),
+    )
+
+
+def __vm_row(row_class: str, vm_result: VMResult) -> VMRow:
+    return VMRow(
+        row_class,
+        vm_result.schedule_name,
+        vm_result.vm_name,
+        vm_result.start_time,
+        vm_result.end_time,
+        vm_result.elapsed_time_str(),
+        vm_result.backed_up_bytes_str(),
+        "vm_successful" if vm_result.successful else "vm_not_successful",
+        "YES" if vm_result.successful else "NO",
+        vm_result.activity_type,
+        vm_result.entity,
+    )
+
+
+def build_report_view(policy_domain: PolicyDomain) -> ReportView:
+    """
+    Builds the view-model of the report of a policy domain. The shading of rows
+    alternates across all tables, summaries take the shading of the next row.
+    """
+    row_count = 0
+
+    def next_row_class() -> str:
+        nonlocal row_count
+        row_count += 1
+        return ALTERNATE_ROW_CLASS if row_count % 2 == 0 else ""
+
+    def summary_row_class() -> str:
+        return ALTERNATE_ROW_CLASS if row_count % 2 == 1 else ""
+
+    schedule_rows = None
+    if policy_domain.has_non_successful_schedules():
+        schedule_rows = []
+
+        for node in policy_domain.nodes:
+            if node.schedules is None or node.decomm_state:
+                continue
+
+            for sched_stat in node.schedules.values():
+                if (
+                    sched_stat.status == ScheduleStatusEnum.SUCCESSFUL
+                    or not sched_stat.schedule_name
+                ):
+                    continue
+
+                status_class, status_text = STATUS_CELLS.get(
+                    sched_stat.status, ("", "")
+                )
+                schedule_rows.append(
+                    ScheduleRow(
+                        next_row_class(),
+                        node.name,
+                        sched_stat.schedule_name,
+                        sched_stat.actual_start_time,
+                        sched_stat.end_time,
+                        status_class,
+                        status_text,
+                        sched_stat.return_code,
+                        history_classes(bytes(sched_stat.history)),
+                    )
+                )
+
+    client_rows = [
+        __client_row(
+            next_row_class(),
+            node.name,
+            node.platform,
+            node.backupresult,
+            ("objects_failed_cell" if node.backupresult.failed > 0 else "align_right"),
+        )
+        for node in policy_domain.nodes
+        if not node.decomm_state
+        and node.backupresult.inspected > 0
+        and "TDP MSSQL" not in node.platform
+    ]
+
+    client_summary = policy_domain.client_backup_summary
+    client_summary_row = __client_row(
+        summary_row_class(),
+        "Summary",
+        " ",
+        client_summary,
+        (
+            "objects_failed_cell_summary"
+            if client_summary.failed > 0
+            else "align_right_bold_text"
+        ),
+    )
+
+    vm_rows = None
+    vm_summary_row = None
+    if policy_domain.has_vm_backups():
+        vm_rows = [
+            __vm_row(next_row_class(), vm_result)
+            for node in policy_domain.nodes
+            for vm_result in node.vm_results
+        ]
+
+        vm_summary_row = __vm_row(summary_row_class(), policy_domain.vm_backup_summary)
+
+    return ReportView(
+        policy_domain.name,
+        schedule_rows,
+        client_rows,
+        client_summary_row,
+        vm_rows,
+        vm_summary_row,
+    )
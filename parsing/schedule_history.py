@@ -0,0 +1,133 @@
+"""
+Contains the ScheduleHistoryMatrix class which holds the 15 day history of all
+schedules of a TSM server instance in a single matrix, so instance wide questions
+about the schedule history can be answered with vectorized operations.
+"""
+
+import numpy as np
+
+from parsing.node import Node, NodeStatusFlag
+from parsing.constants import HISTORY_MAX_ITEMS
+from parsing.schedule_status import ScheduleStatusEnum
+
+# Schedule status counted as failed attempts in the schedule history
+FAILED_STATUS = [
+    ScheduleStatusEnum.MISSED,
+    ScheduleStatusEnum.FAILED,
+    ScheduleStatusEnum.SEVERED,
+    ScheduleStatusEnum.FAILED_NO_RESTART,
+]
+
+
+class ScheduleHistoryMatrix:
+    """
+    ScheduleHistoryMatrix packs the history of every schedule into one row of a
+    uint8 matrix of shape (schedules x HISTORY_MAX_ITEMS). The history of each
+    ScheduleStatus is rebound to a view of its row, so the matrix stays the
+    single copy of the history data. Nodes whose logs are still pending are left
+    out, so building the matrix never parses them.
+
+    Args:
+        nodes:          Nodes of the instance, keyed by node name
+        domain_names:   Names of the policy domains of the instance
+    """
+
+    def __init__(self, nodes: dict[str, Node], domain_names: list[str]):
+        self.node_names: list[str] = list(nodes)
+        self.domain_names: list[str] = list(domain_names)
+        self.schedule_names: list[str] = []
+
+        domain_indices = {name: i for i, name in enumerate(self.domain_names)}
+        schedule_indices: dict[str, int] = {}
+
+        parsed_nodes = [
+            (node_index, node)
+            for node_index, node in enumerate(nodes.values())
+            if not node.status_flags & NodeStatusFlag.PENDING_LOGS
+        ]
+        row_count = sum(len(node.schedules) for _, node in parsed_nodes)
+
+        self.history = np.empty((row_count, HISTORY_MAX_ITEMS), dtype=np.uint8)
+        self.status = np.empty(row_count, dtype=np.uint8)
+        # Index arrays mapping each row to its node, schedule and policy domain
+        self.node_index = np.empty(row_count, dtype=np.int32)
+        self.schedule_index = np.empty(row_count, dtype=np.int32)
+        self.domain_index = np.empty(row_count, dtype=np.int32)
+
+        row = 0
+        for node_index, node in parsed_nodes:
+            domain_index = domain_indices[node.policy_domain_name]
+
+            for schedule_name, schedule in node.schedules.items():
+                if schedule_name not in schedule_indices:
+                    schedule_indices[schedule_name] = len(self.schedule_names)
+                    self.schedule_names.append(schedule_name)
+
+                self.history[row] = np.frombuffer(schedule.history, dtype=np.uint8)
+                self.status[row] = schedule.status
+                self.node_index[row] = node_index
+                self.schedule_index[row] = schedule_indices[schedule_name]
+                self.domain_index[row] = domain_index
+
+                # Replace history of schedule with view into matrix row
+                schedule.history = self.history[row]
+                row += 1
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def failed_schedules(
+        self, min_days: int = 3, days: int = HISTORY_MAX_ITEMS
+    ) -> list[tuple[str, str]]:
+        """
+        Returns (node name, schedule name) of all schedules which failed on at
+        least min_days of the last days days.
+        """
+        failed_days = np.isin(
+            self.history[:, HISTORY_MAX_ITEMS - days :], FAILED_STATUS
+        )
+        rows = np.flatnonzero(failed_days.sum(axis=1) >= min_days)
+
+        return [
+            (
+                self.node_names[self.node_index[row]],
+                self.schedule_names[self.schedule_index[row]],
+            )
+            for row in rows
+        ]
+
+    def daily_success_rates(self) -> dict[str, np.ndarray]:
+        """
+        Returns the share of successful schedules per day of the history for
+        each policy domain. Days without any known schedule status are NaN.
+        """
+        domain_count = len(self.domain_names)
+
+        successful = np.zeros((domain_count, HISTORY_MAX_ITEMS))
+        known = np.zeros((domain_count, HISTORY_MAX_ITEMS))
+
+        np.add.at(
+            successful, self.domain_index, self.history == ScheduleStatusEnum.SUCCESSFUL
+        )
+        np.add.at(known, self.domain_index, self.history != ScheduleStatusEnum.UNKNOWN)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = successful / known
+
+        return dict(zip(self.domain_names, rates))
+
+    def domain_status(self) -> dict[str, str]:
+        """
+        Returns "WARN" for every policy domain with a non successful schedule
+        and "OKAY" for all other policy domains.
+        """
+        non_successful = np.bincount(
+            self.domain_index,
+            weights=self.status != ScheduleStatusEnum.SUCCESSFUL,
+            minlength=len(self.domain_names),
+        )
+
+        return {
+            name: "WARN" if count > 0 else "OKAY"
+            for name, count in zip(self.domain_names, non_successful)
+        }
@@ -6,9 +6,12 @@ The schedule status data is parsed using the ScheduleStatusParser,
 which is defined here aswell.
 """
 
+import sys
 import logging
-from datetime import datetime
-from enum import Enum, auto
+from enum import IntEnum, auto
+from typing import Iterable
+
+import numpy as np
 
 from parsing.constants import (
     SCHED_RETURN_CODE_DEFAULT,
@@ -25,7 +28,6 @@ from parsing.constants import (
     STATUS_RESTARTED_STR,
     STATUS_PENDING_STR,
     STATUS_STARTED_STR,
-    LINE_DELIM,
     COLUMN_QE_SCHED_NAME,
     COLUMN_QE_STATUS,
     COLUMN_QE_RESULT,
@@ -33,13 +35,27 @@ from parsing.constants import (
     COLUMN_QE_SCHED_ACT_START,
     COLUMN_QE_TIME_COMPLETED,
 )
+from parsing.tokenizer import RawLog, iter_rows
+from parsing.timestamps import Timestamp, to_epoch, format_epoch, now_epoch
 
 logger = logging.getLogger("main")
 
+# Columns of the event query used to parse schedules
+QUERY_EVENT_COLUMNS = (
+    COLUMN_QE_SCHED_NAME,
+    COLUMN_QE_SCHED_START,
+    COLUMN_QE_SCHED_ACT_START,
+    COLUMN_QE_TIME_COMPLETED,
+    COLUMN_QE_STATUS,
+    COLUMN_QE_RESULT,
+)
+
 
-class ScheduleStatusEnum(Enum):
+class ScheduleStatusEnum(IntEnum):
     """
-    ScheduleStatusEnum describes the three stats of a schedule
+    ScheduleStatusEnum describes the three stats of a schedule.
+    The values fit into a single byte, so they can be stored packed
+    in a schedule history.
     """
 
     SUCCESSFUL = auto()
@@ -64,8 +80,21 @@ class ScheduleStatus:
         return_code:        Return code of the most recent result of schedule.
         actual_start_time:  The actual start time of the schedule.
         end_time:           The end time of the schedule.
+
+    Times are stored as epoch seconds and only formatted when they are displayed.
+    Values which aren't timestamps (e.g. "Not started") are stored as strings.
     """
 
+    __slots__ = (
+        "status",
+        "schedule_name",
+        "return_code",
+        "start_epoch",
+        "actual_start_epoch",
+        "end_epoch",
+        "__history",
+    )
+
     def __init__(
         self,
         status: ScheduleStatusEnum = ScheduleStatusEnum.UNKNOWN,
@@ -83,18 +112,109 @@ class ScheduleStatus:
         self.end_time = end_time
 
         # Initialize history with "UNKNOWN" status
-        self.history: list[ScheduleStatusEnum] = [
-            ScheduleStatusEnum.UNKNOWN for _ in range(HISTORY_MAX_ITEMS)
-        ]
+        self.__history = bytearray([ScheduleStatusEnum.UNKNOWN]) * HISTORY_MAX_ITEMS
+
+    @property
+    def start_time(self) -> str:
+        """
+        Scheduled start time of the schedule.
+        """
+        return format_epoch(self.start_epoch)
+
+    @start_time.setter
+    def start_time(self, start_time: str):
+        self.start_epoch: Timestamp = to_epoch(start_time)
+
+    @property
+    def actual_start_time(self) -> str:
+        """
+        Actual start time of the schedule.
+        """
+        return format_epoch(self.actual_start_epoch)
+
+    @actual_start_time.setter
+    def actual_start_time(self, actual_start_time: str):
+        self.actual_start_epoch: Timestamp = to_epoch(actual_start_time)
+
+    @property
+    def end_time(self) -> str:
+        """
+        End time of the schedule.
+        """
+        return format_epoch(self.end_epoch)
+
+    @end_time.setter
+    def end_time(self, end_time: str):
+        self.end_epoch: Timestamp = to_epoch(end_time)
+
+    @property
+    def history(self) -> bytearray | np.ndarray:
+        """
+        15 day history of the schedule, one ScheduleStatusEnum value per day
+        packed into a byte. Can be a row view into a ScheduleHistoryMatrix.
+        """
+        return self.__history
+
+    @history.setter
+    def history(self, history: Iterable[int]):
+        if isinstance(history, (bytearray, np.ndarray)):
+            self.__history = history
+        else:
+            self.__history = bytearray(history)
+
+    def to_record(self) -> tuple:
+        """
+        Returns the schedule status as a compact tuple of plain values, e.g. for
+        passing parsed schedules between processes.
+        The history is always stored as bytes, even if it is a view into a
+        history matrix.
+        """
+        return (
+            int(self.status),
+            self.schedule_name,
+            self.return_code,
+            self.start_epoch,
+            self.actual_start_epoch,
+            self.end_epoch,
+            bytes(self.__history),
+        )
+
+    @classmethod
+    def from_record(cls, record: tuple) -> "ScheduleStatus":
+        """
+        Creates a schedule status from a tuple returned by to_record.
+        """
+        sched_stat = cls.__new__(cls)
+        sched_stat.__setstate__(record)
+        return sched_stat
+
+    def __getstate__(self):
+        return self.to_record()
+
+    def __setstate__(self, state):
+        (
+            status,
+            schedule_name,
+            return_code,
+            self.start_epoch,
+            self.actual_start_epoch,
+            self.end_epoch,
+            history,
+        ) = state
+        self.status = ScheduleStatusEnum(status)
+        # Schedule names and return codes repeat across nodes
+        self.schedule_name = sys.intern(schedule_name)
+        self.return_code = sys.intern(return_code)
+        self.__history = bytearray(history)
 
     def __eq__(self, other) -> bool:
         return (
             self.status == other.status
             and self.schedule_name == other.schedule_name
             and self.return_code == other.return_code
-            and self.start_time == other.start_time
-            and self.actual_start_time == other.actual_start_time
-            and self.end_time == other.end_time
+            and self.start_epoch == other.start_epoch
+            and self.actual_start_epoch == other.actual_start_epoch
+            and self.end_epoch == other.end_epoch
         )
 
 
@@ -121,88 +241,87 @@ class SchedulesParser:
 
     # Remove schedules which are older than 24 hours
     def __remove_old_schedules(
-        self, scheds: dict[str, ScheduleStatus]
+        self, scheds: dict[str, ScheduleStatus], now: int
     ) -> dict[str, ScheduleStatus]:
         new_scheds: dict[str, ScheduleStatus] = {}
 
         for sched_name, schedule in scheds.items():
-            current_date = datetime.now()
-            sched_date = datetime.strptime(schedule.start_time, "%Y-%m-%d %H:%M:%S")
-            date_diff = current_date - sched_date
+            # Schedules without a valid start time can't be within 24 hours
+            if not isinstance(schedule.start_epoch, int):
+                continue
 
-            if (date_diff.total_seconds() / 3600) < 24:
+            if now - schedule.start_epoch < 24 * 3600:
                 new_scheds[sched_name] = schedule
 
         return new_scheds
 
-    def __get_line_status_str(self, line: str):
-        return line.split(LINE_DELIM)[COLUMN_QE_STATUS].strip()
-
-    def parse(self, server_log: list[str]) -> dict[str, ScheduleStatus]:
+    def parse(self, server_log: RawLog) -> dict[str, ScheduleStatus]:
         """
-        Parse client schedules from the server logs.
+        Parse client schedules from the server logs, either raw dsmadmc output
+        or a list of lines.
         """
         scheds: dict[str, ScheduleStatus] = {}
-
-        # Remove "Future" schedule from list as it is
-        # not relevant for this usecase
-        server_log = list(
-            filter(
-                lambda line: self.__get_line_status_str(line) != STATUS_FUTURE_STR,
-                server_log,
-            )
-        )
-
-        for _, line in enumerate(server_log):
-            line_split = line.split(LINE_DELIM)
+        now = now_epoch()
+
+        for (
+            sched_name,
+            sched_start,
+            sched_act_start,
+            time_completed,
+            status,
+            result,
+        ) in iter_rows(server_log, QUERY_EVENT_COLUMNS):
+            # Skip "Future" schedules as they are
+            # not relevant for this usecase
+            if status.strip() == STATUS_FUTURE_STR:
+                continue
+
+            # Schedule names and return codes repeat across nodes
+            sched_name = sys.intern(sched_name)
+            result = sys.intern(result)
 
             # Create empty Schedule Status Data object if not created already
-            if line_split[COLUMN_QE_SCHED_NAME] not in scheds:
-                scheds[line_split[COLUMN_QE_SCHED_NAME]] = ScheduleStatus()
+            if sched_name not in scheds:
+                scheds[sched_name] = ScheduleStatus()
 
-            sched_stat = scheds[line_split[COLUMN_QE_SCHED_NAME]]
-            if line_split[COLUMN_QE_STATUS] in self.__schedule_status:
-                sched_stat.status = self.__schedule_status[line_split[COLUMN_QE_STATUS]]
+            sched_stat = scheds[sched_name]
+            if status in self.__schedule_status:
+                sched_stat.status = self.__schedule_status[status]
             else:
                 sched_stat.status = ScheduleStatusEnum.UNKNOWN
 
-            if line_split[COLUMN_QE_SCHED_NAME]:
-                sched_stat.schedule_name = line_split[COLUMN_QE_SCHED_NAME]
+            if sched_name:
+                sched_stat.schedule_name = sched_name
 
-            if line_split[COLUMN_QE_RESULT]:
-                sched_stat.return_code = line_split[COLUMN_QE_RESULT]
+            if result:
+                sched_stat.return_code = result
             else:
                 sched_stat.return_code = SCHED_RETURN_CODE_DEFAULT
 
-            if line_split[COLUMN_QE_SCHED_START]:
-                sched_stat.start_time = line_split[COLUMN_QE_SCHED_START]
+            if sched_start:
+                sched_stat.start_time = sched_start
 
-            if line_split[COLUMN_QE_SCHED_ACT_START]:
-                sched_stat.actual_start_time = line_split[COLUMN_QE_SCHED_ACT_START]
+            if sched_act_start:
+                sched_stat.actual_start_time = sched_act_start
             else:
                 sched_stat.actual_start_time = SCHED_ACT_START_TIME_DEFAULT
 
-            if line_split[COLUMN_QE_TIME_COMPLETED]:
-                sched_stat.end_time = line_split[COLUMN_QE_TIME_COMPLETED]
+            if time_completed:
+                sched_stat.end_time = time_completed
             else:
                 sched_stat.end_time = SCHED_END_TIME_DEFAULT
 
             # Check if schedule exists in dict and add schedule line to history
             if sched_stat.schedule_name in scheds:
-                if sched_stat.start_time:
-                    sched_start_date = datetime.strptime(
-                        sched_stat.start_time, "%Y-%m-%d %H:%M:%S"
-                    )
-                    current_date = datetime.now()
-
+                if isinstance(sched_stat.start_epoch, int):
                     # Calculate position in 15 day history list
-                    date_diff = current_date - sched_start_date
+                    days_diff = (now - sched_stat.start_epoch) // (24 * 3600)
 
-                    # Check if date_diff is within 15 days of current_date.
+                    # Check if days_diff is within 15 days of the current date.
                     # History is set to be maximum 15 days.
-                    if date_diff.days <= 15 and date_diff.days > 0:
+                    if days_diff <= 15 and days_diff > 0:
                         scheds[sched_stat.schedule_name].history[
-                            HISTORY_MAX_ITEMS - date_diff.days
+                            HISTORY_MAX_ITEMS - days_diff
                         ] = sched_stat.status
 
-        return self.__remove_old_schedules(scheds)
+        return self.__remove_old_schedules(scheds, now)
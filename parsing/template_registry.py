@@ -0,0 +1,162 @@
+"""
+Contains the TemplateRegistry class which loads each jinja2 template only once per
+process. Compiled templates are stored in a bytecode cache on disk, so only the
+first run after a template has changed pays for lexing and compiling it.
+Templates can also be precompiled into python modules:
+
+    python -m parsing.template_registry TEMPLATE_DIR TARGET_DIR
+"""
+
+import os
+import sys
+import hashlib
+import logging
+
+from jinja2 import (
+    Environment,
+    FileSystemLoader,
+    FileSystemBytecodeCache,
+    ChoiceLoader,
+    ModuleLoader,
+    Template,
+)
+
+logger = logging.getLogger("main")
+
+# Extensions used by the report templates
+TEMPLATE_EXTENSIONS = ["jinja2.ext.do"]
+
+
+class TemplateRegistry:
+    """
+    TemplateRegistry loads and caches templates by their path.
+    The bytecode cache is invalidated by jinja2 when the source of a template
+    changes. Precompiled templates are only used if they are newer than the
+    template source.
+
+    Args:
+        cache_dir:          Directory of the bytecode cache
+                            (defaults to a directory in the system temp dir)
+        precompiled_dir:    Directory of templates precompiled using
+                            precompile_templates
+    """
+
+    def __init__(
+        self, cache_dir: str | None = None, precompiled_dir: str | None = None
+    ):
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.__bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        self.__precompiled_dir = precompiled_dir
+        self.__environments: dict[tuple[str, bool], Environment] = {}
+        self.__templates: dict[str, Template] = {}
+        self.__template_hashes: dict[str, str] = {}
+
+    def __is_precompiled(self, template_dir: str, template_name: str) -> bool:
+        # Check if an up to date precompiled module exists for the template
+        if not self.__precompiled_dir:
+            return False
+
+        module_path = os.path.join(
+            self.__precompiled_dir, ModuleLoader.get_module_filename(template_name)
+        )
+        if not os.path.isfile(module_path):
+            return False
+
+        if os.path.getmtime(module_path) < os.path.getmtime(
+            os.path.join(template_dir, template_name)
+        ):
+            logger.warning(
+                "Precompiled template %s is outdated, compiling it instead.",
+                template_name,
+            )
+            return False
+
+        return True
+
+    def __environment(self, template_dir: str, precompiled: bool) -> Environment:
+        # Templates in the same directory share an environment
+        key = (template_dir, precompiled)
+
+        if key not in self.__environments:
+            loader = FileSystemLoader(template_dir)
+            if precompiled:
+                loader = ChoiceLoader([ModuleLoader(self.__precompiled_dir), loader])
+
+            self.__environments[key] = Environment(
+                loader=loader,
+                extensions=TEMPLATE_EXTENSIONS,
+                bytecode_cache=self.__bytecode_cache,
+            )
+
+        return self.__environments[key]
+
+    def get_template(self, template_path: str) -> Template:
+        """
+        Returns the template at template_path, loading it on first access.
+        """
+        template_path = os.path.abspath(template_path)
+
+        if template_path not in self.__templates:
+            template_dir, template_name = os.path.split(template_path)
+            precompiled = self.__is_precompiled(template_dir, template_name)
+
+            self.__templates[template_path] = self.__environment(
+                template_dir, precompiled
+            ).get_template(template_name)
+
+        return self.__templates[template_path]
+
+    def template_hash(self, template_path: str) -> str:
+        """
+        Returns the SHA-256 hash of the source of the template at template_path,
+        e.g. for identifying reports rendered from it.
+        """
+        template_path = os.path.abspath(template_path)
+
+        if template_path not in self.__template_hashes:
+            with open(template_path, "rb") as template_file:
+                self.__template_hashes[template_path] = hashlib.sha256(
+                    template_file.read()
+                ).hexdigest()
+
+        return self.__template_hashes[template_path]
+
+
+__registry = TemplateRegistry()
+
+
+def get_registry() -> TemplateRegistry:
+    """
+    Returns the template registry shared by the whole process.
+    """
+    return __registry
+
+
+def configure_registry(
+    cache_dir: str | None = None, precompiled_dir: str | None = None
+):
+    """
+    Replaces the template registry shared by the whole process.
+    """
+    global __registry  # pylint: disable=global-statement
+    __registry = TemplateRegistry(cache_dir, precompiled_dir)
+
+
+def precompile_templates(template_dir: str, target_dir: str):
+    """
+    Compiles all templates in template_dir into python modules in target_dir,
+    which can be loaded by a TemplateRegistry without compiling them.
+    """
+    env = Environment(
+        loader=FileSystemLoader(template_dir), extensions=TEMPLATE_EXTENSIONS
+    )
+    env.compile_templates(target_dir, zip=None, ignore_errors=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python -m parsing.template_registry TEMPLATE_DIR TARGET_DIR")
+
+    precompile_templates(sys.argv[1], sys.argv[2])
@@ -0,0 +1,65 @@
+"""
+Contains functions to store timestamps of the TSM server as integer epoch seconds
+and to format them for display.
+Timestamps returned by dsmadmc are naive local times of the server. They are
+treated as UTC, so converting them back and forth never shifts them and
+differences between them are the same as between the naive times.
+"""
+
+import time
+import calendar
+from datetime import datetime
+
+from parsing.constants import TIME_FORMAT
+
+# Timestamp or text which isn't a timestamp (e.g. "Not started")
+Timestamp = int | str
+
+
+def to_epoch(time_str: str) -> Timestamp:
+    """
+    Converts a timestamp in the format "YYYY-MM-DD hh:mm:ss" into epoch seconds.
+    Strings which aren't timestamps are returned unchanged.
+    """
+    if (
+        len(time_str) == 19
+        and time_str[4] == "-"
+        and time_str[7] == "-"
+        and time_str[10] == " "
+        and time_str[13] == ":"
+        and time_str[16] == ":"
+    ):
+        try:
+            # Validates the date and is a lot faster than strptime
+            date = datetime(
+                int(time_str[0:4]),
+                int(time_str[5:7]),
+                int(time_str[8:10]),
+                int(time_str[11:13]),
+                int(time_str[14:16]),
+                int(time_str[17:19]),
+            )
+        except ValueError:
+            return time_str
+
+        return calendar.timegm(date.timetuple())
+
+    return time_str
+
+
+def format_epoch(timestamp: Timestamp) -> str:
+    """
+    Formats epoch seconds as "YYYY-MM-DD hh:mm:ss". Strings are returned unchanged.
+    """
+    if isinstance(timestamp, int):
+        return time.strftime(TIME_FORMAT, time.gmtime(timestamp))
+
+    return timestamp
+
+
+def now_epoch() -> int:
+    """
+    Returns the current local time in epoch seconds, comparable to converted
+    timestamps of the TSM server.
+    """
+    return calendar.timegm(datetime.now().timetuple())
@@ -0,0 +1,123 @@
+"""
+Contains functions to tokenize the comma separated output of the admin console
+(dsmadmc -comma). Raw output can be tokenized without decoding it as a whole,
+only the fields used by the parsers are decoded.
+"""
+
+import mmap
+from typing import AnyStr, Iterable, Iterator, Sequence
+
+from parsing.constants import LINE_DELIM, FIELD_QUOTE, LINE_CHUNK_SIZE
+
+# Raw output of dsmadmc (possibly memory mapped) or a list of already decoded lines
+RawBuffer = bytes | bytearray | memoryview | mmap.mmap
+RawLog = RawBuffer | Iterable[str]
+
+LINE_DELIM_BYTES = LINE_DELIM.encode()
+FIELD_QUOTE_BYTES = FIELD_QUOTE.encode()
+
+
+def iter_lines(data: RawBuffer) -> Iterator[bytes]:
+    """
+    Yields the lines of raw dsmadmc output without line endings.
+    The output is read in chunks, so buffers like memory mapped files
+    are never copied as a whole.
+    """
+    with memoryview(data) as view:
+        rest = b""
+
+        for start in range(0, len(view), LINE_CHUNK_SIZE):
+            lines = (rest + view[start : start + LINE_CHUNK_SIZE].tobytes()).split(
+                b"\n"
+            )
+            rest = lines.pop()
+
+            for line in lines:
+                yield line[:-1] if line.endswith(b"\r") else line
+
+        if rest:
+            yield rest[:-1] if rest.endswith(b"\r") else rest
+
+
+def count_lines(data: RawBuffer) -> int:
+    """
+    Counts the lines of raw dsmadmc output.
+    """
+    with memoryview(data) as view:
+        if not view:
+            return 0
+
+        count = sum(
+            view[start : start + LINE_CHUNK_SIZE].tobytes().count(b"\n")
+            for start in range(0, len(view), LINE_CHUNK_SIZE)
+        )
+
+        return count if view[-1:] == b"\n" else count + 1
+
+
+def split_fields(line: AnyStr) -> list[AnyStr]:
+    """
+    Splits a line into its fields. Fields containing delimiters are enclosed in
+    quotes by dsmadmc, the quotes are removed from these fields.
+    """
+    if isinstance(line, str):
+        delim, quote = LINE_DELIM, FIELD_QUOTE
+    else:
+        delim, quote = LINE_DELIM_BYTES, FIELD_QUOTE_BYTES
+
+    pieces = line.split(delim)
+
+    # Fast path for lines without any quoted fields
+    if quote not in line:
+        return pieces
+
+    fields = []
+    start = None
+
+    for i, piece in enumerate(pieces):
+        # Only fields starting with a quote are quoted, quotes inside other
+        # fields are kept as they are
+        if start is None:
+            if not piece.startswith(quote):
+                fields.append(piece)
+                continue
+            start = i
+
+        # Join pieces until the quotes of a field are balanced
+        field = delim.join(pieces[start : i + 1])
+
+        if field.count(quote) % 2 == 0:
+            if field.endswith(quote) and len(field) > 1:
+                field = field[1:-1].replace(quote + quote, quote)
+            fields.append(field)
+            start = None
+
+    # Unbalanced quote, keep the rest of the line as unquoted fields
+    if start is not None:
+        fields.extend(pieces[start:])
+
+    return fields
+
+
+def iter_rows(
+    log: RawLog, columns: Sequence[int] | None = None
+) -> Iterator[tuple[str, ...]]:
+    """
+    Yields the rows of a log as tuples of fields. If columns is supplied, only these
+    fields are decoded and returned in the given order. Empty lines are skipped.
+    """
+    is_buffer = isinstance(log, (bytes, bytearray, memoryview, mmap.mmap))
+    lines = iter_lines(log) if is_buffer else log
+
+    for line in lines:
+        if not line:
+            continue
+
+        fields = split_fields(line)
+        if columns is not None:
+            fields = [fields[column] for column in columns]
+
+        if isinstance(line, str):
+            yield tuple(fields)
+        else:
+            yield tuple(field.decode("utf-8", "replace") for field in fields)
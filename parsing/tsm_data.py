@@ -3,9 +3,13 @@ Contains the TSMData class, which contains all relevant information to a TSM ser
 instance and relevant parsing methods for parsing the data from the server logs.
 """
 
+import sys
+import logging
+from typing import Iterable
+
 from parsing.node import Node
 from parsing.constants import (
-    LINE_DELIM,
+    PARSE_PARALLEL_THRESHOLD,
     COLUMN_NODE_NAME,
     COLUMN_PLATFORM_NAME,
     COLUMN_PD_NAME,
@@ -23,9 +27,26 @@ from parsing.constants import (
     COLUMN_VM_ENTITY,
 )
 from parsing.policy_domain import PolicyDomain
+from parsing.contacts import parse_contacts
 from parsing.vmresult import VMResult
-from parsing.schedule_status import SchedulesParser
+from parsing.schedule_status import ScheduleStatus
+from parsing.schedule_history import ScheduleHistoryMatrix
 from parsing.client_backup_result import ClientBackupResult
+from parsing.backup_result_store import BackupResultStore
+from parsing.tokenizer import RawLog, iter_rows
+from parsing.node_log_parser import NodeLogs, NodeRecords, parse_node_logs_parallel
+
+logger = logging.getLogger("main")
+
+# Columns of the nodes query used to parse nodes
+NODE_COLUMNS = (
+    COLUMN_NODE_NAME,
+    COLUMN_PLATFORM_NAME,
+    COLUMN_PD_NAME,
+    COLUMN_DECOMM_STATE,
+    COLUMN_DOMAIN_CONTACT,
+    COLUMN_NODE_CONTACT,
+)
 
 
 class TSMData:
@@ -42,36 +63,64 @@ class TSMData:
         self.nodes: dict[str, Node] = {}
         self.domains: dict[str, PolicyDomain] = {}
         self.vm_results: dict[str, VMResult] = {}
+        self.schedule_history: ScheduleHistoryMatrix | None = None
+        self.backup_results: BackupResultStore | None = None
+
+        # Indexes built when parsing nodes and VM schedules
+        self.domains_by_contact: dict[str, list[PolicyDomain]] = {}
+        self.nodes_by_contact: dict[str, list[Node]] = {}
+        self.nodes_by_platform: dict[str, list[Node]] = {}
+        self.nodes_by_entity: dict[str, Node] = {}
+
+    def __getstate__(self):
+        # Schedule histories are pickled with their schedules,
+        # the history matrix is rebuilt from them when loading.
+        state = self.__dict__.copy()
+        state["schedule_history"] = self.schedule_history is not None
+        return state
+
+    def __setstate__(self, state):
+        has_schedule_history = state.pop("schedule_history", False)
+        self.__dict__.update(state)
+        self.schedule_history = None
+
+        if has_schedule_history:
+            self.build_schedule_history()
+
+    def build_schedule_history(self) -> ScheduleHistoryMatrix:
+        """
+        Packs the schedule histories of all nodes into a single history matrix.
+        Has to be called after schedules have been parsed, nodes whose logs are
+        still pending are left out.
+        """
+        self.schedule_history = ScheduleHistoryMatrix(self.nodes, list(self.domains))
+        return self.schedule_history
 
-    def parse_nodes(self, nodes_log: list[str]):
+    def parse_nodes(self, nodes_log: RawLog):
         """
         Parse nodes form node query logs and add to policy domain and also
         the nodes dictionary.
         """
-        for line in nodes_log:
-            # Split line using , as delimiter
-            line_split = line.split(LINE_DELIM)
-
-            # First three columns contain information about the node
-            node_name = line_split[COLUMN_NODE_NAME]
-            platform_name = line_split[COLUMN_PLATFORM_NAME]
-            policy_domain_name = line_split[COLUMN_PD_NAME]
-
-            # Get the state of decomissionment
-            node_decomm_state = line_split[COLUMN_DECOMM_STATE]
-
+        for (
+            node_name,
+            platform_name,
+            policy_domain_name,
+            node_decomm_state,
+            domain_description_field,
+            node_contact_field,
+        ) in iter_rows(nodes_log, NODE_COLUMNS):
             # If a contact is specified in the node itself, use this contact,
-            # otherwise use contact from the description field of the policy domain
-            domain_description_field = line_split[COLUMN_DOMAIN_CONTACT].strip()
-            node_contact_field = line_split[COLUMN_NODE_CONTACT].strip()
+            # otherwise use contact from the description field of the policy domain.
+            # Quotes around multiple mail contacts are removed by the tokenizer.
+            domain_description_field = domain_description_field.strip()
+            node_contact_field = node_contact_field.strip()
+
+            # Platform and policy domain names repeat across nodes
+            platform_name = sys.intern(platform_name)
+            policy_domain_name = sys.intern(policy_domain_name)
 
             # Create node with platform and email contact, if node has specific contact
             if node_contact_field and not domain_description_field:
-                # Remove string delimiters when multiple mail contacts are supplied
-                if node_contact_field.startswith('"'):
-                    node_contact_field = node_contact_field[
-                        1 : len(node_contact_field) - 1
-                    ]
                 self.nodes[node_name] = Node(
                     node_name,
                     platform_name,
@@ -90,79 +139,209 @@ class TSMData:
                 self.domains[policy_domain_name] = PolicyDomain(name=policy_domain_name)
 
             # Update policy domain
-            self.domains[policy_domain_name].nodes.append(self.nodes[node_name])
+            self.domains[policy_domain_name].add_node(self.nodes[node_name])
 
             if domain_description_field:
                 self.domains[policy_domain_name].contact = domain_description_field
 
+        self.build_indexes()
+
+    def build_indexes(self):
+        """
+        Index policy domains and nodes by their normalised contacts and nodes by
+        their platform. Each distinct contact string is only validated once,
+        policy domains and nodes with invalid contacts are not indexed.
+        """
+        self.domains_by_contact = {}
+        self.nodes_by_contact = {}
+        self.nodes_by_platform = {}
+
+        contacts: dict[str, str | None] = {}
+
+        for domain in self.domains.values():
+            if not domain.contact:
+                continue
+
+            if domain.contact not in contacts:
+                contacts[domain.contact] = parse_contacts(domain.contact)
+
+            if not contacts[domain.contact]:
+                logger.warning(
+                    "parse_contacts didn't return a "
+                    "valid contact string, skipping policy domain %s.",
+                    domain.name,
+                )
+                continue
+
+            self.domains_by_contact.setdefault(contacts[domain.contact], []).append(
+                domain
+            )
+
+        for node in self.nodes.values():
+            self.nodes_by_platform.setdefault(node.platform, []).append(node)
+
+            if not node.contact:
+                continue
+
+            if node.contact not in contacts:
+                contacts[node.contact] = parse_contacts(node.contact)
+
+            if not contacts[node.contact]:
+                logger.warning("parse_contacts didn't return a valid contact string.")
+                continue
+
+            self.nodes_by_contact.setdefault(contacts[node.contact], []).append(node)
+
     def parse_schedules_and_backup_results(
-        self, sched_stat_logs: dict[str, list[str]], cl_stat_logs: dict[str, list[str]]
+        self,
+        sched_stat_logs: dict[str, list[str]],
+        cl_stat_logs: dict[str, list[str]],
+        processes: int | None = 1,
+        parallel_threshold: int = PARSE_PARALLEL_THRESHOLD,
+        lazy: bool = False,
     ):
         """
         Parse client schedules and backup results.
         Insert parsed results into respective node and policy domain.
         Calculate summaries for each policy domain and sort nodes by failed
         object count (nodes with most failed objects come first in the list).
+        If processes is not 1 and there are at least parallel_threshold nodes,
+        the logs are parsed on a pool of processes (None uses all CPU cores).
+        If lazy is set, logs are only parsed on first access.
         """
-        for _, domain in self.domains.items():
-            for node in domain.nodes:
-                self.__parse_node_status(node, sched_stat_logs, cl_stat_logs)
+        self.parse_node_logs_stream(
+            (
+                (node_name, sched_stat_logs.get(node_name), cl_stat_logs.get(node_name))
+                for node_name in self.nodes
+                if node_name in sched_stat_logs or node_name in cl_stat_logs
+            ),
+            processes,
+            parallel_threshold,
+            lazy,
+        )
 
-            domain.calculate_backup_summaries()
-
-            # Sort nodes by failed objects
-            domain.nodes.sort(key=lambda x: x.backupresult.failed, reverse=True)
-
-    def __parse_node_status(
+    def parse_node_logs_stream(
         self,
-        node: Node,
-        sched_stat_logs: dict[str, list[str]],
-        cl_stat_logs: dict[str, list[str]],
+        node_logs: Iterable[NodeLogs],
+        processes: int | None = 1,
+        parallel_threshold: int = PARSE_PARALLEL_THRESHOLD,
+        lazy: bool = False,
     ):
-        # Parse results into node.
-        if node.name in sched_stat_logs:
-            sched_stat_log = sched_stat_logs[node.name]
+        """
+        Parse the schedule and backup logs of nodes while they are streamed in,
+        e.g. by the collector. Results are attached to the nodes right away, so
+        the logs of a node can be released as soon as it has been parsed.
+        Summaries are calculated and nodes sorted once the stream is exhausted.
+        If processes is not 1 and there are at least parallel_threshold nodes,
+        the logs are parsed on a pool of processes (None uses all CPU cores).
+        If lazy is set, the raw logs are kept in the nodes and only parsed when
+        the nodes or their policy domains are accessed.
+        """
+        if lazy:
+            for node_name, sched_stat_log, cl_stat_log in node_logs:
+                if node_name in self.nodes:
+                    self.nodes[node_name].set_pending_logs(sched_stat_log, cl_stat_log)
+        elif processes != 1 and len(self.nodes) >= parallel_threshold:
+            for node_records in parse_node_logs_parallel(node_logs, processes):
+                self.attach_node_records(node_records)
+        else:
+            for single_node_logs in node_logs:
+                self.parse_node_logs(single_node_logs)
+
+        self.calculate_backup_summaries()
+
+        # Policy domains sort their nodes themselves once pending logs are parsed
+        if not lazy:
+            for _, domain in self.domains.items():
+                # Sort nodes by failed objects
+                domain.nodes.sort(key=lambda x: x.backupresult.failed, reverse=True)
 
-            schedules_parser = SchedulesParser()
-            node.schedules = schedules_parser.parse(sched_stat_log)
+    def calculate_backup_summaries(self):
+        """
+        Collect the backup results of all nodes into the columnar backup result
+        store and calculate the backup summaries of each policy domain from it.
+        If nodes have pending logs, the policy domains calculate their summaries
+        on first access instead, so logs of unused domains are never parsed.
+        """
+        if any(domain.has_pending_logs() for domain in self.domains.values()):
+            self.backup_results = None
+            for domain in self.domains.values():
+                domain.invalidate_summaries()
+            return
+
+        self.backup_results = BackupResultStore(self.nodes)
+
+        summaries = self.backup_results.summaries(
+            [node.name for node in domain.nodes] for domain in self.domains.values()
+        )
+
+        for domain, (client_summary, vm_summary) in zip(
+            self.domains.values(), summaries
+        ):
+            domain.client_backup_summary = client_summary
+            domain.vm_backup_summary = vm_summary if vm_summary else VMResult()
+
+    def parse_node_logs(self, node_logs: NodeLogs):
+        """
+        Parse the schedule and backup logs of a single node into the node.
+        Logs of unknown nodes are ignored.
+        """
+        node_name, sched_stat_log, cl_stat_log = node_logs
 
-        if node.name in cl_stat_logs:
-            cl_stat_log = cl_stat_logs[node.name]
+        if node_name not in self.nodes:
+            return
 
-            if cl_stat_log and len(cl_stat_log) > 1:
-                parsed_cl_res = ClientBackupResult()
-                parsed_cl_res.parse(cl_stat_log)
-                # Add up backup results if there are more than one
-                # in the last 24 hours
-                node.backupresult += parsed_cl_res
+        self.nodes[node_name].parse_logs(sched_stat_log, cl_stat_log)
 
-    def parse_vm_schedules(self, vms_log: list[str]):
+    def attach_node_records(self, node_records: NodeRecords):
+        """
+        Attach records parsed by a worker process to the node.
+        Records of unknown nodes are ignored.
+        """
+        node_name, sched_records, cl_record = node_records
+
+        if node_name not in self.nodes:
+            return
+
+        node = self.nodes[node_name]
+
+        if sched_records is not None:
+            node.schedules = {
+                sched_name: ScheduleStatus.from_record(record)
+                for sched_name, record in sched_records
+            }
+
+        if cl_record is not None:
+            # Add up backup results if there are more than one
+            # in the last 24 hours
+            node.backupresult += ClientBackupResult.from_record(cl_record)
+
+    def parse_vm_schedules(self, vms_log: RawLog):
         """
         Parse VMWare backup schedules and insert into respective nodes.
         Calculate VMWare backup summary for each domain.
         """
-        for line in vms_log:
-            # Split line
-            line_split = line.split(LINE_DELIM)
-
+        # All columns of the VM backup query are used
+        for row in iter_rows(vms_log):
+            # Schedule names, activities and entities repeat across VM results
             vm_result = VMResult(
-                line_split[COLUMN_VM_SCHED_NAME],
-                line_split[COLUMN_VM_NAME],
-                line_split[COLUMN_VM_START_TIME],
-                line_split[COLUMN_VM_END_TIME],
-                line_split[COLUMN_VM_SUCCESS] == "YES",
-                line_split[COLUMN_VM_ACTIVITY],
-                line_split[COLUMN_VM_ACT_TYPE],
-                int(line_split[COLUMN_VM_BYTES]),
-                line_split[COLUMN_VM_ENTITY],
+                sys.intern(row[COLUMN_VM_SCHED_NAME]),
+                row[COLUMN_VM_NAME],
+                row[COLUMN_VM_START_TIME],
+                row[COLUMN_VM_END_TIME],
+                row[COLUMN_VM_SUCCESS] == "YES",
+                sys.intern(row[COLUMN_VM_ACTIVITY]),
+                sys.intern(row[COLUMN_VM_ACT_TYPE]),
+                int(row[COLUMN_VM_BYTES]),
+                sys.intern(row[COLUMN_VM_ENTITY]),
             )
 
-            self.vm_results[line_split[COLUMN_VM_NAME]] = vm_result
+            self.vm_results[row[COLUMN_VM_NAME]] = vm_result
 
             # Add VM result to associated node
             if vm_result.entity in self.nodes:
-                self.nodes[vm_result.entity].vm_results.append(vm_result)
-                domain = self.domains[self.nodes[vm_result.entity].policy_domain_name]
+                node = self.nodes[vm_result.entity]
+                node.add_vm_result(vm_result)
+                self.nodes_by_entity[vm_result.entity] = node
 
-                # Add VM result to summary
-                domain.vm_backup_summary += vm_result
+        self.calculate_backup_summaries()
@@ -3,7 +3,10 @@ Contains the VMResult class which holds all relevant information for a
 VMWare backup result from the TSM environment.
 """
 
-from datetime import datetime, timedelta
+import sys
+from datetime import timedelta
+
+from parsing.timestamps import Timestamp, to_epoch, format_epoch
 
 
 class VMResult:
@@ -21,16 +24,31 @@ class VMResult:
         activity_type:          Type of schedules activity (e.g. Incremental Forever - Full)
         backed_up_bytes:        Amount of bytes being backed up in schedule
         entity:                 Name of VMWare TDP entity
-    """
 
-    def __calculate_elapsed_time(self) -> timedelta:
-        # Caclulate the elapsed time in the format MM:SS
-        start_time_d = datetime.strptime(self.start_time, "%Y-%m-%d %H:%M:%S")
-        end_time_d = datetime.strptime(self.end_time, "%Y-%m-%d %H:%M:%S")
-
-        time_diff = end_time_d - start_time_d
+    Start and end time are stored as epoch seconds and only formatted when
+    they are displayed.
+    """
 
-        return time_diff
+    __slots__ = (
+        "schedule_name",
+        "vm_name",
+        "start_epoch",
+        "end_epoch",
+        "successful",
+        "activity",
+        "activity_type",
+        "backed_up_bytes",
+        "backed_up_bytes_unit",
+        "entity",
+        "elapsed_seconds",
+    )
+
+    def __calculate_elapsed_seconds(self) -> int:
+        # Calculate the elapsed time in seconds, if both times are valid
+        if isinstance(self.start_epoch, int) and isinstance(self.end_epoch, int):
+            return self.end_epoch - self.start_epoch
+
+        return 0
 
     def __init__(
         self,
@@ -46,8 +64,8 @@ class VMResult:
     ):
         self.schedule_name = schedule_name
         self.vm_name = vm_name
-        self.start_time = start_time.split(".")[0].strip()  # Remove millisecs
-        self.end_time = end_time.split(".")[0].strip()  # Remove millisecs
+        self.start_time = start_time
+        self.end_time = end_time
         self.successful = successful
         self.activity = activity
         self.activity_type = activity_type
@@ -56,9 +74,78 @@ class VMResult:
         self.entity = entity
 
         if start_time:
-            self.elapsed_time = self.__calculate_elapsed_time()
+            self.elapsed_seconds = self.__calculate_elapsed_seconds()
         else:
-            self.elapsed_time = timedelta()
+            self.elapsed_seconds = 0
+
+    @property
+    def start_time(self) -> str:
+        """
+        Start time of the VM schedule in the format "YYYY-MM-DD hh:mm:ss".
+        """
+        return format_epoch(self.start_epoch)
+
+    @start_time.setter
+    def start_time(self, start_time: str):
+        self.start_epoch: Timestamp = to_epoch(
+            start_time.split(".")[0].strip()  # Remove millisecs
+        )
+
+    @property
+    def end_time(self) -> str:
+        """
+        End time of the VM schedule in the format "YYYY-MM-DD hh:mm:ss".
+        """
+        return format_epoch(self.end_epoch)
+
+    @end_time.setter
+    def end_time(self, end_time: str):
+        self.end_epoch: Timestamp = to_epoch(
+            end_time.split(".")[0].strip()  # Remove millisecs
+        )
+
+    @property
+    def elapsed_time(self) -> timedelta:
+        """
+        Elapsed time of the VM schedule.
+        """
+        return timedelta(seconds=self.elapsed_seconds)
+
+    @elapsed_time.setter
+    def elapsed_time(self, elapsed_time: timedelta):
+        self.elapsed_seconds = int(elapsed_time.total_seconds())
+
+    def to_record(self) -> tuple:
+        """
+        Returns the VM result as a compact tuple of plain values, e.g. for
+        fingerprinting the reports showing it.
+        """
+        return (
+            self.schedule_name,
+            self.vm_name,
+            self.start_epoch,
+            self.end_epoch,
+            self.successful,
+            self.activity,
+            self.activity_type,
+            self.backed_up_bytes,
+            self.backed_up_bytes_unit,
+            self.entity,
+            self.elapsed_seconds,
+        )
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in VMResult.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(VMResult.__slots__, state):
+            setattr(self, slot, value)
+
+        # Schedule names, activities and entities repeat across VM results
+        self.schedule_name = sys.intern(self.schedule_name)
+        self.activity = sys.intern(self.activity)
+        self.activity_type = sys.intern(self.activity_type)
+        self.entity = sys.intern(self.entity)
 
     def __convert_notation(self, num_string: str) -> str:
         # Convert from US notation to EU notation.
@@ -75,7 +162,7 @@ class VMResult:
 
     def __format_elapsed_time(self) -> str:
         # Format elapsed time for node and return as string.
-        minutes, seconds = divmod(int(self.elapsed_time.total_seconds()), 60)
+        minutes, seconds = divmod(self.elapsed_seconds, 60)
         hours, minutes = divmod(minutes, 60)
 
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
@@ -98,21 +185,35 @@ class VMResult:
         res.backed_up_bytes = self.backed_up_bytes + other.backed_up_bytes
         # Instead of adding up the elapsed time, show elapsed time of longest backup
         # in summary
-        res.elapsed_time = max(self.elapsed_time, other.elapsed_time)
+        res.elapsed_seconds = max(self.elapsed_seconds, other.elapsed_seconds)
 
         return res
 
+    def __iadd__(self, other) -> "VMResult":
+        # Add up VM results in place, without allocating a new result
+        self.backed_up_bytes += other.backed_up_bytes
+        self.elapsed_seconds = max(self.elapsed_seconds, other.elapsed_seconds)
+
+        return self
+
+    def __isub__(self, other) -> "VMResult":
+        # Subtract VM results in place. The elapsed time is a maximum
+        # and can't be reverted, it has to be recalculated by the caller.
+        self.backed_up_bytes -= other.backed_up_bytes
+
+        return self
+
     def __eq__(self, other) -> bool:
         return (
             self.schedule_name == other.schedule_name
             and self.vm_name == other.vm_name
-            and self.start_time == other.start_time
-            and self.end_time == other.end_time
+            and self.start_epoch == other.start_epoch
+            and self.end_epoch == other.end_epoch
             and self.successful == other.successful
             and self.activity == other.activity
             and self.activity_type == other.activity_type
             and self.backed_up_bytes == other.backed_up_bytes
             and self.backed_up_bytes_unit == other.backed_up_bytes_unit
             and self.entity == other.entity
-            and self.elapsed_time == other.elapsed_time
+            and self.elapsed_seconds == other.elapsed_seconds
         )
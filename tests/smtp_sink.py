@@ -0,0 +1,135 @@
+"""
+Contains a local SMTP sink server for testing mailers against.
+"""
+
+import threading
+import socketserver
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    SMTPSinkHandler speaks just enough SMTP to accept mails from smtplib.
+    """
+
+    server: "SMTPSink"
+
+    def __reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        connection = self.server.open_connection()
+        connected = True
+        sender = ""
+        recipients: list[str] = []
+
+        try:
+            self.__reply("220 sink ESMTP")
+
+            while line := self.rfile.readline():
+                command = line.decode().rstrip("\r\n")
+                verb = command[:4].upper()
+                self.server.record_command(verb)
+
+                if verb in ("EHLO", "HELO"):
+                    self.__reply("250 sink")
+                elif verb == "MAIL":
+                    if self.server.drop_mail():
+                        # Simulate a connection lost while sending
+                        return
+                    sender = command[10:]
+                    recipients = []
+                    self.__reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command[8:])
+                    self.__reply("250 OK")
+                elif verb == "DATA":
+                    self.__reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while (data_line := self.rfile.readline()) != b".\r\n":
+                        data += data_line
+                    self.server.store_mail(connection, sender, recipients, bytes(data))
+                    self.__reply("250 OK")
+                elif verb == "QUIT":
+                    # The client may connect again as soon as it gets the reply
+                    self.server.close_connection()
+                    connected = False
+                    self.__reply("221 Bye")
+                    return
+                else:
+                    self.__reply("250 OK")
+        finally:
+            if connected:
+                self.server.close_connection()
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    SMTPSink records all received mails along with the number of the connection
+    they were sent over, all received commands and the maximum number of
+    concurrent connections.
+    The drop_at-th MAIL command closes the connection instead of being answered.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, drop_at: int = 0):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.drop_at = drop_at
+        self.mails: list[tuple[int, str, list[str], bytes]] = []
+        self.commands: list[str] = []
+        self.connection_count = 0
+        self.max_concurrent_connections = 0
+        self.__concurrent_connections = 0
+        self.__mail_commands = 0
+        self.__lock = threading.Lock()
+
+    def open_connection(self) -> int:
+        """
+        Counts a new connection and returns its number.
+        """
+        with self.__lock:
+            self.connection_count += 1
+            self.__concurrent_connections += 1
+            self.max_concurrent_connections = max(
+                self.max_concurrent_connections, self.__concurrent_connections
+            )
+            return self.connection_count
+
+    def close_connection(self):
+        """
+        Counts a closed connection.
+        """
+        with self.__lock:
+            self.__concurrent_connections -= 1
+
+    def record_command(self, verb: str):
+        """
+        Records a received command.
+        """
+        with self.__lock:
+            self.commands.append(verb)
+
+    def drop_mail(self) -> bool:
+        """
+        Checks if the connection has to be dropped on the current MAIL command.
+        """
+        with self.__lock:
+            self.__mail_commands += 1
+            return self.__mail_commands == self.drop_at
+
+    def store_mail(
+        self, connection: int, sender: str, recipients: list[str], data: bytes
+    ):
+        """
+        Records a received mail.
+        """
+        with self.__lock:
+            self.mails.append((connection, sender, recipients, data))
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
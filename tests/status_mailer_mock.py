@@ -2,11 +2,15 @@
 Contains a mocked status mailer for testing.
 """
 
+import io
 import logging
+from typing import Callable
 from email.message import EmailMessage
 
 from parsing.policy_domain import PolicyDomain
 from parsing.report_template import ReportTemplate
+from parsing.constants import SMTP_NEWLINE
+from mailer.mailer import DeliveryResult
 
 logger = logging.getLogger("main")
 
@@ -31,6 +35,9 @@ class StatusMailerMock:
         # Mock rendered template
         self.rendered_mail_mocks: list[str] = []
 
+        # Receivers of each sent mail
+        self.receiver_mocks: list[str] = []
+
         logger.debug(
             "Connecting to %s at port %s...", self.__smtp_host, self.__smtp_port
         )
@@ -43,9 +50,14 @@ class StatusMailerMock:
         subject: str,
         replyto_addr: str,
         bcc_addr: str,
+        rendered_html: bytes | None = None,
+        extra_reports: list[tuple[PolicyDomain, bytes | None]] | None = None,
+        delivered: Callable[[DeliveryResult], None] | None = None,
     ):
         """
         Renders the mail template and sends it using the smtp library.
+        If the report has already been rendered, rendered_html is sent instead.
+        Each extra report is rendered as a mail of its own.
         """
         message = EmailMessage()
         message["Subject"] = subject
@@ -63,7 +75,13 @@ class StatusMailerMock:
             logger.info("No Bcc configured. Skipping.")
 
         # Render HTML template of message containing node data from TSM nodes
-        message_html = self.__template.render(policy_domain)
+        if rendered_html is None:
+            buffer = io.BytesIO()
+            self.__template.render_to(policy_domain, buffer, SMTP_NEWLINE)
+            rendered_html = buffer.getvalue()
+
+        # Mails are rendered with SMTP line endings
+        message_html = rendered_html.decode("utf-8").replace(SMTP_NEWLINE, "\n")
 
         message.add_header("Content-Type", "text/html")
         message.add_header("X-Auto-Response-Suppress", "All")
@@ -73,3 +91,23 @@ class StatusMailerMock:
         logger.info("Message: %s", message)
 
         self.rendered_mail_mocks.append(message_html)
+        self.receiver_mocks.append(receiver_addr)
+
+        for report_domain, report_html in extra_reports or []:
+            if report_html is None:
+                buffer = io.BytesIO()
+                self.__template.render_to(report_domain, buffer, SMTP_NEWLINE)
+                report_html = buffer.getvalue()
+
+            self.rendered_mail_mocks.append(
+                report_html.decode("utf-8").replace(SMTP_NEWLINE, "\n")
+            )
+
+        if delivered is not None:
+            delivered(DeliveryResult.SENT)
+
+    def close(self):
+        """
+        Mocks closing the connection to the SMTP server.
+        """
+        logger.debug("Closing connection to %s.", self.__smtp_host)
@@ -2,20 +2,57 @@
 Contains various tests for the tsm_mail application.
 """
 
+import os
+import io
+import email
+import email.policy
+import socket
+import mmap
+import pickle
+import tempfile
+import threading
+import weakref
 import logging
 import datetime
 import unittest
+import unittest.mock
 from typing import Any
 import time_machine
+import numpy as np
 
 from parsing.policy_domain import PolicyDomain
-from parsing.node import Node
-from parsing.constants import NODE_DECOMM_STATE_NO
+from parsing.node import Node, NodeStatusFlag
+from parsing.constants import (
+    NODE_DECOMM_STATE_NO,
+    HISTORY_MAX_ITEMS,
+    PARSE_PENDING_CHUNKS,
+)
+from parsing.node_log_parser import parse_node_logs_parallel
 from parsing.tsm_data import TSMData
 from parsing.schedule_status import SchedulesParser, ScheduleStatusEnum
 from parsing.report_template import ReportTemplate
+from parsing.template_registry import TemplateRegistry, precompile_templates
+from parsing.report_view import build_report_view
+from parsing.tokenizer import iter_lines, iter_rows, count_lines, split_fields
+from parsing.contacts import parse_contacts
+from parsing.timestamps import to_epoch, format_epoch
+from parsing.vmresult import VMResult
 
 from tsm_mail import send_mail_reports
+from mailer.report_plan import collect_loose_nodes, plan_mail_reports
+from mailer.delivery_plan import DeliveryMerge, plan_deliveries
+from mailer.report_renderer import render_reports, export_reports
+from mailer.status_mailer import StatusMailer, encode_report_mail
+from mailer.pooled_mailer import PooledMailer
+from mailer.async_mailer import AsyncMailer
+from mailer.mail_spool import MailSpool
+from mailer.render_cache import RenderCache
+from mailer.report_changes import (
+    ReportChangeDetector,
+    ReportChangePolicy,
+    report_fingerprint,
+)
+from collector.collector import CollectorConfig, closing_output, collect_vm_schedules
 
 from tests.mock import (
     mock_node_with_schedules,
@@ -34,6 +71,7 @@ from tests.mock import (
 )
 
 from tests.status_mailer_mock import StatusMailerMock
+from tests.smtp_sink import SMTPSink
 
 logger = logging.getLogger("main")
 
@@ -109,11 +147,102 @@ class TestParsing(unittest.TestCase):
         self.assertFalse(policy_domain.has_non_successful_schedules())
 
         # Add non successful backup schedules
-        policy_domain.nodes.extend(
-            [node_with_failed, node_with_missed, node_with_errors]
+        policy_domain.add_nodes([node_with_failed, node_with_missed, node_with_errors])
+        self.assertTrue(policy_domain.has_client_schedules())
+        self.assertTrue(policy_domain.has_non_successful_schedules())
+
+    def test_policy_domain_add_remove_nodes(self):
+        """
+        Tests that summaries and status flags of a policy domain are updated in place
+        when nodes are added and removed.
+        """
+        domain_name = "DOMAIN"
+
+        node_successful = mock_node_with_schedules(
+            "NODE_A",
+            domain_name=domain_name,
+            schedules={"S": ScheduleStatusEnum.SUCCESSFUL},
+        )
+        node_failed = mock_node_with_schedules(
+            "NODE_B",
+            domain_name=domain_name,
+            schedules={"S": ScheduleStatusEnum.FAILED},
+        )
+        node_failed.backupresult.processing_time = 10**6
+        node_vm = Node(
+            "NODE_VM",
+            "TDP VMWare",
+            domain_name,
+            NODE_DECOMM_STATE_NO,
+            vm_results=[mock_vm_result("VM_SCHEDULE", "VM", True, 10**9, "NODE_VM")],
+        )
+
+        policy_domain = PolicyDomain(name=domain_name)
+        summary = policy_domain.client_backup_summary
+        self.assertFalse(policy_domain.has_client_schedules())
+
+        policy_domain.add_nodes([node_successful, node_failed, node_vm])
+
+        # Summaries are accumulated into the same objects
+        self.assertIs(policy_domain.client_backup_summary, summary)
+        self.assertEqual(
+            policy_domain.client_backup_summary,
+            PolicyDomain([node_successful, node_failed, node_vm]).client_backup_summary,
         )
+        self.assertEqual(policy_domain.client_backup_summary.processing_time, 10**6)
+        self.assertEqual(policy_domain.vm_backup_summary.backed_up_bytes, 10**9)
         self.assertTrue(policy_domain.has_client_schedules())
         self.assertTrue(policy_domain.has_non_successful_schedules())
+        self.assertTrue(policy_domain.has_vm_backups())
+
+        policy_domain.remove_node(node_failed)
+        policy_domain.remove_node(node_vm)
+
+        summary_expected = PolicyDomain([node_successful]).client_backup_summary
+        self.assertEqual(
+            policy_domain.client_backup_summary.processing_time,
+            summary_expected.processing_time,
+        )
+        self.assertEqual(
+            policy_domain.client_backup_summary.bytes_inspected_str(),
+            summary_expected.bytes_inspected_str(),
+        )
+        self.assertEqual(policy_domain.vm_backup_summary.backed_up_bytes, 0)
+        self.assertTrue(policy_domain.has_client_schedules())
+        self.assertFalse(policy_domain.has_non_successful_schedules())
+        self.assertFalse(policy_domain.has_vm_backups())
+
+    def test_status_flags_follow_node_changes(self):
+        """
+        Tests that cached status flags of nodes and policy domains are updated
+        when schedules or VM results are attached after adding the node.
+        """
+        domain_name = "DOMAIN"
+        node = Node("NODE", "Linux x86-64", domain_name, NODE_DECOMM_STATE_NO)
+        policy_domain = PolicyDomain([node], domain_name)
+
+        self.assertEqual(node.status_flags, NodeStatusFlag.NONE)
+        self.assertEqual(policy_domain.status_flags, NodeStatusFlag.NONE)
+
+        node.schedules = mock_schedules({"SCHEDULE": ScheduleStatusEnum.FAILED})
+
+        self.assertTrue(policy_domain.has_client_schedules())
+        self.assertTrue(policy_domain.has_non_successful_schedules())
+        self.assertFalse(policy_domain.has_vm_backups())
+
+        node.add_vm_result(mock_vm_result("VM_SCHEDULE", "VM", True, 0, node.name))
+        self.assertTrue(policy_domain.has_vm_backups())
+
+        # Loaded policy domains keep receiving status flag changes of their nodes
+        policy_domain_loaded = pickle.loads(pickle.dumps(policy_domain))
+        node_loaded = policy_domain_loaded.nodes[0]
+        self.assertEqual(policy_domain_loaded.status_flags, policy_domain.status_flags)
+
+        node_loaded.schedules = mock_schedules(
+            {"SCHEDULE": ScheduleStatusEnum.SUCCESSFUL}
+        )
+        self.assertFalse(policy_domain_loaded.has_non_successful_schedules())
+        self.assertTrue(policy_domain.has_non_successful_schedules())
 
     def test_node_and_client_backup_parsing(self):
         """
@@ -399,6 +528,1208 @@ class TestParsing(unittest.TestCase):
             self.assertTrue(data.domains[policy_domain_name])
             self.assertEqual(data.domains[policy_domain_name], policy_domain)
 
+    def test_compact_model_pickling(self):
+        """
+        Tests that the slotted data model keeps its history packed and
+        survives a pickle round trip.
+        """
+        domain_name = "DOMAIN"
+        node_name = "NODE"
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes([mock_node_log(node_name, "Linux x86-64", domain_name)])
+        data.parse_schedules_and_backup_results(
+            {
+                node_name: mock_schedule_logs(
+                    domain_name, node_name, "SCHEDULE", ScheduleStatusEnum.FAILED
+                )
+            },
+            {node_name: mock_backup_result_log(node_name)},
+        )
+
+        node = data.nodes[node_name]
+        schedule = node.schedules["SCHEDULE"]
+
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(hasattr(schedule, "__dict__"))
+        self.assertFalse(hasattr(node.backupresult, "__dict__"))
+        self.assertIsInstance(schedule.history, bytearray)
+        self.assertEqual(schedule.history[-1], ScheduleStatusEnum.SUCCESSFUL)
+
+        data_loaded = pickle.loads(pickle.dumps(data))
+        schedule_loaded = data_loaded.nodes[node_name].schedules["SCHEDULE"]
+
+        self.assertEqual(data_loaded.domains[domain_name], data.domains[domain_name])
+        self.assertEqual(schedule_loaded.history, schedule.history)
+
+    def test_parallel_parsing(self):
+        """
+        Tests that parsing node logs on a process pool produces the same data as
+        parsing them on a single process, and that streamed logs are consumed by
+        the calling thread only a bounded number of chunks ahead.
+        """
+        domain_name = "DOMAIN"
+        node_names = [f"NODE_{i}" for i in range(8)]
+        statuses = [ScheduleStatusEnum.SUCCESSFUL, ScheduleStatusEnum.FAILED]
+
+        nodes_log = [
+            mock_node_log(node_name, "Linux x86-64", domain_name)
+            for node_name in node_names
+        ]
+        schedule_logs = {
+            node_name: mock_schedule_logs(
+                domain_name, node_name, "SCHEDULE", statuses[i % len(statuses)]
+            )
+            for i, node_name in enumerate(node_names)
+        }
+        # Leave out some backup logs
+        backup_logs = {
+            node_name: mock_backup_result_log(node_name)
+            for node_name in node_names[::2]
+        }
+
+        data_sequential = TSMData("TSMSRV1")
+        data_sequential.parse_nodes(nodes_log)
+        data_sequential.parse_schedules_and_backup_results(schedule_logs, backup_logs)
+
+        data_parallel = TSMData("TSMSRV1")
+        data_parallel.parse_nodes(nodes_log)
+        data_parallel.parse_schedules_and_backup_results(
+            schedule_logs, backup_logs, processes=2, parallel_threshold=0
+        )
+
+        self.assertEqual(data_parallel.domains, data_sequential.domains)
+        for node_name in node_names:
+            self.assertEqual(
+                data_parallel.nodes[node_name].schedules["SCHEDULE"].history,
+                data_sequential.nodes[node_name].schedules["SCHEDULE"].history,
+            )
+        self.assertTrue(
+            data_parallel.domains[domain_name].has_non_successful_schedules()
+        )
+
+        consumed = []
+
+        def stream():
+            for node_name in node_names:
+                self.assertIs(threading.current_thread(), threading.main_thread())
+                consumed.append(node_name)
+                yield node_name, schedule_logs[node_name], backup_logs.get(node_name)
+
+        parsed = []
+        for node_name, _, _ in parse_node_logs_parallel(stream(), 2, chunk_size=1):
+            self.assertLessEqual(len(consumed), len(parsed) + 2 * PARSE_PENDING_CHUNKS)
+            parsed.append(node_name)
+
+        self.assertEqual(parsed, node_names)
+
+    def test_streamed_parsing(self):
+        """
+        Tests that node logs are attached to the nodes while they are streamed in
+        and that the result matches parsing all logs at once.
+        """
+        domain_name = "DOMAIN"
+        node_names = [f"NODE_{i}" for i in range(4)]
+
+        nodes_log = [
+            mock_node_log(node_name, "Linux x86-64", domain_name)
+            for node_name in node_names
+        ]
+        schedule_logs = {
+            node_name: mock_schedule_logs(
+                domain_name, node_name, "SCHEDULE", ScheduleStatusEnum.SUCCESSFUL
+            )
+            for node_name in node_names
+        }
+        backup_logs = {
+            node_name: mock_backup_result_log(node_name) for node_name in node_names
+        }
+
+        data_batch = TSMData("TSMSRV1")
+        data_batch.parse_nodes(nodes_log)
+        data_batch.parse_schedules_and_backup_results(schedule_logs, backup_logs)
+
+        data_streamed = TSMData("TSMSRV1")
+        data_streamed.parse_nodes(nodes_log)
+
+        def stream():
+            # Nodes complete in any order, unknown nodes are ignored
+            yield "UNKNOWN_NODE", schedule_logs["NODE_0"], None
+            for i, node_name in enumerate(reversed(node_names)):
+                if i > 0:
+                    previous_node = data_streamed.nodes[node_names[-i]]
+                    self.assertIn("SCHEDULE", previous_node.schedules)
+                yield node_name, schedule_logs[node_name], backup_logs[node_name]
+
+        data_streamed.parse_node_logs_stream(stream())
+
+        self.assertNotIn("UNKNOWN_NODE", data_streamed.nodes)
+        self.assertEqual(data_streamed.domains, data_batch.domains)
+
+    def test_lazy_parsing(self):
+        """
+        Tests that lazily parsed node logs are only parsed when their policy domain
+        is accessed and result in the same data as parsing them eagerly.
+        """
+        statuses = [ScheduleStatusEnum.SUCCESSFUL, ScheduleStatusEnum.FAILED]
+        nodes_log = []
+        schedule_logs = {}
+        backup_logs = {}
+
+        for domain_name in ("DOMAIN_A", "DOMAIN_B"):
+            for i in range(3):
+                node_name = f"{domain_name}_NODE_{i}"
+                nodes_log.append(mock_node_log(node_name, "Linux", domain_name))
+                schedule_logs[node_name] = mock_schedule_logs(
+                    domain_name, node_name, "SCHEDULE", statuses[i % 2]
+                )
+                backup_logs[node_name] = mock_backup_result_log(node_name)
+
+        data_eager = TSMData("TSMSRV1")
+        data_eager.parse_nodes(nodes_log)
+        data_eager.parse_schedules_and_backup_results(schedule_logs, backup_logs)
+
+        data_lazy = TSMData("TSMSRV1")
+        data_lazy.parse_nodes(nodes_log)
+        data_lazy.parse_node_logs_stream(
+            (
+                (node_name, schedule_logs[node_name], backup_logs[node_name])
+                for node_name in data_lazy.nodes
+            ),
+            lazy=True,
+        )
+
+        self.assertIsNone(data_lazy.backup_results)
+        self.assertTrue(
+            all(
+                node.status_flags & NodeStatusFlag.PENDING_LOGS
+                for node in data_lazy.nodes.values()
+            )
+        )
+
+        # Accessing a policy domain only parses its own nodes
+        self.assertTrue(data_lazy.domains["DOMAIN_A"].has_non_successful_schedules())
+        self.assertFalse(data_lazy.domains["DOMAIN_A"].has_pending_logs())
+        self.assertTrue(data_lazy.domains["DOMAIN_B"].has_pending_logs())
+
+        # Pending logs are pickled with the nodes
+        data_lazy = pickle.loads(pickle.dumps(data_lazy))
+        self.assertTrue(data_lazy.domains["DOMAIN_B"].has_pending_logs())
+
+        template = ReportTemplate("./templates/statusmail.j2")
+        for domain_name, policy_domain in data_eager.domains.items():
+            self.assertEqual(
+                template.render(data_lazy.domains[domain_name]),
+                template.render(policy_domain),
+            )
+            self.assertEqual(data_lazy.domains[domain_name], policy_domain)
+
+    def test_lazy_loose_nodes(self):
+        """
+        Tests that the status flags of loose nodes collected from lazily parsed data
+        are counted once and follow the removal of nodes, and that the collections
+        aren't kept alive by their nodes.
+        """
+        nodes_log = []
+        schedule_logs = {}
+        backup_logs = {}
+
+        for i in range(3):
+            node_name = f"NODE_{i}"
+            nodes_log.append(
+                mock_node_log(node_name, "Linux", "DOMAIN", "", "contact@company.com")
+            )
+            schedule_logs[node_name] = mock_schedule_logs(
+                "DOMAIN",
+                node_name,
+                "SCHEDULE",
+                ScheduleStatusEnum.FAILED if i == 0 else ScheduleStatusEnum.SUCCESSFUL,
+            )
+            backup_logs[node_name] = mock_backup_result_log(node_name)
+
+        collections = []
+        for lazy in (False, True):
+            data = TSMData("TSMSRV1")
+            data.parse_nodes(nodes_log)
+            data.parse_node_logs_stream(
+                (
+                    (node_name, schedule_logs[node_name], backup_logs[node_name])
+                    for node_name in data.nodes
+                ),
+                lazy=lazy,
+            )
+            loose_nodes = collect_loose_nodes("DOMAIN", data.nodes_by_contact)
+            collections.append(loose_nodes["contact@company.com"])
+
+        eager, lazy = collections
+        self.assertEqual(lazy.status_flags, eager.status_flags)
+        self.assertFalse(lazy.has_pending_logs())
+        self.assertEqual(lazy.client_backup_summary, eager.client_backup_summary)
+
+        for policy_domain in collections:
+            failed_node = next(
+                node for node in policy_domain.nodes if node.name == "NODE_0"
+            )
+            policy_domain.remove_node(failed_node)
+            self.assertFalse(policy_domain.has_non_successful_schedules())
+            self.assertTrue(policy_domain.has_client_schedules())
+
+        self.assertEqual(lazy.client_backup_summary, eager.client_backup_summary)
+
+        # The collections don't register on their nodes and are released
+        # once the report is done
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(nodes_log)
+        collection = weakref.ref(
+            collect_loose_nodes("DOMAIN", data.nodes_by_contact)["contact@company.com"]
+        )
+        self.assertIsNone(collection())
+
+    def test_tsm_data_indexes(self):
+        """
+        Tests the contact, platform and entity indexes built when parsing and
+        planning the reports from them.
+        """
+        nodes_log = [
+            mock_node_log("NODE_A", "Linux", "DOMAIN_A", "a@company.com;b@company.com"),
+            mock_node_log(
+                "NODE_B", "WinNT", "DOMAIN_B", '"a@company.com,b@company.com"'
+            ),
+            mock_node_log("NODE_C", "Linux", "DOMAIN_C", node_contact="c@company.com"),
+            mock_node_log("NODE_D", "Linux", "DOMAIN_C", node_contact="c@company.com"),
+            mock_node_log("NODE_E", "TDP VMWare", "DOMAIN_C", node_contact="invalid"),
+        ]
+        vm_results = [
+            mock_vm_result("VM_SCHEDULE", "VM_A", True, 1, "NODE_E"),
+            mock_vm_result("VM_SCHEDULE", "VM_B", True, 2, "NODE_E"),
+            mock_vm_result("VM_SCHEDULE", "VM_C", True, 3, "UNKNOWN_NODE"),
+        ]
+
+        data = TSMData("TSMSRV1")
+
+        with unittest.mock.patch(
+            "parsing.tsm_data.parse_contacts", wraps=parse_contacts
+        ) as parse_contacts_mock:
+            data.parse_nodes(nodes_log)
+            # Each distinct contact string is only validated once
+            self.assertEqual(parse_contacts_mock.call_count, 4)
+            jobs = plan_mail_reports(["TSMSRV1"], {"TSMSRV1": data})
+            self.assertEqual(parse_contacts_mock.call_count, 4)
+
+        data.parse_vm_schedules(mock_vm_result_logs(vm_results))
+
+        self.assertEqual(
+            data.domains_by_contact["a@company.com,b@company.com"],
+            [data.domains["DOMAIN_A"], data.domains["DOMAIN_B"]],
+        )
+        self.assertEqual(
+            data.nodes_by_contact["c@company.com"],
+            [data.nodes["NODE_C"], data.nodes["NODE_D"]],
+        )
+        self.assertNotIn("invalid", data.nodes_by_contact)
+        self.assertEqual(
+            [node.name for node in data.nodes_by_platform["Linux"]],
+            ["NODE_A", "NODE_C", "NODE_D"],
+        )
+        self.assertEqual(data.nodes_by_entity, {"NODE_E": data.nodes["NODE_E"]})
+
+        self.assertEqual(
+            [(job.policy_domain.name, job.recipients) for job in jobs],
+            [
+                ("DOMAIN_A", "a@company.com,b@company.com"),
+                ("DOMAIN_B", "a@company.com,b@company.com"),
+                ("DOMAIN_C", "c@company.com"),
+            ],
+        )
+        self.assertEqual(
+            [node.name for node in jobs[2].policy_domain.nodes], ["NODE_C", "NODE_D"]
+        )
+
+    def test_string_interning(self):
+        """
+        Tests that repeated fields share a single string object after parsing
+        and after loading pickled data.
+        """
+        nodes_log = [
+            mock_node_log(f"NODE_{i}", "TDP VMWare", "DOMAIN", "contact@company.com")
+            for i in range(2)
+        ]
+        schedule_logs = {
+            f"NODE_{i}": mock_schedule_logs(
+                "DOMAIN", f"NODE_{i}", "SCHEDULE", ScheduleStatusEnum.SUCCESSFUL
+            )
+            for i in range(2)
+        }
+        vm_logs = mock_vm_result_logs(
+            [
+                mock_vm_result("VM_SCHEDULE", f"VM_{i}", True, i, "NODE_0")
+                for i in range(2)
+            ]
+        )
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(nodes_log)
+        data.parse_schedules_and_backup_results(schedule_logs, {})
+        data.parse_vm_schedules(vm_logs)
+
+        for loaded in (data, pickle.loads(pickle.dumps(data))):
+            node_0, node_1 = loaded.nodes["NODE_0"], loaded.nodes["NODE_1"]
+            vm_0, vm_1 = node_0.vm_results
+
+            self.assertIs(node_0.platform, node_1.platform)
+            self.assertIs(node_0.policy_domain_name, node_1.policy_domain_name)
+            self.assertIs(
+                node_0.schedules["SCHEDULE"].schedule_name,
+                node_1.schedules["SCHEDULE"].schedule_name,
+            )
+            self.assertIs(vm_0.schedule_name, vm_1.schedule_name)
+            self.assertIs(vm_0.activity_type, vm_1.activity_type)
+            self.assertIs(vm_0.entity, vm_1.entity)
+
+    def test_epoch_timestamps(self):
+        """
+        Tests that times are stored as epoch seconds and formatted for display,
+        keeping values which aren't timestamps unchanged.
+        """
+        epoch = to_epoch("2024-03-31 02:30:00")
+        self.assertIsInstance(epoch, int)
+        self.assertEqual(format_epoch(epoch), "2024-03-31 02:30:00")
+        self.assertEqual(to_epoch("Not started"), "Not started")
+        self.assertEqual(to_epoch("2024-13-01 00:00:00"), "2024-13-01 00:00:00")
+
+        vm_result = VMResult(
+            "VM_SCHEDULE",
+            "VM",
+            "2024-03-30 23:00:00.000000",
+            "2024-03-31 03:15:30.000000",
+        )
+        self.assertIsInstance(vm_result.start_epoch, int)
+        self.assertEqual(vm_result.start_time, "2024-03-30 23:00:00")
+        self.assertEqual(vm_result.end_time, "2024-03-31 03:15:30")
+        self.assertEqual(vm_result.elapsed_seconds, 4 * 3600 + 15 * 60 + 30)
+        self.assertEqual(vm_result.elapsed_time_str(), "04:15:30")
+        self.assertEqual(pickle.loads(pickle.dumps(vm_result)), vm_result)
+
+        with time_machine.travel(datetime.datetime(2024, 3, 31, 12, 0, 0), tick=False):
+            schedules = SchedulesParser().parse(
+                [
+                    "DOMAIN,SCHEDULE,NODE,2024-03-29 01:00:00,"
+                    "2024-03-29 01:00:05,2024-03-29 02:00:00,Completed,0,",
+                    "DOMAIN,SCHEDULE,NODE,2024-03-31 01:00:00,,,Missed,,",
+                ]
+            )
+
+        schedule = schedules["SCHEDULE"]
+        self.assertIsInstance(schedule.start_epoch, int)
+        self.assertEqual(schedule.start_time, "2024-03-31 01:00:00")
+        self.assertEqual(schedule.actual_start_time, "Not started")
+        self.assertEqual(schedule.end_time, " ")
+        self.assertEqual(
+            schedule.history[HISTORY_MAX_ITEMS - 2], ScheduleStatusEnum.SUCCESSFUL
+        )
+        self.assertEqual(schedule.history[-1], ScheduleStatusEnum.UNKNOWN)
+
+    def test_template_registry(self):
+        """
+        Tests that templates are loaded once, cached as bytecode and that
+        precompiled templates render the same as compiled ones.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, "cache")
+            precompiled_dir = os.path.join(tmp_dir, "precompiled")
+
+            registry = TemplateRegistry(cache_dir)
+            template = registry.get_template("./templates/statusmail.j2")
+            self.assertIs(
+                registry.get_template(os.path.abspath("./templates/statusmail.j2")),
+                template,
+            )
+            self.assertTrue(os.listdir(cache_dir))
+
+            precompile_templates("./templates", precompiled_dir)
+            precompiled = TemplateRegistry(cache_dir, precompiled_dir).get_template(
+                "./templates/statusmail.j2"
+            )
+            self.assertIsNot(precompiled, template)
+
+            policy_domain = mock_policy_domain(
+                "DOMAIN",
+                "contact@company.com",
+                [
+                    mock_node_with_schedules(
+                        "NODE",
+                        domain_name="DOMAIN",
+                        schedules={"S": ScheduleStatusEnum.FAILED},
+                    )
+                ],
+            )
+            report = build_report_view(policy_domain)
+            self.assertEqual(
+                precompiled.render(pd=policy_domain, report=report),
+                template.render(pd=policy_domain, report=report),
+            )
+
+    def test_parallel_rendering(self):
+        """
+        Tests that reports rendered on a pool of processes equal the reports
+        rendered on a single process.
+        """
+        reports = [
+            (
+                i,
+                mock_policy_domain(
+                    f"DOMAIN_{i}",
+                    "contact@company.com",
+                    [
+                        mock_node_with_schedules(
+                            f"NODE_{i}",
+                            domain_name=f"DOMAIN_{i}",
+                            schedules={"SCHEDULE": ScheduleStatusEnum.FAILED},
+                        )
+                    ],
+                ),
+            )
+            for i in range(6)
+        ]
+
+        rendered = list(render_reports("./templates/statusmail.j2", reports))
+        self.assertEqual([key for key, _ in rendered], list(range(6)))
+        self.assertEqual(
+            rendered[0][1],
+            ReportTemplate("./templates/statusmail.j2")
+            .render(reports[0][1])
+            .encode("utf-8"),
+        )
+
+        rendered_parallel = render_reports(
+            "./templates/statusmail.j2", reports, 2, parallel_threshold=1, chunk_size=2
+        )
+        self.assertEqual(sorted(rendered_parallel), rendered)
+
+    def test_streaming_render(self):
+        """
+        Tests streaming reports into export files and into the encoded message
+        sent by the status mailer.
+        """
+        policy_domain = mock_policy_domain(
+            "DOMAIN",
+            "contact@company.com",
+            [
+                mock_node_with_schedules(
+                    "NODE",
+                    domain_name="DOMAIN",
+                    schedules={"SCHEDULE": ScheduleStatusEnum.FAILED},
+                )
+            ],
+        )
+        template = ReportTemplate("./templates/statusmail.j2")
+        rendered = template.render(policy_domain)
+
+        buffer = io.BytesIO()
+        template.render_to(policy_domain, buffer)
+        self.assertEqual(buffer.getvalue(), rendered.encode("utf-8"))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            export_reports(
+                "./templates/statusmail.j2",
+                [(("TSMSRV1", "DOMAIN", ""), policy_domain)],
+                tmp_dir,
+            )
+            path = os.path.join(tmp_dir, "TSMSRV1_DOMAIN_report.html")
+            with open(path, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), rendered)
+
+        with unittest.mock.patch("smtplib.SMTP") as smtp:
+            smtp.return_value.noop.return_value = (250, b"")
+            mailer = StatusMailer("mailer.local", 25, "./templates/statusmail.j2")
+            mailer.send_to(
+                policy_domain,
+                "mailer@company.com",
+                "contact@company.com",
+                "Subject",
+                "",
+                "bcc@company.com",
+            )
+
+        sender, recipients, message = smtp.return_value.sendmail.call_args.args
+        headers, body = message.split(b"\r\n\r\n", 1)
+        self.assertEqual(sender, "mailer@company.com")
+        self.assertEqual(recipients, ["contact@company.com", "bcc@company.com"])
+        self.assertNotIn(b"Bcc", headers)
+        self.assertIn(b"Content-Type: text/html", headers)
+        self.assertEqual(body, rendered.replace("\n", "\r\n").encode("utf-8"))
+
+    def test_render_cache(self):
+        """
+        Tests that reports sent as mail are reused by the HTML export and that
+        cached reports persist in a directory.
+        """
+        config: dict[str, Any] = {
+            "mail_template_path": "./templates/statusmail.j2",
+            "mail_from_addr": "mailer@backup_mailer.com",
+            "mail_subject_template": "ISP: $status for $tsm_inst at $time for $pd_name",
+            "tsm_instances": ["TSMSRV1"],
+        }
+        mailer = StatusMailerMock("mailer.local", 25, config["mail_template_path"])
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(
+            [
+                mock_node_log(
+                    f"NODE_{name}",
+                    "Linux x86-64",
+                    f"DOMAIN_{name}",
+                    f"{name}@company.com",
+                )
+                for name in ("A", "B")
+            ]
+        )
+        data.parse_schedules_and_backup_results(
+            {
+                f"NODE_{name}": mock_schedule_logs(
+                    f"DOMAIN_{name}",
+                    f"NODE_{name}",
+                    "SCHEDULE",
+                    ScheduleStatusEnum.FAILED,
+                )
+                for name in ("A", "B")
+            },
+            {},
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = RenderCache(config["mail_template_path"], tmp_dir)
+
+            with unittest.mock.patch.object(
+                ReportTemplate,
+                "render_to",
+                autospec=True,
+                side_effect=ReportTemplate.render_to,
+            ) as render_to:
+                send_mail_reports(config, mailer, {"TSMSRV1": data}, cache)
+                self.assertEqual(render_to.call_count, 2)
+
+                export_reports(
+                    config["mail_template_path"],
+                    [
+                        (("TSMSRV1", name, ""), policy_domain)
+                        for name, policy_domain in data.domains.items()
+                    ],
+                    tmp_dir,
+                    cache=cache,
+                )
+                self.assertEqual(render_to.call_count, 2)
+
+            with open(
+                os.path.join(tmp_dir, "TSMSRV1_DOMAIN_A_report.html"), encoding="utf-8"
+            ) as f:
+                self.assertIn(f.read(), mailer.rendered_mail_mocks)
+
+            # Reports persist for replaying the same data
+            key = ("TSMSRV1", "DOMAIN_A", "")
+            self.assertIn(key, RenderCache(config["mail_template_path"], tmp_dir))
+            cache.clear()
+            self.assertIsNone(cache.get(key))
+
+    @time_machine.travel(datetime.datetime(2024, 5, 1), tick=False)
+    def test_report_change_detection(self):
+        """
+        Tests that unchanged reports are skipped according to the change policy
+        and that the state of sent reports persists between runs.
+        """
+        config: dict[str, Any] = {
+            "mail_template_path": "./templates/statusmail.j2",
+            "mail_from_addr": "mailer@backup_mailer.com",
+            "mail_subject_template": "ISP: $status for $tsm_inst at $time for $pd_name",
+            "tsm_instances": ["TSMSRV1"],
+        }
+
+        def mock_data(statuses: dict[str, ScheduleStatusEnum]) -> TSMData:
+            data = TSMData("TSMSRV1")
+            data.parse_nodes(
+                [
+                    mock_node_log(
+                        f"NODE_{name}",
+                        "Linux x86-64",
+                        f"DOMAIN_{name}",
+                        f"{name}@company.com",
+                    )
+                    for name in statuses
+                ]
+            )
+            data.parse_schedules_and_backup_results(
+                {
+                    f"NODE_{name}": mock_schedule_logs(
+                        f"DOMAIN_{name}", f"NODE_{name}", "SCHEDULE", status
+                    )
+                    for name, status in statuses.items()
+                },
+                {},
+            )
+            return data
+
+        def send(data: TSMData, detector: ReportChangeDetector) -> list[str]:
+            # Returns the receivers of the reports which have been sent
+            mailer = StatusMailerMock("mailer.local", 25, config["mail_template_path"])
+            with unittest.mock.patch.object(
+                mailer, "send_to", wraps=mailer.send_to
+            ) as send_to:
+                send_mail_reports(
+                    config, mailer, {"TSMSRV1": data}, change_detector=detector
+                )
+            detector.save()
+            return [call.args[2] for call in send_to.call_args_list]
+
+        failed = mock_data(
+            {"A": ScheduleStatusEnum.FAILED, "B": ScheduleStatusEnum.FAILED}
+        )
+
+        # VM results are fingerprinted by their records, not their pickled state
+        vm_domain = PolicyDomain(name="DOMAIN_VM")
+        vm_node = Node("NODE_VM", "TDP VMWare", "DOMAIN_VM", "")
+        vm_domain.add_node(vm_node)
+        fingerprint = report_fingerprint(vm_domain, "vm@company.com")
+
+        vm_result = mock_vm_result("VM_SCHEDULE", "VM", True, 10, "NODE_VM")
+        vm_node.add_vm_result(vm_result)
+        self.assertNotEqual(
+            report_fingerprint(vm_domain, "vm@company.com"), fingerprint
+        )
+        self.assertEqual(
+            pickle.loads(pickle.dumps(vm_result)).to_record(), vm_result.to_record()
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = os.path.join(tmp_dir, "report_state.json")
+
+            detector = ReportChangeDetector(state_path, ReportChangePolicy.CHANGED)
+            self.assertEqual(len(send(failed, detector)), 2)
+
+            # Identical data isn't sent again
+            detector = ReportChangeDetector(state_path, ReportChangePolicy.CHANGED)
+            self.assertEqual(send(failed, detector), [])
+            self.assertEqual(detector.unchanged_count, 2)
+
+            # Only the changed report is sent
+            recovered = mock_data(
+                {"A": ScheduleStatusEnum.FAILED, "B": ScheduleStatusEnum.SUCCESSFUL}
+            )
+            detector = ReportChangeDetector(state_path, ReportChangePolicy.CHANGED)
+            self.assertEqual(send(recovered, detector), ["B@company.com"])
+
+            # Changed data without a status transition isn't sent
+            missed = mock_data(
+                {"A": ScheduleStatusEnum.MISSED, "B": ScheduleStatusEnum.SUCCESSFUL}
+            )
+            detector = ReportChangeDetector(state_path, ReportChangePolicy.STATUS)
+            self.assertEqual(send(missed, detector), [])
+            self.assertEqual(detector.same_status_count, 2)
+
+            # OKAY -> WARN is sent
+            detector = ReportChangeDetector(state_path, ReportChangePolicy.STATUS)
+            self.assertEqual(send(failed, detector), ["B@company.com"])
+            self.assertEqual(detector.sent_count, 1)
+
+            # Only mails delivered by concurrent mailers are recorded as sent
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                closed_port = sock.getsockname()[1]
+
+            for mailer_class in (PooledMailer, AsyncMailer):
+                with self.subTest(mailer=mailer_class.__name__):
+                    state_path = os.path.join(
+                        tmp_dir, f"{mailer_class.__name__}_state.json"
+                    )
+
+                    detector = ReportChangeDetector(state_path)
+                    mailer = mailer_class(
+                        "127.0.0.1",
+                        closed_port,
+                        config["mail_template_path"],
+                        starttls=False,
+                    )
+                    send_mail_reports(
+                        config, mailer, {"TSMSRV1": failed}, change_detector=detector
+                    )
+                    mailer.close()
+                    detector.save()
+                    self.assertEqual(detector.sent_count, 0)
+
+                    with SMTPSink() as sink:
+                        detector = ReportChangeDetector(state_path)
+                        mailer = mailer_class(
+                            *sink.server_address,
+                            config["mail_template_path"],
+                            starttls=False,
+                        )
+                        send_mail_reports(
+                            config,
+                            mailer,
+                            {"TSMSRV1": failed},
+                            change_detector=detector,
+                        )
+                        mailer.close()
+                        detector.save()
+
+                    self.assertEqual(len(sink.mails), 2)
+                    self.assertEqual(detector.sent_count, 2)
+
+                    detector = ReportChangeDetector(state_path)
+                    self.assertEqual(send(failed, detector), [])
+
+            # Spooled reports are only recorded once the spool has been drained
+            state_path = os.path.join(tmp_dir, "spool_state.json")
+            spool = MailSpool(
+                os.path.join(tmp_dir, "spool"), config["mail_template_path"]
+            )
+
+            detector = ReportChangeDetector(state_path)
+            send_mail_reports(
+                config, spool, {"TSMSRV1": failed}, change_detector=detector
+            )
+            detector.save()
+            self.assertEqual(detector.sent_count, 0)
+            self.assertEqual(len(spool.pending_paths()), 2)
+
+            detector = ReportChangeDetector(state_path)
+            mailer = PooledMailer(
+                "127.0.0.1", closed_port, config["mail_template_path"], starttls=False
+            )
+            spool.drain(mailer, attempts=1, change_detector=detector)
+            mailer.close()
+            detector.save()
+            self.assertEqual(detector.sent_count, 0)
+
+            # A run saving its state while the spool is drained keeps the
+            # drained states
+            concurrent_detector = ReportChangeDetector(state_path)
+
+            with SMTPSink() as sink:
+                detector = ReportChangeDetector(state_path)
+                mailer = PooledMailer(
+                    *sink.server_address, config["mail_template_path"], starttls=False
+                )
+                self.assertEqual(spool.drain(mailer, change_detector=detector), 0)
+                mailer.close()
+                detector.save()
+
+            concurrent_detector.save()
+            self.assertEqual(detector.sent_count, 2)
+            self.assertNotIn(b"X-Spool-Report", sink.mails[0][3])
+
+            detector = ReportChangeDetector(state_path)
+            self.assertEqual(send(failed, detector), [])
+
+    def test_pooled_mailer(self):
+        """
+        Tests that the pooled and the async mailer send all mails concurrently
+        within their connection limits and reconnect after losing a connection.
+        """
+        for mailer_class in (PooledMailer, AsyncMailer):
+            with self.subTest(mailer=mailer_class.__name__):
+                with SMTPSink(drop_at=4) as sink:
+                    mailer = mailer_class(
+                        *sink.server_address,
+                        "./templates/statusmail.j2",
+                        max_connections=3,
+                        messages_per_connection=2,
+                        starttls=False,
+                    )
+                    for i in range(10):
+                        mailer.send_to(
+                            PolicyDomain(name=f"DOMAIN_{i}"),
+                            "mailer@backup_mailer.com",
+                            f"{i}@company.com",
+                            f"Report {i}",
+                            "",
+                            "bcc@company.com" if i == 0 else "",
+                            b"<html></html>" if i % 2 else None,
+                        )
+                    mailer.close()
+
+                self.assertEqual(mailer.sent_count, 10)
+                self.assertEqual(mailer.failed_count, 0)
+                self.assertEqual(
+                    sorted(recipients[0] for _, _, recipients, _ in sink.mails),
+                    sorted(f"<{i}@company.com>" for i in range(10)),
+                )
+                self.assertEqual(
+                    [len(recipients) for _, _, recipients, _ in sink.mails].count(2), 1
+                )
+                self.assertLessEqual(sink.max_concurrent_connections, 3)
+
+                # The lost connection is replaced as well
+                self.assertGreaterEqual(sink.connection_count, 6)
+
+                # Connections are replaced after sending two mails
+                connections = [connection for connection, _, _, _ in sink.mails]
+                self.assertLessEqual(max(map(connections.count, connections)), 2)
+
+                message = next(
+                    data for _, _, _, data in sink.mails if b"Report 1\r\n" in data
+                )
+                self.assertTrue(message.endswith(b"<html></html>\r\n"))
+
+    def test_mail_spool(self):
+        """
+        Tests that spooled mails remain in the spool until they have been delivered.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spool = MailSpool(tmp_dir, "./templates/statusmail.j2")
+            for i in range(3):
+                spool.send_to(
+                    PolicyDomain(name=f"DOMAIN_{i}"),
+                    "mailer@backup_mailer.com",
+                    f"{i}@company.com",
+                    f"Report {i}",
+                    "",
+                    "bcc@company.com",
+                    b"<html></html>" if i else None,
+                )
+            spool.close()
+
+            self.assertEqual(len(spool.pending_paths()), 3)
+            self.assertEqual(os.listdir(os.path.join(tmp_dir, "tmp")), [])
+
+            # Delivery fails without a reachable server
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                closed_port = sock.getsockname()[1]
+
+            mailer = PooledMailer(
+                "127.0.0.1", closed_port, "./templates/statusmail.j2", starttls=False
+            )
+            self.assertEqual(spool.drain(mailer, attempts=2, backoff=0), 3)
+            mailer.close()
+            self.assertEqual(len(spool.pending_paths()), 3)
+
+            with SMTPSink() as sink:
+                mailer = PooledMailer(
+                    *sink.server_address,
+                    "./templates/statusmail.j2",
+                    max_connections=2,
+                    starttls=False,
+                )
+                self.assertEqual(spool.drain(mailer), 0)
+                mailer.close()
+
+            self.assertEqual(spool.pending_paths(), [])
+            self.assertEqual(
+                [recipients for _, _, recipients, _ in sorted(sink.mails)][0][1],
+                "<bcc@company.com>",
+            )
+            self.assertEqual(
+                sorted(data.split(b"\r\n")[0] for _, _, _, data in sink.mails),
+                [f"Subject: Report {i}".encode() for i in range(3)],
+            )
+
+    def test_delivery_plan(self):
+        """
+        Tests that planned reports for the same recipients are merged into single
+        mails without duplicate recipients.
+        """
+        nodes_log = [
+            mock_node_log("NODE_A", "Linux", "DOMAIN_A", "a@company.com;A@company.com"),
+            mock_node_log("NODE_B", "Linux", "DOMAIN_B", "b@company.com;a@company.com"),
+            mock_node_log("NODE_C", "Linux", "DOMAIN_C", "a@company.com;B@company.com"),
+            mock_node_log("NODE_D", "Linux", "DOMAIN_D", node_contact="b@company.com"),
+        ]
+        data = {instance: TSMData(instance) for instance in ("TSMSRV1", "TSMSRV2")}
+        for tsm_data in data.values():
+            tsm_data.parse_nodes(nodes_log)
+
+        jobs = plan_mail_reports(list(data), data)
+        self.assertEqual(len(jobs), 8)
+
+        deliveries = plan_deliveries(jobs)
+        self.assertEqual(len(deliveries), 8)
+        self.assertEqual(deliveries[0].recipients, ["a@company.com"])
+
+        deliveries = plan_deliveries(jobs, DeliveryMerge.RECIPIENT)
+        self.assertEqual(len(deliveries), 6)
+        self.assertEqual(deliveries[0].reports, jobs[:1])
+        self.assertEqual(deliveries[1].recipients, ["b@company.com", "a@company.com"])
+        self.assertEqual(deliveries[1].reports, jobs[1:3])
+        self.assertEqual(
+            [delivery.instance for delivery in deliveries],
+            ["TSMSRV1"] * 3 + ["TSMSRV2"] * 3,
+        )
+
+        # Combined reports are inline HTML parts of a single mail
+        recipients, message = encode_report_mail(
+            ReportTemplate("./templates/statusmail.j2"),
+            jobs[0].policy_domain,
+            "mailer@backup_mailer.com",
+            "a@company.com, b@company.com",
+            "Reports",
+            "",
+            "A@company.com",
+            b"<html></html>",
+            [(jobs[1].policy_domain, None)],
+        )
+        self.assertEqual(recipients, ["a@company.com", "b@company.com"])
+
+        parts = list(
+            email.message_from_bytes(message, policy=email.policy.default).iter_parts()
+        )
+        self.assertEqual(
+            [part.get_filename() for part in parts], ["DOMAIN_A.html", "DOMAIN_B.html"]
+        )
+        self.assertEqual(parts[0].get_content().strip(), "<html></html>")
+
+        # Single reports declare their charset and encoding as well
+        _, message = encode_report_mail(
+            ReportTemplate("./templates/statusmail.j2"),
+            jobs[0].policy_domain,
+            "mailer@backup_mailer.com",
+            "a@company.com",
+            "Report",
+            "",
+            "",
+            "<html>Grüße</html>".encode(),
+        )
+        parsed = email.message_from_bytes(message, policy=email.policy.default)
+        self.assertEqual(parsed.get_content_charset(), "utf-8")
+        self.assertEqual(parsed["Content-Transfer-Encoding"], "8bit")
+        self.assertEqual(parsed.get_content(), "<html>Grüße</html>")
+
+        # Reports of domains with the same contact are sent as one mail
+        config: dict[str, Any] = {
+            "mail_template_path": "./templates/statusmail.j2",
+            "mail_from_addr": "mailer@backup_mailer.com",
+            "mail_subject_template": "ISP: $status for $tsm_inst at $time for $pd_name",
+            "tsm_instances": ["TSMSRV1"],
+            "mail_merge_reports": "recipient",
+        }
+        mailer = StatusMailerMock("mailer.local", 25, config["mail_template_path"])
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(
+            [
+                mock_node_log(
+                    f"NODE_{name}", "Linux x86-64", f"DOMAIN_{name}", "x@company.com"
+                )
+                for name in ("A", "B")
+            ]
+        )
+        data.parse_schedules_and_backup_results(
+            {
+                f"NODE_{name}": mock_schedule_logs(
+                    f"DOMAIN_{name}",
+                    f"NODE_{name}",
+                    "SCHEDULE",
+                    ScheduleStatusEnum.FAILED,
+                )
+                for name in ("A", "B")
+            },
+            {},
+        )
+        send_mail_reports(config, mailer, {"TSMSRV1": data})
+
+        self.assertEqual(mailer.receiver_mocks, ["x@company.com"])
+        self.assertEqual(len(mailer.rendered_mail_mocks), 2)
+
+    def test_status_mailer_connection(self):
+        """
+        Tests that the status mailer only checks idle connections and sends
+        a mail again over a new connection if the connection has been lost.
+        """
+
+        def send_mails(mailer: StatusMailer, count: int):
+            for i in range(count):
+                mailer.send_to(
+                    PolicyDomain(name=f"DOMAIN_{i}"),
+                    "mailer@backup_mailer.com",
+                    f"{i}@company.com",
+                    f"Report {i}",
+                    "",
+                    "",
+                    b"<html></html>",
+                )
+            mailer.close()
+
+        with SMTPSink(drop_at=2) as sink:
+            send_mails(
+                StatusMailer(
+                    *sink.server_address, "./templates/statusmail.j2", starttls=False
+                ),
+                3,
+            )
+
+        self.assertNotIn("NOOP", sink.commands)
+        self.assertEqual(len(sink.mails), 3)
+        self.assertEqual(sink.connection_count, 2)
+
+        # Idle connections are checked before sending
+        with SMTPSink() as sink:
+            send_mails(
+                StatusMailer(
+                    *sink.server_address,
+                    "./templates/statusmail.j2",
+                    idle_threshold=-1,
+                    starttls=False,
+                ),
+                3,
+            )
+
+        self.assertEqual(sink.commands.count("NOOP"), 2)
+        self.assertEqual(len(sink.mails), 3)
+        self.assertEqual(sink.connection_count, 1)
+
+    def test_report_view(self):
+        """
+        Tests that the report view-model contains preformatted rows with
+        alternating shading across all tables.
+        """
+        nodes = [
+            mock_node_with_schedules(
+                f"NODE_{i}",
+                domain_name="DOMAIN",
+                schedules={"SCHEDULE": status},
+            )
+            for i, status in enumerate(
+                [
+                    ScheduleStatusEnum.FAILED,
+                    ScheduleStatusEnum.SUCCESSFUL,
+                    ScheduleStatusEnum.MISSED,
+                ]
+            )
+        ]
+        nodes[1].vm_results = [mock_vm_result("VM_SCHEDULE", "VM", False, 1, "NODE_1")]
+        policy_domain = mock_policy_domain("DOMAIN", "contact@company.com", nodes)
+
+        report = build_report_view(policy_domain)
+
+        self.assertEqual(
+            [
+                (row.node_name, row.status_class, row.status_text, row.row_class)
+                for row in report.schedule_rows
+            ],
+            [
+                ("NODE_0", "failed", "Failed", ""),
+                ("NODE_2", "missed", "Missed", "alternate_row"),
+            ],
+        )
+        self.assertEqual(
+            len(report.schedule_rows[0].history_classes), HISTORY_MAX_ITEMS
+        )
+        self.assertIs(
+            report.schedule_rows[0].history_classes,
+            report.schedule_rows[1].history_classes,
+        )
+        self.assertEqual(
+            [row.row_class for row in report.client_rows],
+            ["", "alternate_row", ""],
+        )
+        self.assertEqual(
+            report.client_rows[0].inspected, nodes[0].backupresult.inspected_str()
+        )
+        self.assertEqual(report.client_summary.row_class, "alternate_row")
+        self.assertEqual(report.vm_rows[0].row_class, "alternate_row")
+        self.assertEqual(report.vm_rows[0].success_text, "NO")
+        self.assertEqual(report.vm_summary.row_class, "")
+
+    def test_tokenizer(self):
+        """
+        Tests tokenizing raw dsmadmc output and parsing it without decoding it first.
+        """
+        lines = [
+            'NODE_A,Linux x86-64,DOMAIN,,,"a@company.com,b@company.com"',
+            "NODE_B,Linux x86-64,DOMAIN,,,c@company.com",
+            'NODE_C,"Windows, x64",DOMAIN,,"Domain ""contact""",',
+        ]
+        raw = "\r\n".join(lines).encode() + b"\r\n"
+
+        rows = list(iter_rows(lines))
+        self.assertEqual(rows[0][5], "a@company.com,b@company.com")
+        self.assertEqual(rows[2][1], "Windows, x64")
+        self.assertEqual(rows[2][4], 'Domain "contact"')
+        self.assertEqual(list(iter_rows(raw)), rows)
+        self.assertEqual(
+            list(iter_rows(memoryview(raw), (5, 0))), [(row[5], row[0]) for row in rows]
+        )
+        self.assertEqual(count_lines(raw), len(lines))
+
+        # Stray quotes in unquoted fields don't swallow the following fields
+        self.assertEqual(
+            split_fields('NODE_D,Linux,DOMAIN,,Room 5" rack,d@company.com'),
+            ["NODE_D", "Linux", "DOMAIN", "", 'Room 5" rack', "d@company.com"],
+        )
+        self.assertEqual(
+            split_fields(b'NODE_E,"Linux,DOMAIN'), [b"NODE_E", b'"Linux', b"DOMAIN"]
+        )
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(['NODE_D,Linux,DOMAIN,NO,Room 5" rack,d@company.com'])
+        self.assertEqual(data.domains["DOMAIN"].contact, 'Room 5" rack')
+
+        # Lines spanning multiple chunks are joined again
+        with unittest.mock.patch("parsing.tokenizer.LINE_CHUNK_SIZE", 7):
+            self.assertEqual(list(iter_lines(raw)), [line.encode() for line in lines])
+            self.assertEqual(count_lines(raw[:-2]), len(lines))
+
+        data_raw = TSMData("TSMSRV1")
+        data_raw.parse_nodes(raw)
+        self.assertEqual(
+            data_raw.nodes["NODE_A"].contact, "a@company.com,b@company.com"
+        )
+
+        schedule_log = mock_schedule_logs(
+            "DOMAIN", "NODE_A", "SCHEDULE", ScheduleStatusEnum.FAILED
+        )
+        self.assertEqual(
+            SchedulesParser().parse("\n".join(schedule_log).encode()),
+            SchedulesParser().parse(schedule_log),
+        )
+
+    def test_spilled_collector_output(self):
+        """
+        Tests that large dsmadmc output spilled to disk is memory mapped
+        and parsed the same way as output held in memory.
+        """
+        vm_logs = mock_vm_result_logs(
+            [
+                mock_vm_result("VM_SCHEDULE", f"VM_{i}", True, i, "NODE_VM")
+                for i in range(100)
+            ]
+        )
+        output = "\n".join(vm_logs).encode()
+
+        def dsmadmc(args, stdout):
+            stdout.write(output)
+            stdout.flush()
+            return 0
+
+        config = CollectorConfig(
+            {
+                "tsm_credentials_file": "",
+                "spill_to_disk": True,
+                "spill_mmap_threshold": len(output) // 2,
+            },
+            "TSMSRV1",
+        )
+
+        with unittest.mock.patch("collector.collector.subprocess.call", dsmadmc):
+            vms_log = collect_vm_schedules(config)
+
+        self.assertIsInstance(vms_log, mmap.mmap)
+
+        # The memory map is closed once it has been parsed
+        data_spilled = TSMData("TSMSRV1")
+        with closing_output(vms_log) as spilled:
+            data_spilled.parse_vm_schedules(spilled)
+        self.assertTrue(vms_log.closed)
+
+        data = TSMData("TSMSRV1")
+        data.parse_vm_schedules(vm_logs)
+
+        self.assertEqual(data_spilled.vm_results, data.vm_results)
+
+        # Outputs below the threshold are read into memory
+        config.app_config["spill_mmap_threshold"] = len(output) + 1
+        with unittest.mock.patch("collector.collector.subprocess.call", dsmadmc):
+            with closing_output(collect_vm_schedules(config)) as in_memory:
+                self.assertEqual(in_memory, output)
+
     def test_jinja_parsing(self):
         """
         Tests parsing the HTML report from existing data.
@@ -453,6 +1784,164 @@ class TestParsing(unittest.TestCase):
             rendered_template_expected = f.read()
         self.assertEqual(rendered_template_expected, rendered_template)
 
+    def test_schedule_history_matrix(self):
+        """
+        Tests packing schedule histories into the instance wide history matrix
+        and the vectorized queries on it.
+        """
+        domain_a_name = "DOMAIN_A"
+        domain_b_name = "DOMAIN_B"
+        schedule_name = "SCHEDULE"
+
+        nodes_log = [
+            mock_node_log("NODE_A", "Linux x86-64", domain_a_name),
+            mock_node_log("NODE_B", "Linux x86-64", domain_a_name),
+            mock_node_log("NODE_C", "Linux x86-64", domain_b_name),
+        ]
+        schedule_logs = {
+            "NODE_A": mock_schedule_logs(
+                domain_a_name, "NODE_A", schedule_name, ScheduleStatusEnum.FAILED
+            ),
+            "NODE_B": mock_schedule_logs(
+                domain_a_name,
+                "NODE_B",
+                schedule_name,
+                ScheduleStatusEnum.SUCCESSFUL,
+            ),
+            "NODE_C": mock_schedule_logs(
+                domain_b_name,
+                "NODE_C",
+                schedule_name,
+                ScheduleStatusEnum.SUCCESSFUL,
+            ),
+        }
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(nodes_log)
+        data.parse_schedules_and_backup_results(schedule_logs, {})
+
+        template = ReportTemplate("./templates/statusmail.j2")
+        rendered_before = template.render(data.domains[domain_a_name])
+
+        history = data.build_schedule_history()
+
+        self.assertEqual(history.history.shape, (3, HISTORY_MAX_ITEMS))
+        for node in data.nodes.values():
+            self.assertTrue(
+                np.shares_memory(node.schedules[schedule_name].history, history.history)
+            )
+
+        # Rendering from the matrix views has to produce the same report
+        self.assertEqual(rendered_before, template.render(data.domains[domain_a_name]))
+
+        # Every mocked history contains four failed days, two of them within
+        # the last three days.
+        self.assertEqual(
+            history.failed_schedules(),
+            [
+                ("NODE_A", schedule_name),
+                ("NODE_B", schedule_name),
+                ("NODE_C", schedule_name),
+            ],
+        )
+        self.assertEqual(history.failed_schedules(min_days=3, days=3), [])
+
+        self.assertEqual(
+            history.domain_status(), {domain_a_name: "WARN", domain_b_name: "OKAY"}
+        )
+
+        success_rates = history.daily_success_rates()
+        self.assertTrue(np.isnan(success_rates[domain_a_name][0]))
+        self.assertEqual(success_rates[domain_a_name][-1], 1.0)
+        self.assertEqual(success_rates[domain_b_name][-2], 0.0)
+
+        # The matrix is rebuilt when loading pickled data
+        data_loaded = pickle.loads(pickle.dumps(data))
+        self.assertIsNotNone(data_loaded.schedule_history)
+        self.assertTrue(
+            np.array_equal(data_loaded.schedule_history.history, history.history)
+        )
+
+        # Pending logs of lazily parsed nodes are left out instead of being parsed,
+        # also when loading pickled data
+        data_lazy = TSMData("TSMSRV1")
+        data_lazy.parse_nodes(nodes_log)
+        data_lazy.parse_schedules_and_backup_results(schedule_logs, {}, lazy=True)
+        data_lazy.domains[domain_b_name].parse_pending_logs()
+
+        history = data_lazy.build_schedule_history()
+        self.assertEqual(history.failed_schedules(), [("NODE_C", schedule_name)])
+
+        data_loaded = pickle.loads(pickle.dumps(data_lazy))
+        self.assertEqual(len(data_loaded.schedule_history), 1)
+        for node_name in ("NODE_A", "NODE_B"):
+            self.assertTrue(
+                data_loaded.nodes[node_name].status_flags & NodeStatusFlag.PENDING_LOGS
+            )
+
+    def test_backup_result_store_summaries(self):
+        """
+        Tests that summaries calculated from the columnar backup result store
+        match the summaries added up node by node.
+        """
+        domain_name = "DOMAIN_LOOSE"
+        node_names = [f"NODE_{i}" for i in range(6)]
+        contacts = ["a@company.com", "b@company.com"]
+
+        data = TSMData("TSMSRV1")
+        data.parse_nodes(
+            [
+                mock_node_log(
+                    node_name,
+                    "TDP VMWare",
+                    domain_name,
+                    node_contact=contacts[i % len(contacts)],
+                )
+                for i, node_name in enumerate(node_names)
+            ]
+        )
+        data.parse_schedules_and_backup_results(
+            {},
+            {node_name: mock_backup_result_log(node_name) for node_name in node_names},
+        )
+        data.parse_vm_schedules(
+            mock_vm_result_logs(
+                [
+                    mock_vm_result("VM_SCHEDULE", f"VM_{i}", True, i * 10**9, name)
+                    for i, name in enumerate(node_names[:3])
+                ]
+            )
+        )
+
+        self.assertIsNotNone(data.backup_results)
+
+        domain = data.domains[domain_name]
+        self.assertEqual(domain, PolicyDomain(list(domain.nodes), domain_name))
+        self.assertEqual(domain.vm_backup_summary.backed_up_bytes, 3 * 10**9)
+
+        loose_nodes = collect_loose_nodes(
+            domain_name, data.nodes_by_contact, data.backup_results
+        )
+        loose_nodes_expected = collect_loose_nodes(domain_name, data.nodes_by_contact)
+
+        self.assertEqual(list(loose_nodes), contacts)
+        for contact, loose_domain in loose_nodes.items():
+            loose_domain_expected = loose_nodes_expected[contact]
+
+            self.assertEqual(loose_domain.nodes, loose_domain_expected.nodes)
+            self.assertEqual(
+                loose_domain.client_backup_summary,
+                loose_domain_expected.client_backup_summary,
+            )
+            self.assertEqual(
+                loose_domain.vm_backup_summary.backed_up_bytes,
+                loose_domain_expected.vm_backup_summary.backed_up_bytes,
+            )
+            self.assertEqual(
+                loose_domain.vm_backup_summary.elapsed_time,
+                loose_domain_expected.vm_backup_summary.elapsed_time,
+            )
+
     # Use time_machine to be able to compare the rendered template to an expected, pre-rendered
     # template with fixed dates and times.
     @time_machine.travel(datetime.datetime(2024, 5, 1))
@@ -542,6 +2031,44 @@ class TestParsing(unittest.TestCase):
             rendered_template_expected = f.read()
         self.assertEqual(rendered_template_expected, rendered_template)
 
+    def test_plan_mail_reports(self):
+        """
+        Tests planning the mail reports of policy domains and loose nodes.
+        """
+        nodes_log = [
+            mock_node_log("NODE_A", "Linux", "DOMAIN_A", "a@company.com;b@company.com"),
+            mock_node_log("NODE_B", "Linux", "DOMAIN_B", "invalid"),
+            mock_node_log(
+                "NODE_C", "Linux", "COLLECTION", node_contact="c@company.com"
+            ),
+            mock_node_log(
+                "NODE_D", "Linux", "COLLECTION", node_contact="c@company.com"
+            ),
+            mock_node_log(
+                "NODE_E", "Linux", "COLLECTION", node_contact="e@company.com"
+            ),
+        ]
+
+        data = {"TSMSRV1": TSMData("TSMSRV1")}
+        data["TSMSRV1"].parse_nodes(nodes_log)
+
+        jobs = plan_mail_reports(["TSMSRV1", "TSMSRV2"], data)
+
+        self.assertEqual(
+            [(job.policy_domain.name, job.recipients) for job in jobs],
+            [
+                ("DOMAIN_A", "a@company.com,b@company.com"),
+                ("COLLECTION", "c@company.com"),
+                ("COLLECTION", "e@company.com"),
+            ],
+        )
+        self.assertEqual(
+            jobs[0].recipient_set(), frozenset(["a@company.com", "b@company.com"])
+        )
+        self.assertEqual(
+            [node.name for node in jobs[1].policy_domain.nodes], ["NODE_C", "NODE_D"]
+        )
+
     def test_send_mail_reports(self):
         """
         Tests parsing and sending report mails to the clients.
@@ -617,6 +2144,7 @@ class TestParsing(unittest.TestCase):
                 domain_loose_name, nodes=[nodes[node_loose_name]]
             ),
         }
+        data[instance_name].build_indexes()
 
         send_mail_reports(config, mailer, data)
 
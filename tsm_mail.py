@@ -4,7 +4,6 @@
 Main entrypoint to the TSM mail program.
 """
 
-import re
 import os
 import sys
 import pickle
@@ -12,123 +11,138 @@ import logging
 import logging.handlers
 import argparse
 from string import Template
-from typing import Any
+from typing import Any, Callable
 from datetime import datetime
 
 import yaml
 
 from parsing.tsm_data import TSMData
-from parsing.node import Node
 from parsing.policy_domain import PolicyDomain
 from parsing.constants import (
+    HISTORY_MAX_ITEMS,
+    PARSE_PARALLEL_THRESHOLD,
+    RENDER_PARALLEL_THRESHOLD,
+    SMTP_NEWLINE,
+    REPORT_STATE_PATH,
     LOG_LEVEL_DEBUG_STR,
     LOG_LEVEL_ERROR_STR,
     LOG_LEVEL_INFO_STR,
     LOG_LEVEL_WARN_STR,
 )
-from parsing.report_template import ReportTemplate
+from parsing.template_registry import configure_registry, get_registry
 
 from collector.collector import (
     CollectorConfig,
+    closing_output,
     collect_nodes_and_domains,
     collect_vm_schedules,
-    collect_client_backup_results,
-    collect_schedule_logs,
+    iter_node_logs,
 )
 
 from mailer.status_mailer import StatusMailer
-from mailer.mailer import Mailer
+from mailer.pooled_mailer import PooledMailer
+from mailer.async_mailer import AsyncMailer
+from mailer.mail_spool import MailSpool
+from mailer.mailer import Mailer, DeliveryResult
+from mailer.report_plan import plan_mail_reports
+from mailer.delivery_plan import DeliveryMerge, plan_deliveries
+from mailer.report_renderer import render_reports, export_reports, use_render_pool
+from mailer.render_cache import RenderCache, ReportKey
+from mailer.report_changes import (
+    ReportChangeDetector,
+    ReportChangePolicy,
+    ReportDelivery,
+    report_fingerprint,
+    report_status,
+)
 
 logger = logging.getLogger("main")
 __VERSION__ = "0.12.0"
 
 
-def parse_contacts(contact_str: str) -> str | None:
-    """
-    Parse e-mail strings using regex.
-    """
-    # Mail regex for validating mail addresses
-    regex = r"(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7},? *\b)+"
-
-    contacts = contact_str.replace(";", ",")
-
-    if not re.fullmatch(regex, contacts):
-        logger.error(
-            "Error validating mail address: %s. Mail address is not valid.", contacts
-        )
-        return None
-
-    return contacts
-
-
-def collect_loose_nodes(
-    pd_name: str, nodes: list[Node]
-) -> dict[str, PolicyDomain] | None:
-    """
-    Create a collection containing all nodes which have individual contacts defined
-    instead of being part of a policy domain with a defined contact.
-    """
-    loose_nodes_collection: dict[str, PolicyDomain] = {}
-
-    for node in nodes:
-        if node.contact:
-            contacts = parse_contacts(node.contact)
-            if not contacts:
-                logger.warning("parse_contacts didn't return a valid contact string.")
-                continue
-
-            if contacts not in loose_nodes_collection:
-                loose_nodes_collection[contacts] = PolicyDomain([node], pd_name)
-            else:
-                loose_nodes_collection[contacts].nodes.append(node)
-
-    for pd in loose_nodes_collection.values():
-        pd.calculate_backup_summaries()
-
-    return loose_nodes_collection
-
-
 def send_mail(
     config: dict[str, Any],
     mailer: Mailer,
-    policy_domain: PolicyDomain,
+    reports: list[tuple[PolicyDomain, bytes | None]],
     sender_addr: str,
     receiver_addr: str,
     reply_to: str,
     bcc: str,
     instance: str,
     time_string: str,
+    delivered: Callable[[DeliveryResult], None] | None = None,
 ):
     """
-    Create mail subject and call mailer to send mail.
+    Create mail subject and call mailer to send a mail containing the reports
+    of the policy domains, which have been rendered already unless they are None.
+    delivered is called by the mailer with the result of sending the mail.
     """
-    if not policy_domain.has_client_schedules() and not policy_domain.has_vm_backups():
-        logger.info("No backups in 24 hours detected for %s.", policy_domain.name)
-    else:
-        subject_template = Template(config["mail_subject_template"])
-
-        logger.info("Parsing mail template for %s.", receiver_addr)
-        subject = subject_template.substitute(
-            {
-                "status": (
-                    "OKAY"
-                    if not policy_domain.has_non_successful_schedules()
-                    else "WARN"
-                ),
-                "tsm_inst": instance,
-                "pd_name": policy_domain.name,
-                "time": time_string,
-            }
-        )
+    subject_template = Template(config["mail_subject_template"])
+    policy_domains = [policy_domain for policy_domain, _ in reports]
+
+    logger.info("Parsing mail template for %s.", receiver_addr)
+    subject = subject_template.substitute(
+        {
+            "status": (
+                "WARN"
+                if any(report_status(pd) == "WARN" for pd in policy_domains)
+                else "OKAY"
+            ),
+            "tsm_inst": instance,
+            "pd_name": ", ".join(dict.fromkeys(pd.name for pd in policy_domains)),
+            "time": time_string,
+        }
+    )
 
-        mailer.send_to(
-            policy_domain, sender_addr, receiver_addr, subject, reply_to, bcc
-        )
+    (policy_domain, rendered_html), *extra_reports = reports
+    mailer.send_to(
+        policy_domain,
+        sender_addr,
+        receiver_addr,
+        subject,
+        reply_to,
+        bcc,
+        rendered_html,
+        extra_reports or None,
+        delivered,
+    )
 
 
-def send_mail_reports(config: dict[str, Any], mailer: Mailer, data: dict[str, TSMData]):
+def has_backups(policy_domain: PolicyDomain) -> bool:
+    """
+    Checks if a policy domain has any backups to report.
+    """
+    return policy_domain.has_client_schedules() or policy_domain.has_vm_backups()
+
+
+def render_options(config: dict[str, Any]) -> tuple[int | None, int]:
+    """
+    Returns the number of rendering processes and the minimum number of reports
+    for rendering them on multiple processes.
+    """
+    # Render reports on a single process, unless configured otherwise
+    # (0 uses all CPU cores)
+    render_processes = config["render_processes"] if "render_processes" in config else 1
+    render_parallel_threshold = (
+        config["render_parallel_threshold"]
+        if "render_parallel_threshold" in config
+        else RENDER_PARALLEL_THRESHOLD
+    )
+
+    return render_processes if render_processes else None, render_parallel_threshold
+
+
+def send_mail_reports(
+    config: dict[str, Any],
+    mailer: Mailer,
+    data: dict[str, TSMData],
+    render_cache: RenderCache | None = None,
+    change_detector: ReportChangeDetector | None = None,
+):
     """
     Prepare and send mails using the StatusMailer class.
+    If a render cache is supplied, reports are taken from or stored in it.
+    Reports skipped by the change detector are neither rendered nor sent.
     """
 
     current_time = datetime.now()
@@ -146,64 +160,216 @@ def send_mail_reports(config: dict[str, Any], mailer: Mailer, data: dict[str, TS
     )
 
     logger.info("Preparing mail reports...")
-    for inst in config["tsm_instances"]:
-        if inst not in data:
-            logger.error("Instance name not found in pickled data.")
-            break
+    jobs = []
+    for job in plan_mail_reports(config["tsm_instances"], data):
+        if has_backups(job.policy_domain):
+            jobs.append(job)
+        else:
+            logger.info(
+                "No backups in 24 hours detected for %s.", job.policy_domain.name
+            )
 
-        # Nodes to be collected when policy domain has no contact specified
-        loose_nodes: dict[str, PolicyDomain] | None = {}
+    # Fingerprint and status of each report, recorded once it has been sent
+    report_states: dict[ReportKey, tuple[str, str]] = {}
 
-        for policy_domain in data[inst].domains.values():
-            if policy_domain.contact:
-                contacts = parse_contacts(policy_domain.contact)
-                if not contacts:
-                    logger.warning(
-                        "parse_contacts didn't return a "
-                        "valid contact string, skipping policy domain %s.",
-                        policy_domain.name,
-                    )
-                    continue
-
-                send_mail(
-                    config,
-                    mailer,
-                    policy_domain,
-                    config["mail_from_addr"],
-                    contacts,
-                    reply_to,
-                    bcc,
-                    inst,
-                    time_string,
-                )
-            elif not loose_nodes:
-                loose_nodes = collect_loose_nodes(
-                    policy_domain.name, policy_domain.nodes
-                )
+    if change_detector is not None:
+        template_hash = get_registry().template_hash(config["mail_template_path"])
+        changed_jobs = []
+
+        for job in jobs:
+            state = (
+                report_fingerprint(job.policy_domain, job.recipients, template_hash),
+                report_status(job.policy_domain),
+            )
+            if change_detector.should_send(job.report_key(), *state):
+                report_states[job.report_key()] = state
+                changed_jobs.append(job)
 
-                if not loose_nodes:
-                    logger.warning(
-                        "No node has contact specified in "
-                        "PolicyDomain without contact information."
-                    )
+        jobs = changed_jobs
 
-        # Send mail reports for collected loose nodes
-        if not loose_nodes:
-            logger.info("No nodes in loose_nodes to process.")
+    merge = (
+        DeliveryMerge(config["mail_merge_reports"])
+        if "mail_merge_reports" in config and config["mail_merge_reports"]
+        else DeliveryMerge.OFF
+    )
+    deliveries = plan_deliveries(jobs, merge)
+    reports = [report for delivery in deliveries for report in delivery.reports]
+    deliveries_by_key = {
+        report.report_key(): delivery
+        for delivery in deliveries
+        for report in delivery.reports
+    }
+
+    render_processes, render_parallel_threshold = render_options(config)
+
+    if render_cache is not None or use_render_pool(
+        len(reports), render_processes, render_parallel_threshold
+    ):
+        # Mails are sent in the order their reports are rendered
+        rendered_reports = render_reports(
+            config["mail_template_path"],
+            ((report.report_key(), report.policy_domain) for report in reports),
+            render_processes,
+            render_parallel_threshold,
+            newline=SMTP_NEWLINE,
+            cache=render_cache,
+        )
+    else:
+        # The mailer streams each report into its message itself
+        rendered_reports = ((report.report_key(), None) for report in reports)
+
+    # Reports of mails containing several reports, until all of them are rendered
+    rendered_parts: dict[int, dict[ReportKey, bytes | None]] = {}
+
+    for key, rendered_html in rendered_reports:
+        delivery = deliveries_by_key[key]
+        parts = rendered_parts.setdefault(id(delivery), {})
+        parts[key] = rendered_html
+
+        if len(parts) < len(delivery.reports):
             continue
 
-        for contact, policy_domain in loose_nodes.items():
-            send_mail(
-                config,
-                mailer,
-                policy_domain,
-                config["mail_from_addr"],
-                contact,
-                reply_to,
-                bcc,
-                inst,
-                time_string,
-            )
+        del rendered_parts[id(delivery)]
+
+        send_mail(
+            config,
+            mailer,
+            [
+                (report.policy_domain, parts[report.report_key()])
+                for report in delivery.reports
+            ],
+            config["mail_from_addr"],
+            ", ".join(delivery.recipients),
+            reply_to,
+            bcc,
+            delivery.instance,
+            time_string,
+            (
+                ReportDelivery(
+                    change_detector,
+                    [
+                        (job.report_key(), *report_states[job.report_key()])
+                        for job in delivery.reports
+                    ],
+                )
+                if change_detector is not None
+                else None
+            ),
+        )
+
+
+def mail_server_options(config: dict[str, Any]) -> tuple[int, int]:
+    """
+    Returns the maximum number of concurrent SMTP connections and the number of
+    mails sent over a connection before it is replaced.
+    """
+    return (
+        (
+            config["mail_server_connections"]
+            if "mail_server_connections" in config and config["mail_server_connections"]
+            else 1
+        ),
+        (
+            config["mail_server_messages_per_connection"]
+            if "mail_server_messages_per_connection" in config
+            and config["mail_server_messages_per_connection"]
+            else 0
+        ),
+    )
+
+
+def create_mailer(config: dict[str, Any]) -> Mailer:
+    """
+    Create the mailer selected by the configuration.
+    """
+    if "mail_spool_dir" in config and config["mail_spool_dir"]:
+        return MailSpool(config["mail_spool_dir"], config["mail_template_path"])
+
+    smtp_credentials = (config["mail_server_username"], config["mail_server_password"])
+    connections, messages_per_connection = mail_server_options(config)
+
+    if "mail_async" in config and config["mail_async"]:
+        return AsyncMailer(
+            config["mail_server_host"],
+            config["mail_server_port"],
+            config["mail_template_path"],
+            smtp_credentials,
+            connections,
+            messages_per_connection,
+        )
+
+    if connections > 1:
+        return PooledMailer(
+            config["mail_server_host"],
+            config["mail_server_port"],
+            config["mail_template_path"],
+            smtp_credentials,
+            connections,
+            messages_per_connection,
+        )
+
+    return StatusMailer(
+        config["mail_server_host"],
+        config["mail_server_port"],
+        config["mail_template_path"],
+        smtp_credentials,
+    )
+
+
+def create_change_detector(config: dict[str, Any]) -> ReportChangeDetector | None:
+    """
+    Create the change detector of the configured change policy, or None if all
+    reports are sent.
+    """
+    change_policy = (
+        ReportChangePolicy(config["report_change_policy"])
+        if "report_change_policy" in config and config["report_change_policy"]
+        else ReportChangePolicy.ALWAYS
+    )
+
+    if change_policy is ReportChangePolicy.ALWAYS:
+        return None
+
+    return ReportChangeDetector(
+        (
+            config["report_state_path"]
+            if "report_state_path" in config and config["report_state_path"]
+            else REPORT_STATE_PATH
+        ),
+        change_policy,
+    )
+
+
+def drain_spool(config: dict[str, Any]):
+    """
+    Deliver all mails of the spool, retrying failed mails with backoff.
+    The states of the reports of delivered mails are recorded for change detection.
+    """
+    if "mail_spool_dir" not in config or not config["mail_spool_dir"]:
+        logger.error("No mail_spool_dir configured, nothing to drain.")
+        sys.exit(1)
+
+    spool = MailSpool(config["mail_spool_dir"], config["mail_template_path"])
+    mailer = PooledMailer(
+        config["mail_server_host"],
+        config["mail_server_port"],
+        config["mail_template_path"],
+        (config["mail_server_username"], config["mail_server_password"]),
+        *mail_server_options(config),
+    )
+
+    change_detector = create_change_detector(config)
+
+    try:
+        remaining = spool.drain(mailer, change_detector=change_detector)
+    finally:
+        mailer.close()
+
+        if change_detector:
+            change_detector.save()
+
+    if remaining:
+        sys.exit(1)
 
 
 def load_config(path: str) -> dict[str, Any]:
@@ -275,11 +441,16 @@ def setup_logger(config: dict[str, Any]):
         logger.addHandler(file_handler)
 
 
-def export_to_html(config: dict[str, Any], data: dict[str, TSMData]):
+def export_to_html(
+    config: dict[str, Any],
+    data: dict[str, TSMData],
+    render_cache: RenderCache | None = None,
+):
     """
     Render and export all reports to HTML files which have been parsed from the TSM data.
+    If a render cache is supplied, reports are taken from or stored in it.
     """
-    template = ReportTemplate(config["mail_template_path"])
+    reports = []
 
     for inst in config["tsm_instances"]:
         if inst not in data:
@@ -287,40 +458,78 @@ def export_to_html(config: dict[str, Any], data: dict[str, TSMData]):
             break
 
         for policy_domain in data[inst].domains.values():
-            html_test_render = template.render(policy_domain)
+            # Pending logs are parsed once, not by every rendering process
+            policy_domain.parse_pending_logs()
+            reports.append(((inst, policy_domain.name, ""), policy_domain))
 
-            with open(
-                f"{inst}_{policy_domain.name}_report.html", "w", encoding="utf-8"
-            ) as file:
-                file.write(html_test_render)
+    export_reports(
+        config["mail_template_path"],
+        reports,
+        ".",
+        *render_options(config),
+        cache=render_cache,
+    )
 
 
-def collect_and_parse_instance(config: dict[str, Any], inst: str) -> TSMData:
+def collect_and_parse_instance(
+    config: dict[str, Any], inst: str, lazy_parsing: bool = False
+) -> TSMData:
     """
     Collect and parse all data from a TSM server instance using the Collector class and
     parsing methods from TSMData class.
+    If lazy_parsing is set, node logs are only parsed once their policy domain
+    is reported.
     """
     collector_config = CollectorConfig(config, inst)
-    # Collect overall data from the environment
-    nodes_and_domains = collect_nodes_and_domains(collector_config)
-    vms_list = collect_vm_schedules(collector_config)
-
-    # Collect logs for each node
-    node_schedule_logs = collect_schedule_logs(collector_config, nodes_and_domains)
-    client_backup_logs = collect_client_backup_results(
-        collector_config, nodes_and_domains
+    data = TSMData()
+
+    # Parse node logs on a single process, unless configured otherwise
+    # (0 uses all CPU cores)
+    parse_processes = config["parse_processes"] if "parse_processes" in config else 1
+    parse_parallel_threshold = (
+        config["parse_parallel_threshold"]
+        if "parse_parallel_threshold" in config
+        else PARSE_PARALLEL_THRESHOLD
     )
 
-    data = TSMData()
+    # Collect overall data from the environment and parse it. Outputs spilled
+    # to disk are closed as soon as they have been parsed.
+    with closing_output(collect_nodes_and_domains(collector_config)) as nodes_log:
+        data.parse_nodes(nodes_log)
+
+    # Logs of each node are parsed as soon as they have been collected
+    data.parse_node_logs_stream(
+        iter_node_logs(collector_config, list(data.nodes)),
+        parse_processes if parse_processes else None,
+        parse_parallel_threshold,
+        lazy_parsing,
+    )
 
-    # Parse data
-    data.parse_nodes(nodes_and_domains)
-    data.parse_schedules_and_backup_results(node_schedule_logs, client_backup_logs)
-    data.parse_vm_schedules(vms_list)
+    with closing_output(collect_vm_schedules(collector_config)) as vms_log:
+        data.parse_vm_schedules(vms_log)
 
     return data
 
 
+def log_failed_schedules(data: dict[str, TSMData]):
+    """
+    Builds the schedule history matrix of each instance and logs the number of
+    repeatedly failed schedules. Called after the reports have been sent, so only
+    nodes whose logs have been parsed for the reports are included when parsing
+    lazily.
+    """
+    for inst, tsm_data in data.items():
+        failed_schedules = tsm_data.build_schedule_history().failed_schedules()
+
+        if failed_schedules:
+            logger.warning(
+                "%d schedules on %s failed on at least 3 of the last %d days.",
+                len(failed_schedules),
+                inst,
+                HISTORY_MAX_ITEMS,
+            )
+
+
 def main():
     """
     Main entrypoint.
@@ -363,6 +572,11 @@ def main():
         action="store_true",
         help="disable actually sending the mails for debugging purposes",
     )
+    argparser.add_argument(
+        "--drain-spool",
+        action="store_true",
+        help="deliver the mails written to the spool (see mail_spool_dir) and exit",
+    )
     argparser.add_argument(
         "--version", action="version", version=f"%(prog)s {__VERSION__}"
     )
@@ -372,13 +586,22 @@ def main():
     config = load_config(args.config)
     setup_logger(config)
 
-    mailer = StatusMailer(
-        config["mail_server_host"],
-        config["mail_server_port"],
-        config["mail_template_path"],
-        (config["mail_server_username"], config["mail_server_password"]),
+    # Templates are loaded once and shared by the mailer and the HTML export
+    configure_registry(
+        config["template_cache_dir"] if "template_cache_dir" in config else None,
+        (
+            config["precompiled_template_dir"]
+            if "precompiled_template_dir" in config
+            else None
+        ),
     )
 
+    if args.drain_spool:
+        drain_spool(config)
+        return
+
+    mailer = create_mailer(config)
+
     if args.pickle:
         if os.path.isfile(args.pickle):
             logger.info("Pickled data found in %s. Loading...", args.pickle)
@@ -389,15 +612,54 @@ def main():
     else:
         logger.info("No pickled data supplied, fetching from TSM.")
 
+    # Exported reports contain all policy domains, so logs are parsed eagerly
+    lazy_parsing = (
+        "lazy_parsing" in config and config["lazy_parsing"] and not args.export
+    )
+
+    replaying = bool(data)
+
     if "tsm_instances" in config and not data:
         for inst in config["tsm_instances"]:
-            data[inst] = collect_and_parse_instance(config, inst)
+            data[inst] = collect_and_parse_instance(config, inst, lazy_parsing)
 
-    if not args.disable_mail_send:
-        send_mail_reports(config, mailer, data)
+    render_cache = None
+    if args.pickle:
+        # Reports rendered from pickled data are kept next to it,
+        # so replaying the pickled data doesn't render them again
+        render_cache = RenderCache(
+            config["mail_template_path"], f"{args.pickle}.renders"
+        )
+        if not replaying:
+            render_cache.clear()
+    elif args.export and not args.disable_mail_send:
+        # Reports are both sent and exported, render each of them only once
+        render_cache = RenderCache(config["mail_template_path"])
+
+    change_detector = (
+        create_change_detector(config) if not args.disable_mail_send else None
+    )
 
-    if args.export:
-        export_to_html(config, data)
+    try:
+        if not args.disable_mail_send:
+            try:
+                send_mail_reports(config, mailer, data, render_cache, change_detector)
+            finally:
+                # Waits for queued mails to be sent
+                mailer.close()
+
+                # Reports sent before a failure are recorded as well
+                if change_detector:
+                    change_detector.save()
+
+        if args.export:
+            export_to_html(config, data, render_cache)
+    finally:
+        if render_cache:
+            render_cache.close()
+
+    if "schedule_history_matrix" in config and config["schedule_history_matrix"]:
+        log_failed_schedules(data)
 
     if args.pickle:
         logger.info("Pickling data to %s", args.pickle)